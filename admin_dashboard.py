@@ -11,10 +11,25 @@ import argparse
 import shutil
 import random
 import string
-from datetime import datetime
-import threading
+import shlex
+import re
+import csv
+from datetime import datetime, timedelta
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 import bcrypt
 import getpass
+import session_probe
+import cgroup_metrics
+import gpu_accounting
+import gpu_telemetry
+import dashboard_collector
+import container_state
+import docker_api
+import metrics_history
+import idle_reaper
+import dashboard_federation
+import scheduler
 
 # Couleurs pour le terminal
 class Colors:
@@ -35,11 +50,32 @@ USER_FILE = "users.txt"
 PORT_FILE = "port_map.txt"
 START_PORT = 3390
 MAX_PORT = 3490
+DEFAULT_IMAGE = "xfce_gui_container"
+# Noms utilisables dans users.txt (séparateur ':') et dans le nom du conteneur
+USERNAME_RE = re.compile(r'^[A-Za-z0-9_.-]+$')
+PORT_INDEX_TTL = 10  # secondes
+COLLECT_DEADLINE = 10  # secondes : durée maximale d'un cycle de collecte
+COLLECT_WORKERS = 4
+BULK_WORKERS = 8  # Actions groupées simultanées
+BULK_STOP_GRACE = 10  # secondes accordées au conteneur avant SIGKILL lors d'un arrêt groupé
+EXEC_TIMEOUT = 60  # secondes sans sortie avant d'abandonner une commande exécutée dans un conteneur
+# Conteneur d'administration de chaque nœud GPU distant où le tableau de bord lance nvidia-smi
+# (jamais dans un bureau utilisateur) : docker run -d --name rdp_gpu_exporter --label rdp.role=gpu-exporter ...
+GPU_EXPORTER_CONTAINER = "rdp_gpu_exporter"
+GPU_EXPORTER_ROLE = "gpu-exporter"
 
-# Cache global pour les infos GPU
-_gpu_info_cache = None
-_gpu_info_cache_time = 0
-_gpu_info_cache_ttl = 5  # secondes
+# Index port hôte -> (ID, nom) des conteneurs en cours, rafraîchi avec l'inventaire
+_port_index = {}
+_port_index_time = 0
+# Conteneurs des hôtes distants (tableau de bord multi-hôtes) : ID -> adresse DOCKER_HOST
+_container_hosts = {}
+
+# Erreurs de collecte : affichées dans la barre d'état une fois la collecte lancée
+log = logging.getLogger("admin_dashboard")
+
+def get_docker_client(container_id):
+    """Client de l'API Docker du démon qui héberge le conteneur (démon local par défaut)"""
+    return docker_api.get_client(_container_hosts.get(container_id))
 
 def clear_screen():
     """Efface l'écran du terminal"""
@@ -54,71 +90,8 @@ def get_terminal_width():
         return 120  # Valeur par défaut si impossible de déterminer
 
 def get_gpu_info():
-    """Récupère les informations du GPU NVIDIA via nvidia-smi avec mise en cache"""
-    global _gpu_info_cache, _gpu_info_cache_time
-    current_time = time.time()
-    
-    # Utiliser le cache si disponible et récent
-    if _gpu_info_cache is not None and current_time - _gpu_info_cache_time < _gpu_info_cache_ttl:
-        return _gpu_info_cache
-    
-    try:
-        cmd = "nvidia-smi --query-gpu=index,name,temperature.gpu,utilization.gpu,utilization.memory,memory.used,memory.total,driver_version --format=csv,noheader,nounits"
-        gpu_info = subprocess.check_output(cmd, shell=True, timeout=1).decode().strip().split('\n')
-        
-        gpus = []
-        for line in gpu_info:
-            parts = line.split(', ')
-            if len(parts) >= 8:
-                gpus.append({
-                    'index': parts[0],
-                    'name': parts[1],
-                    'temp': parts[2],
-                    'gpu_util': parts[3],
-                    'mem_util': parts[4],
-                    'mem_used': parts[5],
-                    'mem_total': parts[6],
-                    'driver': parts[7]
-                })
-        
-        # Mettre en cache le résultat
-        _gpu_info_cache = gpus
-        _gpu_info_cache_time = current_time
-        return gpus
-    except Exception as e:
-        return []
-
-def get_container_gpu_usage(container_id):
-    """Récupère l'utilisation GPU d'un conteneur spécifique avec timeout réduit"""
-    try:
-        # On récupère les PIDs du conteneur
-        cmd = f"docker top {container_id} -eo pid | tail -n +2"
-        container_pids_raw = subprocess.check_output(cmd, shell=True, timeout=0.5).decode().strip()
-        container_pids = set(pid.strip() for pid in container_pids_raw.split('\n') if pid.strip())
-        
-        # On récupère les processus GPU
-        cmd = "nvidia-smi --query-compute-apps=pid,used_memory --format=csv,noheader,nounits"
-        gpu_processes_raw = subprocess.check_output(cmd, shell=True, timeout=0.5).decode().strip()
-        
-        # On cherche les processus GPU qui appartiennent au conteneur
-        total_memory = 0
-        for line in gpu_processes_raw.split('\n'):
-            if not line.strip():
-                continue
-                
-            parts = line.split(', ')
-            if len(parts) >= 2:
-                gpu_pid = parts[0].strip()
-                if gpu_pid in container_pids:
-                    total_memory += int(parts[1])
-        
-        return total_memory
-        
-    except subprocess.TimeoutExpired:
-        # En cas de timeout, retourner 0 au lieu d'attendre
-        return 0
-    except Exception as e:
-        return 0
+    """Récupère l'état des GPU NVIDIA (NVML ou nvidia-smi, avec mise en cache)"""
+    return gpu_telemetry.get_devices()
 
 # Nouvelles fonctions pour gérer les power users
 def get_power_users():
@@ -132,7 +105,7 @@ def get_power_users():
                     if line and not line.startswith('#'):
                         power_users.append(line)
     except Exception as e:
-        print(f"Erreur lors de la lecture du fichier {POWER_USERS_FILE}: {e}")
+        log.warning(f"Erreur lors de la lecture du fichier {POWER_USERS_FILE}: {e}")
     
     return power_users
 
@@ -181,7 +154,7 @@ def get_blocked_users():
                     if line and not line.startswith('#'):
                         blocked_users.append(line)
     except Exception as e:
-        print(f"Erreur lors de la lecture du fichier {BLOCKED_USERS_FILE}: {e}")
+        log.warning(f"Erreur lors de la lecture du fichier {BLOCKED_USERS_FILE}: {e}")
     
     return blocked_users
 
@@ -251,15 +224,8 @@ def user_exists(username):
     return False
 
 def encrypt_password(password):
-    """Chiffre un mot de passe (simulation du processus de hachage)"""
-    try:
-        # Essayer d'appeler la fonction de chiffrement du script initial
-        result = subprocess.check_output(f"echo -n '{password}' | python3 -c 'import bcrypt, sys; print(bcrypt.hashpw(sys.stdin.read().encode(), bcrypt.gensalt()).decode())'", shell=True).decode().strip()
-        return result
-    except Exception as e:
-        print(f"Erreur lors du chiffrement du mot de passe: {e}")
-        # Fallback à une méthode simple si bcrypt échoue
-        return subprocess.check_output(f"echo -n '{password}' | md5sum | awk '{{print $1}}'", shell=True).decode().strip()
+    """Hache un mot de passe avec bcrypt (dans le processus courant, sans shell)"""
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
 
 def add_user(username, password):
     """Ajoute un nouvel utilisateur"""
@@ -288,10 +254,10 @@ def add_user(username, password):
     except Exception as e:
         return False, f"Erreur lors de la création de l'utilisateur: {e}"
 
-def find_free_port(start_port=START_PORT, end_port=MAX_PORT):
-    """Trouve un port libre pour un nouvel utilisateur"""
-    # Récupérer les ports déjà utilisés
-    used_ports = []
+def get_used_ports():
+    """Ports déjà pris : attribués dans port_map.txt, en écoute sur la machine (un seul appel à ss)
+    ou publiés par un conteneur (cache d'état des conteneurs)"""
+    used_ports = set()
     try:
         if os.path.exists(PORT_FILE):
             with open(PORT_FILE, 'r') as f:
@@ -299,25 +265,140 @@ def find_free_port(start_port=START_PORT, end_port=MAX_PORT):
                     line = line.strip()
                     if line and not line.startswith('#'):
                         parts = line.split(':')
-                        if len(parts) >= 2:
-                            port = int(parts[1])
-                            used_ports.append(port)
+                        if len(parts) >= 2 and parts[1].isdigit():
+                            used_ports.add(int(parts[1]))
     except Exception as e:
         print(f"Erreur lors de la lecture des ports: {e}")
     
-    # Trouver un port libre
+    try:
+        output = subprocess.run(["ss", "-tuln"], capture_output=True, text=True, timeout=5).stdout
+        for line in output.splitlines()[1:]:
+            # Colonne 'Local Address:Port' (ex. 0.0.0.0:3390, [::]:3390, *:3390)
+            parts = line.split()
+            if len(parts) >= 5 and parts[4].rsplit(':', 1)[-1].isdigit():
+                used_ports.add(int(parts[4].rsplit(':', 1)[-1]))
+    except Exception as e:
+        print(f"Erreur lors de la lecture des ports en écoute: {e}")
+    
+    cache = container_state.get_cache()
+    if cache.is_ready():
+        used_ports.update(cache.used_ports())
+    return used_ports
+
+def find_free_ports(count, start_port=START_PORT, end_port=MAX_PORT, used_ports=None):
+    """Trouve count ports libres en un seul passage (liste plus courte si la plage est épuisée)"""
+    if used_ports is None:
+        used_ports = get_used_ports()
+    ports = []
     for port in range(start_port, end_port + 1):
+        if len(ports) >= count:
+            break
         if port not in used_ports:
-            # Vérifier si le port est réellement libre sur la machine
-            try:
-                cmd = f"ss -tuln | grep ':{port} '"
-                result = subprocess.run(cmd, shell=True, capture_output=True)
-                if result.returncode != 0:  # Le port n'est pas utilisé
-                    return port
-            except Exception:
-                pass
-    
-    return None  # Aucun port libre trouvé
+            ports.append(port)
+    return ports
+
+def find_free_port(start_port=START_PORT, end_port=MAX_PORT):
+    """Trouve un port libre pour un nouvel utilisateur"""
+    ports = find_free_ports(1, start_port, end_port)
+    return ports[0] if ports else None  # None : aucun port libre trouvé
+
+def write_temp_file(path, lines):
+    """Écrit le nouveau contenu d'un fichier à côté de lui (à renommer ensuite avec os.replace)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.writelines(lines)
+    return tmp_path
+
+def read_import_csv(path):
+    """Lit un CSV d'utilisateurs 'username[,password[,image]]' (ligne d'en-tête facultative).
+    Retourne (lignes valides [(username, password, image)], erreurs [(ligne, message)])."""
+    rows = []
+    errors = []
+    seen = set()
+    existing = set(get_users())
+    with open(path, 'r', newline='') as f:
+        for number, row in enumerate(csv.reader(f), 1):
+            row = [cell.strip() for cell in row]
+            if not row or not row[0] or row[0].startswith('#'):
+                continue
+            if number == 1 and row[0].lower() in ('username', 'utilisateur', 'user'):
+                continue
+            username = row[0]
+            password = row[1] if len(row) > 1 else ""
+            image = row[2] if len(row) > 2 and row[2] else DEFAULT_IMAGE
+            if not USERNAME_RE.match(username):
+                errors.append((number, f"nom d'utilisateur invalide: {username}"))
+            elif username in existing or username in seen:
+                errors.append((number, f"l'utilisateur {username} existe déjà"))
+            elif ':' in image:
+                errors.append((number, f"image invalide: {image}"))
+            else:
+                seen.add(username)
+                rows.append((username, password, image))
+    return rows, errors
+
+def import_users(path, workers=None):
+    """Importe des utilisateurs depuis un CSV : mots de passe hachés en parallèle (un processus par
+    cœur), ports attribués en un seul passage, users.txt et port_map.txt réécrits de façon atomique.
+    Retourne (utilisateurs créés [(username, mot de passe, image, port)], erreurs [(ligne, message)])."""
+    rows, errors = read_import_csv(path)
+    if not rows:
+        return [], errors
+    
+    ports = find_free_ports(len(rows))
+    if len(ports) < len(rows):
+        errors.append((0, f"{len(rows)} ports nécessaires, seulement {len(ports)} libres entre {START_PORT} et {MAX_PORT}"))
+        return [], errors
+    
+    # Mot de passe temporaire généré pour les lignes sans mot de passe
+    passwords = [password or ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(10))
+                 for _, password, _ in rows]
+    # bcrypt est volontairement lent (~0,25 s par hachage) : réparti sur tous les cœurs
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        hashes = list(executor.map(encrypt_password, passwords, chunksize=8))
+    
+    user_lines = []
+    if os.path.exists(USER_FILE):
+        with open(USER_FILE, 'r') as f:
+            user_lines = f.readlines()
+    if user_lines and not user_lines[-1].endswith('\n'):
+        user_lines[-1] += '\n'
+    port_lines = []
+    if os.path.exists(PORT_FILE):
+        with open(PORT_FILE, 'r') as f:
+            port_lines = f.readlines()
+    if port_lines and not port_lines[-1].endswith('\n'):
+        port_lines[-1] += '\n'
+    
+    created = []
+    for (username, _, image), password, hashed, port in zip(rows, passwords, hashes, ports):
+        # Format: username:password:image:temp_password_flag
+        user_lines.append(f"{username}:{hashed}:{image}:1\n")
+        port_lines.append(f"{username}:{port}\n")
+        created.append((username, password, image, port))
+    
+    # Les deux fichiers sont préparés avant d'être remplacés : pas d'utilisateur sans port
+    users_tmp = write_temp_file(USER_FILE, user_lines)
+    ports_tmp = write_temp_file(PORT_FILE, port_lines)
+    os.replace(users_tmp, USER_FILE)
+    os.replace(ports_tmp, PORT_FILE)
+    return created, errors
+
+def print_import_report(created, errors):
+    """Affiche les utilisateurs créés avec leur mot de passe temporaire et les lignes rejetées"""
+    term_width = get_terminal_width()
+    separator = "+" + "-" * (term_width - 2) + "+"
+    if created:
+        print(separator)
+        print(f"| {Colors.BOLD}{'Utilisateur':<20} {'Mot de passe temporaire':<25} {'Port':<6} Image{Colors.END}")
+        print(separator)
+        for username, password, image, port in created:
+            print(f"| {username:<20} {Colors.GREEN}{password:<25}{Colors.END} {port:<6} {image}")
+        print(separator)
+        print(f"{Colors.GREEN}✓ {len(created)} utilisateur(s) créé(s). Mot de passe à changer à la première connexion.{Colors.END}")
+    for number, message in errors:
+        where = f"ligne {number}: " if number else ""
+        print(f"{Colors.RED}✗ {where}{message}{Colors.END}")
 
 def reset_password(username, new_password=None):
     """Réinitialise le mot de passe d'un utilisateur"""
@@ -352,103 +433,210 @@ def reset_password(username, new_password=None):
         return False, f"Erreur lors de la réinitialisation du mot de passe: {e}"
 
 def get_containers_basic_info(filter_prefix="gui_user_"):
-    """Récupère les ID et noms des conteneurs Docker - version optimisée pour la rapidité"""
+    """Récupère les ID et noms des conteneurs Docker depuis le cache alimenté par docker events
+    (liste de l'API Docker seulement si le flux d'événements n'est pas disponible)"""
+    cache = container_state.get_cache()
+    if cache.is_ready():
+        return [{
+            'id': state['id'][:12],
+            'name': state['name'],
+            'username': state['name'].replace(filter_prefix, ''),
+            # Un conteneur gelé reste affiché 'Up ... (Paused)' par docker ps
+            'is_running': state['status'] in ('running', 'paused'),
+            'image': state['image']
+        } for state in cache.list(filter_prefix)]
     try:
-        cmd = f"docker ps -a --filter name={filter_prefix} --format '{{{{.ID}}}}|{{{{.Names}}}}|{{{{.Status}}}}|{{{{.Image}}}}'"
-        containers_raw = subprocess.check_output(cmd, shell=True, timeout=1).decode().strip().split('\n')
+        containers_raw = docker_api.get_client().containers(all=True, filters={'name': [filter_prefix]}, timeout=1)
         
-        if containers_raw == ['']:
-            return []
-            
         containers_basic = []
-        for container_line in containers_raw:
-            if not container_line:
-                continue
-                
-            parts = container_line.split('|')
-            if len(parts) >= 3:
-                container_id = parts[0]
-                container_name = parts[1]
-                status = parts[2]
-                image = parts[3] if len(parts) > 3 else "N/A"
-                
-                username = container_name.replace(filter_prefix, '')
-                is_running = status.startswith('Up')
-                
-                containers_basic.append({
-                    'id': container_id[:12],
-                    'name': container_name,
-                    'username': username,
-                    'is_running': is_running,
-                    'image': image
-                })
+        for container in containers_raw:
+            container_name = container['Names'][0].lstrip('/') if container.get('Names') else container['Id'][:12]
+            containers_basic.append({
+                'id': container['Id'][:12],
+                'name': container_name,
+                'username': container_name.replace(filter_prefix, ''),
+                'is_running': container.get('State') in ('running', 'paused'),
+                'image': container.get('Image') or "N/A"
+            })
         
         return containers_basic
     except Exception as e:
-        print(f"Erreur lors de la récupération des conteneurs: {e}")
+        log.warning(f"Erreur lors de la récupération des conteneurs: {e}")
         return []
 
 
+def build_port_index(inspect_results):
+    """Construit l'index port hôte -> (ID, nom) à partir des résultats de docker inspect"""
+    index = {}
+    for name, info in inspect_results.items():
+        if not info.get('State', {}).get('Running'):
+            continue
+        for bindings in ((info.get('NetworkSettings') or {}).get('Ports') or {}).values():
+            for binding in bindings or []:
+                if binding.get('HostPort'):
+                    index[binding['HostPort']] = (info['Id'][:12], name)
+    return index
+
+def set_port_index(index):
+    """Remplace l'index des ports (rafraîchi avec l'inventaire des conteneurs)"""
+    global _port_index, _port_index_time
+    _port_index = index
+    _port_index_time = time.time()
+
+def refresh_port_index():
+    """Reconstruit l'index des ports de tous les conteneurs en cours (cache d'état des conteneurs,
+    ou une seule requête à l'API Docker si le flux d'événements n'est pas disponible)"""
+    cache = container_state.get_cache()
+    if cache.is_ready():
+        index = {str(port): (state['id'][:12], state['name'])
+                 for state in cache.list() if state['status'] == 'running' for port in state['ports']}
+        set_port_index(index)
+        return index
+    try:
+        running = docker_api.get_client().containers(all=False, timeout=5)
+    except docker_api.DockerAPIError as e:
+        log.warning(f"Erreur lors de la lecture des ports des conteneurs: {e}")
+        return _port_index
+    index = {}
+    for container in running:
+        name = container['Names'][0].lstrip('/') if container.get('Names') else ""
+        for port in container.get('Ports') or []:
+            if port.get('PublicPort'):
+                index[str(port['PublicPort'])] = (container['Id'][:12], name)
+    set_port_index(index)
+    return index
+
 def find_container_using_port(port):
-    """Trouve le conteneur qui utilise un port spécifique"""
+    """Trouve le conteneur qui utilise un port spécifique (recherche dans l'index des ports)"""
+    port = str(port)
+    cache = container_state.get_cache()
+    if cache.is_ready():
+        # Cache tenu à jour par docker events : pas de rafraîchissement nécessaire
+        state = cache.get(cache.port_owner(port))
+        if state and state['status'] == 'running':
+            return (state['id'][:12], state['name'])
+        return (None, None)
+    # Index trop ancien ou port absent : un conteneur a pu démarrer depuis le dernier rafraîchissement
+    if time.time() - _port_index_time > PORT_INDEX_TTL or port not in _port_index:
+        refresh_port_index()
+    return _port_index.get(port, (None, None))
+
+def display_port_usage():
+    """Affiche quel conteneur ou quel utilisateur occupe chaque port"""
+    term_width = get_terminal_width()
+    separator = "+" + "-" * (term_width - 2) + "+"
+    index = refresh_port_index()
+    
+    # Ports attribués dans port_map.txt
+    assigned = {}
     try:
-        # Récupère tous les conteneurs qui sont en cours d'exécution
-        cmd = f"docker ps --format '{{{{.ID}}}}|{{{{.Names}}}}'"
-        containers_raw = subprocess.check_output(cmd, shell=True, timeout=1).decode().strip().split('\n')
-        
-        for container_line in containers_raw:
-            if not container_line:
-                continue
-                
-            parts = container_line.split('|')
-            if len(parts) >= 2:
-                container_id = parts[0]
-                container_name = parts[1]
-                
-                # Vérifie si ce conteneur utilise le port en question
-                cmd = f"docker port {container_id}"
-                try:
-                    port_mappings = subprocess.check_output(cmd, shell=True, timeout=1).decode().strip()
-                    if f":{port}" in port_mappings:
-                        return container_id, container_name
-                except:
-                    # Ignorer les erreurs pour ce conteneur et passer au suivant
-                    pass
-                    
-        return None, None
+        if os.path.exists(PORT_FILE):
+            with open(PORT_FILE, 'r') as f:
+                for line in f:
+                    parts = line.strip().split(':')
+                    # Ligne mal formée (ex. 'alice:') ignorée : les ports sont triés numériquement
+                    if len(parts) >= 2 and not parts[0].startswith('#') and parts[1].isdigit():
+                        assigned[parts[1]] = parts[0]
     except Exception as e:
-        print(f"{Colors.RED}Erreur lors de la recherche du conteneur utilisant le port {port}: {e}{Colors.END}")
-        return None, None
+        print(f"Erreur lors de la lecture des ports: {e}")
+    
+    print(separator)
+    print(f"| {Colors.BOLD}{'Port':<8} {'Attribué à':<20} {'Utilisé par':<30}{Colors.END}")
+    print(separator)
+    for port in sorted(set(index) | set(assigned), key=int):
+        container_name = index[port][1] if port in index else "-"
+        user = assigned.get(port, "-")
+        # Conteneur qui ne correspond pas à l'utilisateur à qui le port est attribué
+        conflict = port in index and user != "-" and container_name != f"gui_user_{user}"
+        color = Colors.RED if conflict else (Colors.GREEN if port in index else Colors.END)
+        print(f"| {port:<8} {truncate_text(user, 20):<20} {color}{truncate_text(container_name, 30):<30}{Colors.END}")
+    print(separator)
 
+def get_fallback_details(container_basic, power_users, blocked_users, unavailable="0%"):
+    """Informations minimales d'un conteneur quand son inspect ou ses stats ne sont pas disponibles"""
+    return {
+        'id': container_basic['id'],
+        'name': container_basic['name'],
+        'username': container_basic['username'],
+        'status': 'En cours' if container_basic['is_running'] else 'Arrêté',
+        'image': container_basic['image'],
+        'cpu': unavailable,
+        'mem': "0B / 0B" if unavailable == "0%" else unavailable,
+        'mem_perc': unavailable,
+        'uptime': "N/A" if container_basic['is_running'] else "arrêté",
+        'rdp_port': "N/A",
+        'is_running': container_basic['is_running'],
+        'has_gpu': False,
+        'gpu_memory': 0,
+        'is_power_user': container_basic['username'] in power_users,
+        'is_blocked': container_basic['username'] in blocked_users,
+        'cpu_limit': "N/A",
+        'mem_limit': "N/A"
+    }
 
-def get_container_details(container_basic, power_users, blocked_users):
-    """Récupère les détails d'un conteneur spécifique"""
+def inspect_containers(container_ids, timeout=5):
+    """Inspecte tous les conteneurs en un seul appel docker inspect, indexés par nom"""
+    if not container_ids:
+        return {}
+    try:
+        output = subprocess.run(
+            ["docker", "inspect"] + container_ids,
+            capture_output=True, text=True, timeout=timeout
+        ).stdout
+        # docker inspect renvoie les conteneurs trouvés même si certains ont disparu entre-temps
+        return {info['Name'].lstrip('/'): info for info in json.loads(output or '[]')}
+    except subprocess.TimeoutExpired:
+        log.warning("Timeout pour docker inspect")
+    except Exception as e:
+        log.warning(f"Erreur docker inspect: {str(e)}")
+    return {}
+
+def get_containers_stats(container_ids, timeout=10):
+    """Échantillonne CPU et mémoire de tous les conteneurs en un seul appel docker stats, indexés par nom"""
+    if not container_ids:
+        return {}
+    try:
+        output = subprocess.run(
+            ["docker", "stats", "--no-stream", "--format", "{{.Name}}|{{.CPUPerc}}|{{.MemUsage}}|{{.MemPerc}}"] + container_ids,
+            capture_output=True, text=True, timeout=timeout
+        ).stdout
+    except subprocess.TimeoutExpired:
+        log.warning("Timeout pour docker stats")
+        return {}
+    except Exception as e:
+        log.warning(f"Erreur docker stats: {str(e)}")
+        return {}
+
+    stats = {}
+    for line in output.splitlines():
+        parts = line.strip().split('|')
+        if len(parts) == 4:
+            stats[parts[0]] = {'cpu': parts[1], 'mem': parts[2], 'mem_perc': parts[3]}
+    return stats
+
+def get_cgroup_stats(containers_basic, inspect_results):
+    """Lit CPU et mémoire des conteneurs en cours dans leur cgroup (format docker stats), indexés par nom"""
+    names = {}
+    pids = {}
+    for container_basic in containers_basic:
+        info = inspect_results.get(container_basic['name'])
+        if container_basic['is_running'] and info:
+            names[info['Id']] = container_basic['name']
+            pids[info['Id']] = info['State'].get('Pid')
+    samples = cgroup_metrics.sample(list(names), pids)
+    host_memory = cgroup_metrics.get_host_memory()
+    return {names[cid]: cgroup_metrics.format_docker_stats(metrics, host_memory) for cid, metrics in samples.items()}
+
+def get_container_details(container_basic, container_info, stats, power_users, blocked_users, gpu_snapshot):
+    """Construit les détails d'un conteneur à partir de son inspect et de ses stats déjà collectés"""
     container_id = container_basic['id']
     
     try:
-        # Obtenir les informations détaillées du conteneur
-        cmd = f"docker inspect {container_id}"
-        container_info = json.loads(subprocess.check_output(cmd, shell=True, timeout=1).decode())[0]
-        
-        # Obtenir les statistiques du conteneur si en cours d'exécution
-        if container_basic['is_running']:
-            try:
-                # Timeout de 3 secondes pour docker stats
-                cmd = f"docker stats {container_id} --no-stream --format \"{{{{.CPUPerc}}}}|{{{{.MemUsage}}}}|{{{{.MemPerc}}}}\""
-                stats_raw = subprocess.check_output(cmd, shell=True, timeout=3).decode().strip()
-                cpu_perc, mem_usage, mem_perc = stats_raw.split('|')
-            except subprocess.TimeoutExpired:
-                # Message d'erreur en cas de timeout (sans afficher les stats brutes)
-                print(f"{Colors.YELLOW}Timeout pour docker stats sur {container_id}{Colors.END}")
-                cpu_perc = "0%"
-                mem_usage = "0B / 0B"
-                mem_perc = "0%"
-            except Exception as e:
-                # Log l'erreur spécifique
-                print(f"{Colors.RED}Erreur docker stats sur {container_id}: {str(e)}{Colors.END}")
-                cpu_perc = "0%"
-                mem_usage = "0B / 0B"
-                mem_perc = "0%"
+        # Statistiques du conteneur si en cours d'exécution
+        if container_basic['is_running'] and stats:
+            cpu_perc = stats['cpu']
+            mem_usage = stats['mem']
+            mem_perc = stats['mem_perc']
         else:
             cpu_perc = "0%"
             mem_usage = "0B / 0B"
@@ -480,9 +668,11 @@ def get_container_details(container_basic, power_users, blocked_users):
                     rdp_port = port_mappings[port_key][0]['HostPort']
                     break
         
-        # Vérifier si le GPU est activé dans le conteneur
-        has_gpu = False
+        # Vérifier si le GPU est activé dans le conteneur (étiquette posée par script.sh)
+        labels = (container_info.get('Config') or {}).get('Labels') or {}
+        has_gpu = labels.get('rdp.gpu') == 'true'
         gpu_memory = 0
+        gpu_sm = 0
 
         # Vérifier les options de GPU dans le conteneur
         if 'HostConfig' in container_info and 'DeviceRequests' in container_info['HostConfig']:
@@ -494,9 +684,13 @@ def get_container_details(container_basic, power_users, blocked_users):
                         break
         
         # Si le conteneur est en cours d'exécution et a le GPU, on calcule l'utilisation
-        if container_basic['is_running'] and has_gpu:
-            # Lancer le calcul d'utilisation GPU en arrière-plan pour éviter d'attendre
-            gpu_memory = get_container_gpu_usage(container_id)
+        # Processus GPU attribués au conteneur via /proc/<pid>/cgroup (un seul relevé nvidia-smi)
+        if container_basic['is_running'] and gpu_snapshot:
+            gpu_usage = gpu_accounting.get_container_usage(container_info['Id'], gpu_snapshot)
+            if gpu_usage['processes']:
+                has_gpu = True
+            gpu_memory = gpu_usage['memory']
+            gpu_sm = gpu_usage['sm']
         
         # Obtenir les limites CPU et mémoire
         cpu_limit = "N/A"
@@ -514,11 +708,12 @@ def get_container_details(container_basic, power_users, blocked_users):
                     if memory_limit > 0:
                         mem_limit = f"{memory_limit / (1024*1024)}MB"
         except Exception as e:
-            print(f"{Colors.YELLOW}Erreur lors de la récupération des limites pour {container_id}: {str(e)}{Colors.END}")
+            log.warning(f"Erreur lors de la récupération des limites pour {container_id}: {str(e)}")
         
         # Compléter les informations de base
         container_details = container_basic.copy()
         container_details.update({
+            'full_id': container_info['Id'],
             'status': 'En cours' if container_basic['is_running'] else 'Arrêté',
             'cpu': cpu_perc,
             'mem': mem_usage,
@@ -527,6 +722,7 @@ def get_container_details(container_basic, power_users, blocked_users):
             'rdp_port': rdp_port,
             'has_gpu': has_gpu,
             'gpu_memory': gpu_memory,
+            'gpu_sm': gpu_sm,
             'is_power_user': is_power,
             'is_blocked': is_blocked_user,
             'cpu_limit': cpu_limit,
@@ -536,118 +732,235 @@ def get_container_details(container_basic, power_users, blocked_users):
         return container_details
     except Exception as e:
         # Log l'erreur spécifique
-        print(f"{Colors.RED}Erreur lors de la récupération des détails du conteneur {container_id}: {str(e)}{Colors.END}")
+        log.warning(f"Erreur lors de la récupération des détails du conteneur {container_id}: {str(e)}")
         
         # En cas d'erreur, retourner les informations de base
-        return {
-            'id': container_basic['id'],
-            'name': container_basic['name'],
-            'username': container_basic['username'],
-            'status': 'En cours' if container_basic['is_running'] else 'Arrêté',
-            'image': container_basic['image'],
-            'cpu': "0%",
-            'mem': "0B / 0B",
-            'mem_perc': "0%",
-            'uptime': "N/A" if container_basic['is_running'] else "arrêté",
-            'rdp_port': "N/A",
-            'is_running': container_basic['is_running'],
-            'has_gpu': False,
-            'gpu_memory': 0,
-            'is_power_user': container_basic['username'] in power_users,
-            'is_blocked': container_basic['username'] in blocked_users,
-            'cpu_limit': "N/A",
-            'mem_limit': "N/A"
-        }
-
-def get_containers_parallel(filter_prefix="gui_user_"):
-    """Récupère les informations sur les conteneurs Docker en parallèle pour plus de rapidité"""
+        return get_fallback_details(container_basic, power_users, blocked_users)
+
+def merge_container_details(containers_basic, inspect_results, stats_results, previous,
+                            power_users, blocked_users, gpu_snapshot):
+    """Construit les détails de chaque conteneur à partir des mesures qui ont abouti; un conteneur
+    sans inspect ou sans stats garde les valeurs du relevé précédent (marqué 'stale')"""
+    containers = []
+    for container_basic in containers_basic:
+        name = container_basic['name']
+        container_info = inspect_results.get(name)
+        if container_info is None:
+            if name in previous:
+                # Inspect en retard ou en échec : dernières valeurs connues, état issu de docker ps
+                container = dict(previous[name], is_running=container_basic['is_running'],
+                                 status='En cours' if container_basic['is_running'] else 'Arrêté')
+            else:
+                # Conteneur supprimé entre docker ps et docker inspect, ou inspect en échec
+                container = get_fallback_details(container_basic, power_users, blocked_users, unavailable="N/A")
+            container['stale'] = True
+            containers.append(container)
+            continue
+        container = get_container_details(
+            container_basic, container_info, stats_results.get(name),
+            power_users, blocked_users, gpu_snapshot
+        )
+        container['stale'] = False
+        if container['is_running'] and name not in stats_results:
+            if name in previous:
+                container.update({key: previous[name][key] for key in ('cpu', 'mem', 'mem_perc')})
+            container['stale'] = True
+        containers.append(container)
+    return containers
+
+def get_containers_parallel(filter_prefix="gui_user_", previous=None, deadline=COLLECT_DEADLINE):
+    """Récupère les informations sur les conteneurs Docker : un seul docker inspect et un seul
+    docker stats pour toute la flotte, lancés en parallèle dans un pool borné avec une seule
+    date limite pour tout le cycle. Une mesure non terminée à temps n'est pas attendue : le
+    conteneur garde sa valeur du relevé précédent (previous: {nom: détails}) marquée 'stale'."""
+    end_time = time.time() + deadline
     # Récupérer les informations de base rapidement
     containers_basic = get_containers_basic_info(filter_prefix)
     if not containers_basic:
         return []
+    previous = previous or {}
     
     # Récupérer les listes des power users et utilisateurs bloqués
     power_users = get_power_users()
     blocked_users = get_blocked_users()
     
-    # Créer une fonction pour récupérer les détails d'un conteneur
-    def get_container_details_wrapper(container_basic, results, index):
-        try:
-            results[index] = get_container_details(container_basic, power_users, blocked_users)
-        except Exception as e:
-            print(f"{Colors.RED}Erreur dans le thread pour {container_basic['id']}: {str(e)}{Colors.END}")
-            # Assurer qu'on a au moins les infos de base en cas d'erreur
-            results[index] = {
-                'id': container_basic['id'],
-                'name': container_basic['name'],
-                'username': container_basic['username'],
-                'status': 'En cours' if container_basic['is_running'] else 'Arrêté',
-                'image': container_basic['image'],
-                'cpu': "0%",
-                'mem': "0B / 0B",
-                'mem_perc': "0%",
-                'uptime': "N/A" if container_basic['is_running'] else "arrêté",
-                'rdp_port': "N/A",
-                'is_running': container_basic['is_running'],
-                'has_gpu': False,
-                'gpu_memory': 0,
-                'is_power_user': container_basic['username'] in power_users,
-                'is_blocked': container_basic['username'] in blocked_users,
-                'cpu_limit': "N/A",
-                'mem_limit': "N/A"
-            }
-    
-    # Créer des threads pour récupérer les détails en parallèle
-    threads = []
-    container_details = [None] * len(containers_basic)
-    
-    for i, container_basic in enumerate(containers_basic):
-        thread = threading.Thread(
-            target=get_container_details_wrapper,
-            args=(container_basic, container_details, i)
-        )
-        thread.daemon = True
-        threads.append(thread)
-        thread.start()
-    
-    # Attendre que tous les threads se terminent (avec un timeout pour éviter les blocages)
-    for thread in threads:
-        thread.join(timeout=5)  # Augmenté de 2 à 5 secondes
-    
-    # Filtrer les résultats None (en cas d'erreur) et ajouter des logs
-    containers = []
-    for i, container in enumerate(container_details):
-        if container is not None:
-            containers.append(container)
+    # Avec cgroup v2, CPU et mémoire sont lus directement dans /sys/fs/cgroup après l'inspect;
+    # sinon docker stats échantillonne pendant ~2 s et on lance l'inspect et nvidia-smi pendant ce temps
+    use_cgroups = cgroup_metrics.is_available()
+    all_ids = [c['id'] for c in containers_basic]
+    running_ids = [c['id'] for c in containers_basic if c['is_running']]
+    running_names = [c['name'] for c in containers_basic if c['is_running']]
+    executor = ThreadPoolExecutor(max_workers=COLLECT_WORKERS)
+    futures = {
+        executor.submit(inspect_containers, all_ids): 'inspect',
+        executor.submit(gpu_accounting.get_snapshot, gpu_accounting.CACHE_TTL, False): 'gpu',
+        # Sessions actives comptées depuis l'hôte (lecture de /proc, sans docker exec)
+        executor.submit(session_probe.get_session_counts, running_names): 'sessions'
+    }
+    if not use_cgroups:
+        futures[executor.submit(get_containers_stats, running_ids)] = 'stats'
+    done, not_done = wait(futures, timeout=max(0, end_time - time.time()))
+    results = {}
+    for future in done:
+        if future.exception() is not None:
+            log.warning(f"Échec de la collecte '{futures[future]}': {future.exception()}")
         else:
-            # Cas où le conteneur n'a pas été traité à temps
-            print(f"{Colors.YELLOW}Attention: le conteneur {containers_basic[i]['id']} n'a pas été traité à temps{Colors.END}")
-            # Ajouter au moins les infos de base
-            containers.append({
-                'id': containers_basic[i]['id'],
-                'name': containers_basic[i]['name'],
-                'username': containers_basic[i]['username'],
-                'status': 'En cours' if containers_basic[i]['is_running'] else 'Arrêté',
-                'image': containers_basic[i]['image'],
-                'cpu': "N/A",
-                'mem': "N/A",
-                'mem_perc': "N/A",
-                'uptime': "N/A" if containers_basic[i]['is_running'] else "arrêté",
-                'rdp_port': "N/A",
-                'is_running': containers_basic[i]['is_running'],
-                'has_gpu': False,
-                'gpu_memory': 0,
-                'is_power_user': containers_basic[i]['username'] in power_users,
-                'is_blocked': containers_basic[i]['username'] in blocked_users,
-                'cpu_limit': "N/A",
-                'mem_limit': "N/A"
-            })
+            results[futures[future]] = future.result()
+    for future in not_done:
+        future.cancel()
+        log.warning(f"Collecte '{futures[future]}' non terminée après {deadline}s")
+    # Ne pas attendre les tâches en retard : leurs résultats seront ignorés
+    executor.shutdown(wait=False)
+    
+    inspect_results = results.get('inspect', {})
+    stats_results = results.get('stats', {})
+    gpu_snapshot = results.get('gpu')
+    if 'inspect' in results:
+        set_port_index(build_port_index(inspect_results))
+    
+    if use_cgroups:
+        stats_results = get_cgroup_stats(containers_basic, inspect_results)
+        # Conteneurs dont le cgroup est introuvable : repli sur docker stats pour eux seuls
+        missing = [c['id'] for c in containers_basic if c['is_running'] and c['name'] not in stats_results]
+        remaining = end_time - time.time()
+        if missing and remaining > 1:
+            stats_results.update(get_containers_stats(missing, timeout=remaining))
+    
+    containers = merge_container_details(containers_basic, inspect_results, stats_results, previous,
+                                         power_users, blocked_users, gpu_snapshot)
+    
+    sessions = results.get('sessions')
+    for container in containers:
+        if sessions is None:
+            # Comptage en retard : dernières valeurs connues
+            container.setdefault('sessions', previous.get(container['name'], {}).get('sessions'))
+            container.setdefault('service_connections', previous.get(container['name'], {}).get('service_connections'))
+            continue
+        count = sessions.get(container['name'])
+        container['sessions'] = count['rdp'] if count else None
+        container['service_connections'] = count['extra'] if count else None
     
     # Trier les conteneurs par statut (En cours d'abord) puis par nom
     containers.sort(key=lambda c: (0 if c['is_running'] else 1, c['name']))
     
     return containers
 
+def parse_remote_stats(stats, previous_sample=None):
+    """CPU et mémoire d'un conteneur distant (format docker stats) à partir d'un relevé instantané
+    de l'API stats. Le CPU est calculé par rapport à l'échantillon du cycle précédent
+    ([cpu total, cpu système] en ns), 'N/A' au premier relevé. Retourne (valeurs, échantillon)."""
+    cpu_stats = stats.get('cpu_stats') or {}
+    cpu_usage = cpu_stats.get('cpu_usage') or {}
+    total = cpu_usage.get('total_usage', 0)
+    system = cpu_stats.get('system_cpu_usage', 0)
+    online_cpus = cpu_stats.get('online_cpus') or len(cpu_usage.get('percpu_usage') or []) or 1
+    cpu_percent = None
+    if previous_sample and system > previous_sample[1] and total >= previous_sample[0]:
+        cpu_percent = (total - previous_sample[0]) / (system - previous_sample[1]) * online_cpus * 100
+    memory_stats = stats.get('memory_stats') or {}
+    details = memory_stats.get('stats') or {}
+    # Comme docker stats : le cache de fichiers inactif n'est pas compté
+    usage = memory_stats.get('usage', 0) - details.get('inactive_file', details.get('total_inactive_file', 0))
+    metrics = {'cpu_percent': cpu_percent, 'mem_usage': max(usage, 0), 'mem_limit': memory_stats.get('limit')}
+    return cgroup_metrics.format_docker_stats(metrics), [total, system]
+
+def get_declared_gpus(host):
+    """GPU déclarés pour un nœud dans nodes.txt (colonne gpus), sans métriques"""
+    for node in scheduler.load_nodes():
+        if node['host'] == host:
+            return [gpu_telemetry.GpuDevice(index=index, name="déclaré dans nodes.txt (sans métriques)")
+                    for index in range(node['gpus'])]
+    return []
+
+def get_remote_gpus(client, host, timeout):
+    """GPU d'un hôte distant : nvidia-smi lancé dans son conteneur d'administration GPU_EXPORTER_CONTAINER
+    (image et binaires choisis par l'admin); à défaut, capacité déclarée dans nodes.txt"""
+    try:
+        info = client.inspect(GPU_EXPORTER_CONTAINER, timeout)
+        labels = (info.get('Config') or {}).get('Labels') or {}
+        if labels.get('rdp.role') == GPU_EXPORTER_ROLE and (info.get('State') or {}).get('Running'):
+            exit_code, stdout, _ = client.exec_run(GPU_EXPORTER_CONTAINER, ["nvidia-smi"] + gpu_telemetry.DEVICE_QUERY,
+                                                   timeout=timeout)
+            if exit_code == 0:
+                return gpu_telemetry.parse_devices(stdout)
+    except docker_api.DockerAPIError:
+        pass  # Conteneur absent (404) ou nœud lent : capacité déclarée
+    return get_declared_gpus(host)
+
+def get_remote_containers(host, filter_prefix="gui_user_", previous=None, deadline=COLLECT_DEADLINE):
+    """Conteneurs d'un hôte distant (adresse DOCKER_HOST), uniquement via son API Docker : liste,
+    inspect et stats en parallèle avec une seule date limite, comme get_containers_parallel.
+    Les sessions et la mémoire GPU par conteneur (lues sur l'hôte local) ne sont pas disponibles.
+    Retourne (conteneurs, GPU); lève docker_api.DockerAPIError si l'hôte est injoignable."""
+    end_time = time.time() + deadline
+    previous = previous or {}
+    client = docker_api.get_client(host)
+    containers_raw = client.containers(all=True, filters={'name': [filter_prefix]}, timeout=deadline)
+    containers_basic = []
+    for container in containers_raw:
+        container_name = container['Names'][0].lstrip('/') if container.get('Names') else container['Id'][:12]
+        if not container_name.startswith(filter_prefix):
+            continue
+        containers_basic.append({
+            'id': container['Id'][:12],
+            'name': container_name,
+            'username': container_name.replace(filter_prefix, ''),
+            'is_running': container.get('State') in ('running', 'paused'),
+            'image': container.get('Image') or "N/A"
+        })
+        _container_hosts[container['Id'][:12]] = host
+    if not containers_basic:
+        return [], get_remote_gpus(client, host, max(1, end_time - time.time()))
+    
+    power_users = get_power_users()
+    blocked_users = get_blocked_users()
+    
+    # Une requête par conteneur, sur les connexions keep-alive du client de l'hôte
+    timeout = max(1, end_time - time.time())
+    executor = ThreadPoolExecutor(max_workers=COLLECT_WORKERS)
+    inspects = {executor.submit(client.inspect, c['id'], timeout): c['name'] for c in containers_basic}
+    stats = {executor.submit(client.request, "GET", f"/containers/{c['id']}/stats",
+                             {"stream": "0", "one-shot": "1"}, timeout=timeout): c['name']
+             for c in containers_basic if c['is_running']}
+    wait(list(inspects) + list(stats), timeout=max(0, end_time - time.time()))
+    # Ne pas attendre les requêtes en retard : leurs conteneurs gardent les valeurs précédentes
+    executor.shutdown(wait=False)
+    
+    inspect_results = {name: future.result() for future, name in inspects.items()
+                       if future.done() and future.exception() is None}
+    stats_results = {}
+    samples = {}
+    for future, name in stats.items():
+        if future.done() and future.exception() is None:
+            stats_results[name], samples[name] = parse_remote_stats(
+                future.result(), previous.get(name, {}).get('cpu_sample'))
+    
+    containers = merge_container_details(containers_basic, inspect_results, stats_results, previous,
+                                         power_users, blocked_users, None)
+    for container in containers:
+        container['cpu_sample'] = samples.get(container['name'], previous.get(container['name'], {}).get('cpu_sample'))
+        container['sessions'] = None
+        container['service_connections'] = None
+    containers.sort(key=lambda c: (0 if c['is_running'] else 1, c['name']))
+    
+    remaining = end_time - time.time()
+    gpus = get_remote_gpus(client, host, remaining) if remaining > 1 else get_declared_gpus(host)
+    return containers, gpus
+
+def collect_host(host, previous, deadline):
+    """Relevé d'un hôte du tableau de bord multi-hôtes (dashboard_federation) : collecte complète
+    pour le démon local, API Docker seule pour les autres"""
+    if host['host'] is None:
+        return get_containers_parallel("gui_user_", previous, deadline), get_gpu_info()
+    return get_remote_containers(host['host'], "gui_user_", previous, deadline)
+
+def parse_percent(value):
+    """Convertit un pourcentage affiché ('12.5%') en nombre (0 si non mesuré, ex. 'N/A')"""
+    try:
+        return float(value.replace('%', '') or 0)
+    except (AttributeError, ValueError):
+        return 0.0
+
 def truncate_text(text, max_length):
     """Tronque le texte s'il est trop long et ajoute '...'"""
     if len(text) > max_length:
@@ -655,8 +968,10 @@ def truncate_text(text, max_length):
     return text
 
 
-def display_containers(containers):
-    """Affiche un tableau formaté avec les informations des conteneurs"""
+def display_containers(containers, history=None):
+    """Affiche un tableau formaté avec les informations des conteneurs
+    (avec history, la colonne 'CPU 1h' montre l'évolution du CPU sur la dernière heure;
+    colonne 'Hôte' avant l'image pour le tableau de bord multi-hôtes)"""
     if not containers:
         print(f"{Colors.YELLOW}Aucun conteneur trouvé.{Colors.END}")
         return
@@ -666,12 +981,17 @@ def display_containers(containers):
     
     # En-têtes de colonne
     headers = [
-        "ID", "Utilisateur", "Status", "CPU", "Mémoire", "GPU (MiB)", "Uptime", "Port", "Image"
+        "ID", "Utilisateur", "Status", "CPU", "CPU 1h", "Mémoire", "GPU (MiB)", "Uptime", "Port", "Sess.", "Image"
     ]
     
     # Calculer la largeur de chaque colonne en fonction de la largeur du terminal
-    total_fixed_width = 19  # 9 colonnes = 10 séparateurs (|) + bordures gauche et droite
-    widths = [12, 15, 8, 8, 20, 10, 12, 7]
+    total_fixed_width = 24  # 11 colonnes = 12 séparateurs (|) + bordures gauche et droite
+    widths = [12, 15, 8, 8, 12, 20, 10, 12, 7, 5]
+    show_host = any('host' in container for container in containers)
+    if show_host:
+        headers.insert(10, "Hôte")
+        widths.append(10)
+        total_fixed_width += 3
     
     # La colonne Image prend l'espace restant
     remaining_width = term_width - sum(widths) - total_fixed_width
@@ -699,8 +1019,8 @@ def display_containers(containers):
     gpu_color = Colors.YELLOW
     for container in containers:
         status_color = Colors.GREEN if container['is_running'] else Colors.RED
-        cpu_color = Colors.RED if container['is_running'] and float(container['cpu'].replace('%', '') or 0) > 80 else Colors.END
-        mem_color = Colors.RED if container['is_running'] and float(container['mem_perc'].replace('%', '') or 0) > 80 else Colors.END
+        cpu_color = Colors.RED if container['is_running'] and parse_percent(container['cpu']) > 80 else Colors.END
+        mem_color = Colors.RED if container['is_running'] and parse_percent(container['mem_perc']) > 80 else Colors.END
         
         # Formatage de l'info GPU avec l'utilisation en MiB
         gpu_str = ""
@@ -720,7 +1040,7 @@ def display_containers(containers):
         
         # S'assurer que la cellule GPU a toujours la bonne largeur visible
         visible_length = len(gpu_str)  # Longueur sans les codes de couleur
-        padding = widths[5] - visible_length
+        padding = widths[6] - visible_length
         gpu_info = f" {gpu_color}{gpu_str}{Colors.END}{' ' * padding} "
         
         # Tronquer le nom d'utilisateur séparément
@@ -747,20 +1067,32 @@ def display_containers(containers):
         username_padding = widths[1] - len(username_base) - (emoji_width if has_emoji else 0)
         username_cell += " " * username_padding
         
-        image = truncate_text(container['image'], widths[8])
+        image = truncate_text(container['image'], widths[-1])
+        
+        # Évolution du CPU sur la dernière heure (vide sans historique)
+        cpu_history = history.sparkline(container['name'], "cpu", widths[4]) if history is not None else ""
+        
+        # Nombre de sessions RDP actives (vide si inconnu ou conteneur arrêté)
+        sessions = container.get('sessions')
+        sessions_str = str(sessions) if sessions is not None else "-"
+        sessions_color = Colors.GREEN if sessions else Colors.END
         
         # Préparer les cellules
         cells = [
-            f" {container['id']:{widths[0]}} ",
+            f" {Colors.YELLOW if container.get('stale') else ''}{container['id']:{widths[0]}}{Colors.END} ",
             username_cell + " ",
             f" {status_color}{container['status']:{widths[2]}}{Colors.END} ",
             f" {cpu_color}{container['cpu']:{widths[3]}}{Colors.END} ",
-            f" {mem_color}{container['mem']:{widths[4]}}{Colors.END} ",
+            f" {Colors.CYAN}{cpu_history:{widths[4]}}{Colors.END} ",
+            f" {mem_color}{container['mem']:{widths[5]}}{Colors.END} ",
             gpu_info,
-            f" {container['uptime']:{widths[6]}} ",
-            f" {container['rdp_port']:{widths[7]}} ",
-            f" {image:{widths[8]}} "
+            f" {container['uptime']:{widths[7]}} ",
+            f" {container['rdp_port']:{widths[8]}} ",
+            f" {sessions_color}{sessions_str:{widths[9]}}{Colors.END} ",
+            f" {image:{widths[-1]}} "
         ]
+        if show_host:
+            cells.insert(10, f" {truncate_text(container.get('host', ''), widths[10]):{widths[10]}} ")
         
         # Concaténer les cellules pour former la ligne
         row = "|"
@@ -771,6 +1103,24 @@ def display_containers(containers):
     
     # Ligne de séparation finale
     print(separator)
+    if any(container.get('stale') for container in containers):
+        print(f"{Colors.YELLOW}ID en jaune : mesures non terminées à temps, valeurs du relevé précédent{Colors.END}")
+
+def display_host_summary(hosts):
+    """Affiche une ligne de synthèse par hôte (tableau de bord multi-hôtes)"""
+    print(f"{Colors.BOLD}{'Hôte':<12} {'État':<12} {'Conteneurs':>10} {'En cours':>9} {'GPU':>4} "
+          f"{'Collecte':>9}  {'Relevé':<9}{Colors.END}")
+    for host in hosts:
+        color = {dashboard_federation.HOST_OK: Colors.GREEN,
+                 dashboard_federation.HOST_SLOW: Colors.YELLOW}.get(host['status'], Colors.RED)
+        updated = datetime.fromtimestamp(host['time']).strftime('%H:%M:%S') if host['time'] else "-"
+        line = (f"{truncate_text(host['name'], 12):<12} {color}{host['status']:<12}{Colors.END} "
+                f"{host['containers']:>10} {host['running']:>9} {host['gpus']:>4} "
+                f"{host['duration']:>8.1f}s  {updated:<9}")
+        if host['error']:
+            # Hôte lent ou injoignable : ses conteneurs affichés sont ceux du dernier relevé réussi
+            line += f" {color}{truncate_text(host['error'], max(20, get_terminal_width() - 75))}{Colors.END}"
+        print(line)
 
 def display_gpu_info(gpus):
     """Affiche les informations sur les GPU disponibles"""
@@ -788,16 +1138,51 @@ def display_gpu_info(gpus):
     
     for gpu in gpus:
         # Définir les couleurs selon l'utilisation
-        temp_color = Colors.RED if float(gpu['temp']) > 80 else (Colors.YELLOW if float(gpu['temp']) > 70 else Colors.GREEN)
-        util_color = Colors.RED if float(gpu['gpu_util']) > 80 else (Colors.YELLOW if float(gpu['gpu_util']) > 60 else Colors.GREEN)
-        mem_color = Colors.RED if float(gpu['mem_util']) > 80 else (Colors.YELLOW if float(gpu['mem_util']) > 60 else Colors.GREEN)
+        temp_color = Colors.RED if gpu.temperature > 80 else (Colors.YELLOW if gpu.temperature > 70 else Colors.GREEN)
+        util_color = Colors.RED if gpu.gpu_util > 80 else (Colors.YELLOW if gpu.gpu_util > 60 else Colors.GREEN)
+        mem_color = Colors.RED if gpu.mem_util > 80 else (Colors.YELLOW if gpu.mem_util > 60 else Colors.GREEN)
         
-        print(f"| {Colors.BOLD}GPU {gpu['index']}:{Colors.END} {gpu['name']} (Driver: {gpu['driver']})")
-        print(f"| Température: {temp_color}{gpu['temp']}°C{Colors.END} | Utilisation: {util_color}{gpu['gpu_util']}%{Colors.END} | Mémoire: {mem_color}{gpu['mem_used']}MB / {gpu['mem_total']}MB ({gpu['mem_util']}%){Colors.END}")
+        print(f"| {Colors.BOLD}GPU {gpu.index}:{Colors.END} {gpu.name} (Driver: {gpu.driver})")
+        print(f"| Température: {temp_color}{gpu.temperature}°C{Colors.END} | Utilisation: {util_color}{gpu.gpu_util}%{Colors.END} | Mémoire: {mem_color}{gpu.mem_used}MB / {gpu.mem_total}MB ({gpu.mem_util}%){Colors.END}")
         print(separator)
     
     print()
 
+def display_gpu_usage(containers):
+    """Affiche l'utilisation GPU par conteneur et par GPU (un seul relevé nvidia-smi)"""
+    term_width = get_terminal_width()
+    separator = "+" + "-" * (term_width - 2) + "+"
+    snapshot = gpu_accounting.get_snapshot()
+    names = {c['full_id']: c['username'] for c in containers if 'full_id' in c}
+    
+    print(separator)
+    print(f"| {Colors.BOLD}Utilisation GPU par conteneur:{Colors.END}")
+    print(separator)
+    if not snapshot['processes']:
+        print(f"| {Colors.YELLOW}Aucun processus GPU en cours.{Colors.END}")
+        print(separator)
+        return
+    
+    print(f"| {Colors.BOLD}{'Utilisateur':<20} {'GPU':<8} {'Mémoire (MiB)':>14} {'SM %':>6} {'Processus':>10}{Colors.END}")
+    rows = sorted(snapshot['containers'].items(), key=lambda item: -item[1]['memory'])
+    for container_id, usage in rows:
+        name = names.get(container_id, container_id[:12])
+        for index, device in sorted(usage['devices'].items(), key=lambda item: str(item[0])):
+            mem_color = Colors.RED if device['memory'] > 4096 else Colors.END
+            print(f"| {truncate_text(name, 20):<20} {str(index):<8} {mem_color}{device['memory']:>14}{Colors.END} "
+                  f"{device['sm']:>6} {usage['processes']:>10}")
+    host = [p for p in snapshot['processes'] if not p['container_id']]
+    if host:
+        print(f"| {'(hôte)':<20} {'-':<8} {sum(p['memory'] for p in host):>14} "
+              f"{sum(p['sm'] for p in host):>6} {len(host):>10}")
+    print(separator)
+    
+    # Totaux par GPU
+    for index, device in sorted(snapshot['devices'].items(), key=lambda item: str(item[0])):
+        print(f"| GPU {index}: {device['memory']} MiB, SM {device['sm']}%, "
+              f"{device['processes']} processus, {len(device['containers'])} conteneur(s)")
+    print(separator)
+
 def display_menu():
     """Affiche le menu des actions possibles"""
     term_width = get_terminal_width()
@@ -817,6 +1202,9 @@ def display_menu():
     print(f"| 0. {Colors.RED}Bloquer/débloquer un utilisateur{Colors.END}")
     print(f"| A. {Colors.CYAN}Ajouter un nouvel utilisateur{Colors.END}")
     print(f"| R. {Colors.CYAN}Réinitialiser le mot de passe d'un utilisateur{Colors.END}")
+    print(f"| I. {Colors.CYAN}Importer des utilisateurs depuis un fichier CSV{Colors.END}")
+    print(f"| P. Afficher l'occupation des ports")
+    print(f"| B. {Colors.CYAN}Actions groupées (démarrer/arrêter/redémarrer/supprimer plusieurs conteneurs){Colors.END}")
     print(f"| q. Quitter")
     print(separator)
     print("Ton choix :")
@@ -833,36 +1221,27 @@ def display_menu():
 def start_container(container_id):
     """Démarre un conteneur Docker"""
     try:
+        client = get_docker_client(container_id)
+        container_info = client.inspect(container_id)
+        
         # Vérifier si l'utilisateur est bloqué
-        cmd = f"docker inspect {container_id} --format '{{{{.Name}}}}'"
-        container_name = subprocess.check_output(cmd, shell=True).decode().strip()
-        username = container_name.replace('/', '').replace('gui_user_', '')
+        username = container_info['Name'].replace('/', '').replace('gui_user_', '')
         
         if is_blocked(username):
             print(f"{Colors.RED}✗ Impossible de démarrer le conteneur car l'utilisateur {username} est bloqué.{Colors.END}")
             return False
         
         # Récupérer les ports mappés pour ce conteneur avant de le démarrer
-        cmd = f"docker inspect {container_id} --format '{{{{json .HostConfig.PortBindings}}}}'"
-        port_bindings_json = subprocess.check_output(cmd, shell=True).decode().strip()
-        port_bindings = json.loads(port_bindings_json if port_bindings_json != "null" else "{}")
+        port_bindings = container_info['HostConfig'].get('PortBindings') or {}
         
         # Essayer de démarrer le conteneur
         try:
-            subprocess.run(f"docker start {container_id}", shell=True, check=True)
+            client.start(container_id)
             print(f"{Colors.GREEN}✓ Conteneur {container_id} démarré avec succès.{Colors.END}")
             return True
-        except subprocess.CalledProcessError as e:
-            # Vérifier si l'erreur est due à un conflit de port
-            error_output = str(e.stderr) if hasattr(e, 'stderr') else ""
-            
-            # Si on peut pas accéder à stderr, on essaie de récupérer la sortie standard
-            if not error_output:
-                try:
-                    # Exécuter la commande à nouveau pour capturer l'erreur
-                    error_output = subprocess.check_output(f"docker start {container_id} 2>&1", shell=True, stderr=subprocess.STDOUT).decode()
-                except subprocess.CalledProcessError as e2:
-                    error_output = e2.output.decode() if hasattr(e2, 'output') else ""
+        except docker_api.DockerAPIError as e:
+            # Le message d'erreur du démon indique un éventuel conflit de port
+            error_output = str(e)
             
             # Chercher les indices d'un conflit de port dans l'erreur
             port_conflict = False
@@ -904,15 +1283,21 @@ def start_container(container_id):
                                 time.sleep(1)
                                 # Essayer de démarrer à nouveau le conteneur original
                                 try:
-                                    subprocess.run(f"docker start {container_id}", shell=True, check=True)
+                                    client.start(container_id)
                                     print(f"{Colors.GREEN}✓ Conteneur {container_id} démarré avec succès après résolution du conflit.{Colors.END}")
                                     return True
-                                except subprocess.CalledProcessError:
+                                except docker_api.DockerAPIError:
                                     print(f"{Colors.RED}✗ Erreur lors du démarrage du conteneur {container_id} même après résolution du conflit.{Colors.END}")
                                     return False
+                            return False
                         else:
                             print(f"{Colors.YELLOW}Démarrage annulé.{Colors.END}")
                             return False
+                    else:
+                        # Aucun conteneur en cours ne publie ce port : il est tenu par un autre processus de l'hôte
+                        print(f"{Colors.YELLOW}⚠ Aucun conteneur en cours n'utilise le port {conflicted_port} : "
+                              f"il est occupé par un autre processus de la machine (vérifie avec ss -ltnp).{Colors.END}")
+                        return False
                 else:
                     print(f"{Colors.YELLOW}⚠ Un port est déjà utilisé par un autre conteneur, mais impossible de déterminer lequel.{Colors.END}")
                     return False
@@ -928,18 +1313,16 @@ def start_container(container_id):
 def stop_container(container_id):
     """Arrête un conteneur Docker"""
     try:
-        subprocess.run(f"docker stop {container_id}", shell=True, check=True)
+        get_docker_client(container_id).stop(container_id)
         print(f"{Colors.YELLOW}⚠ Conteneur {container_id} arrêté.{Colors.END}")
         return True
-    except subprocess.CalledProcessError:
-        print(f"{Colors.RED}✗ Erreur lors de l'arrêt du conteneur {container_id}.{Colors.END}")
+    except docker_api.DockerAPIError as e:
+        print(f"{Colors.RED}✗ Erreur lors de l'arrêt du conteneur {container_id}: {e}{Colors.END}")
         return False
 
 def show_logs(container_id, lines=50):
     """Affiche les logs d'un conteneur Docker"""
     try:
-        logs = subprocess.check_output(f"docker logs --tail={lines} {container_id}", shell=True).decode()
-        
         term_width = get_terminal_width()
         separator = "+" + "-" * (term_width - 2) + "+"
         
@@ -947,18 +1330,18 @@ def show_logs(container_id, lines=50):
         print(f"| {Colors.CYAN}Dernières {lines} lignes de logs pour {container_id}{Colors.END}")
         print(separator)
         
-        # Traiter et afficher les logs avec une bonne indentation
-        for line in logs.split('\n'):
+        # Afficher les logs au fil de la lecture avec une bonne indentation
+        for stream, line in get_docker_client(container_id).logs(container_id, tail=lines):
             if line:
                 # Tronquer les lignes trop longues
                 if len(line) > term_width - 4:
                     line = line[:term_width - 7] + "..."
-                print(f"| {line}")
+                print(f"| {line}" if stream != 2 else f"| {Colors.YELLOW}{line}{Colors.END}")
         
         print(separator)
         input(f"{Colors.BOLD}Appuie sur Entrée pour revenir au menu...{Colors.END}")
-    except subprocess.CalledProcessError:
-        print(f"{Colors.RED}✗ Erreur lors de la récupération des logs du conteneur {container_id}.{Colors.END}")
+    except docker_api.DockerAPIError as e:
+        print(f"{Colors.RED}✗ Erreur lors de la récupération des logs du conteneur {container_id}: {e}{Colors.END}")
 
 def exec_command(container_id, command=None):
     """Exécute une commande dans un conteneur Docker"""
@@ -973,20 +1356,22 @@ def exec_command(container_id, command=None):
         print(f"| {Colors.CYAN}Exécution de '{command}' dans {container_id}{Colors.END}")
         print(separator)
         
-        # Exécuter la commande et capturer la sortie
-        output = subprocess.check_output(f"docker exec {container_id} {command}", shell=True).decode()
-        
-        # Afficher la sortie avec une bonne indentation
-        for line in output.split('\n'):
+        # Exécuter la commande (découpée en arguments, sans shell) et afficher sa sortie au fil de l'eau
+        client = get_docker_client(container_id)
+        exec_id, output = client.exec_stream(container_id, shlex.split(command), timeout=EXEC_TIMEOUT)
+        for stream, line in output:
             if line:
                 # Tronquer les lignes trop longues
                 if len(line) > term_width - 4:
                     line = line[:term_width - 7] + "..."
-                print(f"| {line}")
+                print(f"| {line}" if stream != 2 else f"| {Colors.YELLOW}{line}{Colors.END}")
+        exit_code = client.exec_exit_code(exec_id)
+        if exit_code:
+            print(f"| {Colors.RED}Code de sortie: {exit_code}{Colors.END}")
                 
         print(separator)
         input(f"{Colors.BOLD}Appuie sur Entrée pour revenir au menu...{Colors.END}")
-    except subprocess.CalledProcessError as e:
+    except (docker_api.DockerAPIError, ValueError) as e:
         print(f"{Colors.RED}✗ Erreur lors de l'exécution de la commande: {e}{Colors.END}")
         input(f"{Colors.BOLD}Appuie sur Entrée pour revenir au menu...{Colors.END}")
 
@@ -995,10 +1380,10 @@ def remove_container(container_id):
     confirm = input(f"{Colors.RED}⚠ ATTENTION: Tu veux vraiment supprimer le conteneur {container_id}? (o/N): {Colors.END}")
     if confirm.lower() == 'o':
         try:
-            subprocess.run(f"docker rm -f {container_id}", shell=True, check=True)
+            get_docker_client(container_id).remove(container_id, force=True)
             print(f"{Colors.RED}✓ Conteneur {container_id} supprimé.{Colors.END}")
-        except subprocess.CalledProcessError:
-            print(f"{Colors.RED}✗ Erreur lors de la suppression du conteneur {container_id}.{Colors.END}")
+        except docker_api.DockerAPIError as e:
+            print(f"{Colors.RED}✗ Erreur lors de la suppression du conteneur {container_id}: {e}{Colors.END}")
     else:
         print(f"{Colors.YELLOW}Suppression annulée.{Colors.END}")
 
@@ -1013,15 +1398,13 @@ def test_gpu(container_id):
         
         # 1. Vérifier si nvidia-smi est disponible
         print(f"| {Colors.BOLD}1. Test nvidia-smi:{Colors.END}")
-        nvidia_smi = subprocess.run(f"docker exec {container_id} nvidia-smi", 
-                                  shell=True, 
-                                  stdout=subprocess.PIPE, 
-                                  stderr=subprocess.PIPE)
+        client = get_docker_client(container_id)
+        exit_code, stdout, stderr = client.exec_run(container_id, ["nvidia-smi"], timeout=EXEC_TIMEOUT)
         
-        if nvidia_smi.returncode == 0:
+        if exit_code == 0:
             print(f"| {Colors.GREEN}✓ nvidia-smi fonctionne correctement{Colors.END}")
             # Formater la sortie de nvidia-smi
-            for line in nvidia_smi.stdout.decode().split('\n'):
+            for line in stdout.split('\n'):
                 if line:
                     # Tronquer les lignes trop longues
                     if len(line) > term_width - 4:
@@ -1029,7 +1412,7 @@ def test_gpu(container_id):
                     print(f"| {line}")
         else:
             print(f"| {Colors.RED}✗ nvidia-smi n'est pas disponible{Colors.END}")
-            print(f"| Erreur: {nvidia_smi.stderr.decode()}")
+            print(f"| Erreur: {stderr or stdout}")
         
         print(separator)
         
@@ -1037,26 +1420,20 @@ def test_gpu(container_id):
         print(f"| {Colors.BOLD}2. Périphériques NVIDIA:{Colors.END}")
         
         # D'abord essayer ls -la sur /dev/nvidia*
-        devices = subprocess.run(f"docker exec {container_id} ls -la /dev/nvidia*", 
-                               shell=True,
-                               stdout=subprocess.PIPE,
-                               stderr=subprocess.PIPE)
+        exit_code, stdout, _ = client.exec_run(container_id, ["sh", "-c", "ls -la /dev/nvidia*"], timeout=EXEC_TIMEOUT)
         
-        if devices.returncode == 0:
+        if exit_code == 0:
             print(f"| {Colors.GREEN}✓ Périphériques NVIDIA disponibles:{Colors.END}")
-            for line in devices.stdout.decode().split('\n'):
+            for line in stdout.split('\n'):
                 if line:
                     print(f"| {line}")
         else:
             print(f"| {Colors.RED}✗ Aucun périphérique /dev/nvidia* trouvé{Colors.END}")
             
             # Si échec, vérifier si le conteneur a accès aux GPU via --gpus
-            check_gpu_option = subprocess.run(f"docker inspect --format='{{{{.HostConfig.DeviceRequests}}}}' {container_id}", 
-                                           shell=True,
-                                           stdout=subprocess.PIPE,
-                                           stderr=subprocess.PIPE)
+            device_requests = client.inspect(container_id)['HostConfig'].get('DeviceRequests') or []
             
-            if "nvidia" in check_gpu_option.stdout.decode():
+            if "nvidia" in json.dumps(device_requests) or any(r.get('Capabilities') for r in device_requests):
                 print(f"| {Colors.YELLOW}⚠️ Le conteneur a l'option --gpus mais les périphériques ne sont pas visibles{Colors.END}")
                 print(f"| {Colors.YELLOW}⚠️ Vérifie que nvidia-container-toolkit est installé et fonctionne correctement{Colors.END}")
             else:
@@ -1067,13 +1444,12 @@ def test_gpu(container_id):
 
         # 3. Vérifier que CUDA est disponible
         print(f"| {Colors.BOLD}3. Test de l'environnement CUDA:{Colors.END}")
-        cuda_check = subprocess.run(f"docker exec {container_id} bash -c 'command -v nvidia-smi && echo \"CUDA_VERSION: $CUDA_VERSION\" && echo \"NVIDIA_DRIVER_CAPABILITIES: $NVIDIA_DRIVER_CAPABILITIES\" && find /usr -name \"*libcuda*\" 2>/dev/null || echo \"Aucune librairie CUDA trouvée\"'", 
-                                  shell=True, 
-                                  stdout=subprocess.PIPE, 
-                                  stderr=subprocess.PIPE)
+        exit_code, output, _ = client.exec_run(container_id, [
+            "bash", "-c",
+            'command -v nvidia-smi && echo "CUDA_VERSION: $CUDA_VERSION" && echo "NVIDIA_DRIVER_CAPABILITIES: $NVIDIA_DRIVER_CAPABILITIES" && find /usr -name "*libcuda*" 2>/dev/null || echo "Aucune librairie CUDA trouvée"'
+        ], timeout=EXEC_TIMEOUT)
         
-        if cuda_check.returncode == 0:
-            output = cuda_check.stdout.decode()
+        if exit_code == 0:
             if "libcuda" in output:
                 print(f"| {Colors.GREEN}✓ L'environnement CUDA semble correctement configuré:{Colors.END}")
             else:
@@ -1139,6 +1515,189 @@ def select_container(containers, action_name):
         except ValueError:
             print(f"{Colors.RED}Entre un numéro, pas du texte !{Colors.END}")
 
+BULK_ACTIONS = {
+    '1': ("démarrer", "start"),
+    '2': ("arrêter", "stop"),
+    '3': ("redémarrer", "restart"),
+    '4': ("supprimer", "remove"),
+}
+
+def parse_selection(text, count):
+    """Convertit une saisie '1,3,5-8' (ou '*' pour tous) en indices de la liste (base 0)"""
+    if text.strip() == '*':
+        return list(range(count))
+    indices = []
+    for part in text.replace(' ', '').split(','):
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            numbers = range(int(first), int(last) + 1)
+        else:
+            numbers = [int(part)]
+        for number in numbers:
+            if not 1 <= number <= count:
+                raise ValueError(f"numéro hors limites: {number}")
+            if number - 1 not in indices:
+                indices.append(number - 1)
+    return indices
+
+def get_idle_times(containers):
+    """Secondes d'inactivité de chaque conteneur (nom -> secondes, None si inconnue) :
+    0 avec une session RDP active, sinon depuis la dernière activité relevée par idle_reaper.py"""
+    activity = idle_reaper.load_activity()
+    now = time.time()
+    idle = {}
+    for container in containers:
+        if container.get('sessions'):
+            idle[container['name']] = 0
+        elif container['name'] in activity:
+            idle[container['name']] = now - activity[container['name']]
+        else:
+            idle[container['name']] = None
+    return idle
+
+def filter_containers(containers, criteria):
+    """Applique des critères 'image=xfce inactif=2h bloqués arrêtés en_cours' (tous doivent correspondre)"""
+    selected = list(containers)
+    for criterion in criteria.split():
+        key, _, value = criterion.partition('=')
+        key = key.lower()
+        if key == 'image':
+            selected = [c for c in selected if value.lower() in c['image'].lower()]
+        elif key in ('inactif', 'idle'):
+            minimum = idle_reaper.parse_duration(value) or 0
+            idle = get_idle_times(selected)
+            selected = [c for c in selected if idle[c['name']] is not None and idle[c['name']] >= minimum]
+        elif key in ('bloqués', 'bloques', 'blocked'):
+            selected = [c for c in selected if c.get('is_blocked')]
+        elif key in ('arrêtés', 'arretes', 'stopped'):
+            selected = [c for c in selected if not c['is_running']]
+        elif key in ('en_cours', 'running'):
+            selected = [c for c in selected if c['is_running']]
+        elif key in ('gpu',):
+            selected = [c for c in selected if c.get('has_gpu')]
+        else:
+            raise ValueError(f"critère inconnu: {criterion}")
+    return selected
+
+def apply_bulk_action(action, container):
+    """Applique une action à un conteneur sans interaction (lève une exception en cas d'échec)"""
+    client = get_docker_client(container['id'])
+    if action in ("start", "restart") and container.get('is_blocked'):
+        raise RuntimeError(f"utilisateur {container['username']} bloqué")
+    if action == "start":
+        client.start(container['id'])
+    elif action == "stop":
+        client.stop(container['id'], grace=BULK_STOP_GRACE)
+    elif action == "restart":
+        client.restart(container['id'], grace=BULK_STOP_GRACE)
+    elif action == "remove":
+        client.remove(container['id'], force=True)
+
+def run_bulk_action(action, containers, workers=BULK_WORKERS):
+    """Applique une action à plusieurs conteneurs en parallèle (au plus workers à la fois) en
+    affichant la progression. Retourne (noms réussis, {nom: erreur})."""
+    succeeded = []
+    failures = {}
+    if not containers:
+        return succeeded, failures
+    total = len(containers)
+    bar_width = max(10, min(40, get_terminal_width() - 50))
+    start = time.time()
+    
+    def show_progress(last_name=""):
+        done = len(succeeded) + len(failures)
+        filled = bar_width * done // total
+        bar = "█" * filled + "░" * (bar_width - filled)
+        line = (f"[{bar}] {done}/{total} {Colors.GREEN}✓ {len(succeeded)}{Colors.END} "
+                f"{Colors.RED}✗ {len(failures)}{Colors.END} {time.time() - start:.0f}s {truncate_text(last_name, 20)}")
+        print(f"\r{line}\033[K", end="", flush=True)
+    
+    show_progress()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = {executor.submit(apply_bulk_action, action, container): container for container in containers}
+    pending = set(futures)
+    while pending:
+        # Réveil régulier pour tenir le compteur de temps à jour même si une action est longue
+        done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = futures[future]['name']
+            if future.exception() is not None:
+                failures[name] = str(future.exception())
+            else:
+                succeeded.append(name)
+        show_progress(name if done else "")
+    executor.shutdown()
+    print()
+    return succeeded, failures
+
+def bulk_actions(containers):
+    """Actions groupées : sélection multiple ou par critères, puis exécution en parallèle"""
+    if not containers:
+        print(f"{Colors.YELLOW}Aucun conteneur disponible pour cette action.{Colors.END}")
+        input("Appuie sur Entrée pour continuer...")
+        return
+    
+    term_width = get_terminal_width()
+    separator = "+" + "-" * (term_width - 2) + "+"
+    
+    print(separator)
+    print(f"| {Colors.BOLD}Action groupée:{Colors.END}")
+    for key, (label, _) in BULK_ACTIONS.items():
+        print(f"| {key}. {label.capitalize()}")
+    print(f"| 0. Annuler")
+    print(separator)
+    choice = input("Ton choix : ").strip()
+    if choice not in BULK_ACTIONS:
+        return
+    label, action = BULK_ACTIONS[choice]
+    
+    idle = get_idle_times(containers)
+    print(separator)
+    for i, container in enumerate(containers):
+        status = "En cours" if container['is_running'] else "Arrêté"
+        status_color = Colors.GREEN if container['is_running'] else Colors.RED
+        idle_info = f" inactif {timedelta(seconds=int(idle[container['name']]))}" if idle[container['name']] else ""
+        blocked_info = f" {Colors.RED}[🔒BLOQUÉ]{Colors.END}" if container.get('is_blocked') else ""
+        print(f"| {i+1}. {container['username']} ({container['image']}) - {status_color}{status}{Colors.END}{idle_info}{blocked_info}")
+    print(separator)
+    print(f"| Numéros : '1,3,5-8' ou '*' pour tous")
+    print(f"| Critères : 'image=xfce', 'inactif=2h', 'bloqués', 'en_cours', 'arrêtés', 'gpu' (combinables)")
+    print(separator)
+    
+    text = input(f"Conteneurs à {label} : ").strip()
+    if not text:
+        return
+    try:
+        if text == '*' or text[0].isdigit():
+            selected = [containers[i] for i in parse_selection(text, len(containers))]
+        else:
+            selected = filter_containers(containers, text)
+    except ValueError as e:
+        print(f"{Colors.RED}Sélection invalide: {e}{Colors.END}")
+        input("Appuie sur Entrée pour continuer...")
+        return
+    if not selected:
+        print(f"{Colors.YELLOW}Aucun conteneur ne correspond.{Colors.END}")
+        input("Appuie sur Entrée pour continuer...")
+        return
+    
+    names = ', '.join(c['username'] for c in selected[:10]) + (f"... (+{len(selected) - 10})" if len(selected) > 10 else "")
+    confirm_color = Colors.RED if action == "remove" else Colors.YELLOW
+    confirm = input(f"{confirm_color}{label.capitalize()} {len(selected)} conteneur(s) : {names} ? (o/N): {Colors.END}")
+    if confirm.lower() != 'o':
+        print(f"{Colors.YELLOW}Action annulée.{Colors.END}")
+        return
+    
+    succeeded, failures = run_bulk_action(action, selected)
+    print(f"{Colors.GREEN}✓ {len(succeeded)} conteneur(s) traité(s).{Colors.END}")
+    if failures:
+        print(f"{Colors.RED}✗ {len(failures)} échec(s):{Colors.END}")
+        for name, error in sorted(failures.items()):
+            print(f"|   {name}: {truncate_text(error, term_width - len(name) - 8)}")
+    input(f"{Colors.BOLD}Appuie sur Entrée pour revenir au menu...{Colors.END}")
+
 def manage_power_users(containers):
     """Interface pour gérer les power users"""
     term_width = get_terminal_width()
@@ -1483,6 +2042,44 @@ def add_new_user():
 
     input("Appuie sur Entrée pour revenir au menu...")
 
+def import_users_menu():
+    """Interface d'import d'utilisateurs depuis un fichier CSV"""
+    term_width = get_terminal_width()
+    separator = "+" + "-" * (term_width - 2) + "+"
+    
+    clear_screen()
+    
+    print(f"{Colors.HEADER}{Colors.BOLD}{'=' * term_width}{Colors.END}")
+    title = "IMPORT D'UTILISATEURS (CSV)"
+    padding = (term_width - len(title)) // 2
+    print(f"{Colors.HEADER}{Colors.BOLD}{' ' * padding}{title}{Colors.END}")
+    print(f"{Colors.HEADER}{Colors.BOLD}{'=' * term_width}{Colors.END}")
+    
+    print(separator)
+    print(f"| Format: username[,password[,image]] (une ligne par utilisateur, en-tête facultatif)")
+    print(f"| Sans mot de passe, un mot de passe temporaire est généré. Image par défaut: {DEFAULT_IMAGE}")
+    print(separator)
+    
+    path = input("Fichier CSV: ").strip()
+    if not path:
+        return
+    if not os.path.exists(path):
+        print(f"{Colors.RED}✗ Fichier introuvable: {path}{Colors.END}")
+        input("Appuie sur Entrée pour revenir au menu...")
+        return
+    
+    print("Import en cours (hachage des mots de passe en parallèle)...")
+    start = time.time()
+    try:
+        created, errors = import_users(path)
+    except Exception as e:
+        print(f"{Colors.RED}✗ Erreur lors de l'import: {e}{Colors.END}")
+        input("Appuie sur Entrée pour revenir au menu...")
+        return
+    print_import_report(created, errors)
+    print(f"Import terminé en {time.time() - start:.1f}s")
+    input("Appuie sur Entrée pour revenir au menu...")
+
 # Fonction pour la réinitialisation de mot de passe
 def reset_user_password():
     """Interface pour réinitialiser le mot de passe d'un utilisateur"""
@@ -1572,6 +2169,13 @@ def main():
     """Fonction principale du tableau de bord"""
     parser = argparse.ArgumentParser(description="Tableau de bord admin pour conteneurs Docker")
     parser.add_argument('-i', '--interval', type=int, default=200, help='Intervalle de rafraîchissement en secondes (0 pour désactiver)')
+    parser.add_argument('-d', '--deadline', type=float, default=COLLECT_DEADLINE, help='Durée maximale d\'un cycle de collecte (secondes)')
+    parser.add_argument('--tui', action='store_true', help='Interface plein écran (curses) avec défilement, tri et filtres')
+    parser.add_argument('--import-users', metavar='CSV', help='Importer des utilisateurs depuis un CSV (username[,password[,image]]) puis quitter')
+    parser.add_argument('--history-hours', type=float, help=f'Durée de l\'historique des métriques en heures (défaut: {metrics_history.DEFAULT_HOURS})')
+    parser.add_argument('--history-resolution', type=int, help=f'Secondes par point de l\'historique (défaut: {metrics_history.DEFAULT_RESOLUTION})')
+    parser.add_argument('--history-reset', action='store_true', help='Efface l\'historique des métriques pour appliquer --history-hours / --history-resolution')
+    parser.add_argument('--hosts', nargs='?', const='*', metavar='HÔTES', help='Tableau de bord multi-hôtes : nœuds de nodes.txt ou adresses DOCKER_HOST séparés par des virgules, "local" pour ce démon (sans valeur : tous les nœuds)')
     args = parser.parse_args()
 
 
@@ -1630,6 +2234,15 @@ def main():
                 print(f"{Colors.RED}Trop de tentatives incorrectes. Fermeture du programme.{Colors.END}")
                 sys.exit(1)
     
+    if args.import_users:
+        try:
+            created, errors = import_users(args.import_users)
+        except Exception as e:
+            print(f"{Colors.RED}✗ Erreur lors de l'import: {e}{Colors.END}")
+            return
+        print_import_report(created, errors)
+        return
+    
     refresh_interval = args.interval
     auto_refresh = refresh_interval > 0
     
@@ -1643,10 +2256,47 @@ def main():
         with open(BLOCKED_USERS_FILE, 'w') as f:
             f.write("# Liste des utilisateurs bloqués (un par ligne)\n")
     
+    # Historique des métriques, conservé entre deux lancements
+    try:
+        history = metrics_history.MetricsHistory(hours=args.history_hours, resolution=args.history_resolution,
+                                                 reset=args.history_reset)
+    except (OSError, ValueError) as e:
+        print(f"{Colors.YELLOW}Historique des métriques indisponible: {e}{Colors.END}")
+        history = None
+    
+    # Collecte en arrière-plan : l'affichage lit le dernier relevé publié sans attendre
+    if args.hosts is not None:
+        # Plusieurs hôtes collectés en parallèle, chacun avec la date limite du cycle
+        try:
+            hosts = dashboard_federation.parse_hosts(args.hosts)
+        except ValueError as e:
+            print(f"{Colors.RED}✗ {e}{Colors.END}")
+            return
+        federation = dashboard_federation.Federation(hosts, collect_host)
+        collector = dashboard_collector.SnapshotCollector(
+            federation.collect_containers, federation.collect_gpus, refresh_interval, args.deadline,
+            history=history, collect_hosts=federation.summaries
+        )
+    else:
+        collector = dashboard_collector.SnapshotCollector(
+            lambda previous, deadline: get_containers_parallel("gui_user_", previous, deadline),
+            get_gpu_info, refresh_interval, args.deadline, history=history
+        )
+    # Messages des threads de collecte (ce module, télémétrie GPU, cache d'état...) : barre d'état
+    logging.getLogger().addHandler(dashboard_collector.MessageHandler(collector.add_message))
+    collector.start()
+    
+    if args.tui:
+        import dashboard_tui
+        dashboard_tui.run_tui(collector)
+        return
+    
     try:
         while True:
             clear_screen()
             term_width = get_terminal_width()
+            snapshot = collector.get_snapshot()
+            shown_version = collector.version
             
             # En-tête stylisé
             print(f"{Colors.HEADER}{Colors.BOLD}{'=' * term_width}{Colors.END}")
@@ -1655,52 +2305,66 @@ def main():
             print(f"{Colors.HEADER}{Colors.BOLD}{' ' * padding}{title}{Colors.END}")
             print(f"{Colors.HEADER}{Colors.BOLD}{'=' * term_width}{Colors.END}")
             
-            # Infos de mise à jour
-            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            # Infos de mise à jour (date du relevé affiché, pas de l'affichage)
+            if snapshot['time']:
+                updated = datetime.fromtimestamp(snapshot['time']).strftime('%Y-%m-%d %H:%M:%S')
+            else:
+                updated = "en attente du premier relevé..."
+            if snapshot.get('persisted'):
+                updated += f" {Colors.YELLOW}(relevé enregistré, actualisation en cours){Colors.END}"
+            elif collector.busy:
+                updated += " (actualisation en cours)"
             refresh_mode = f"Rafraîchissement auto ({refresh_interval}s)" if auto_refresh else "Manuel"
-            print(f"Dernière mise à jour: {now} | Mode: {refresh_mode}")
+            print(f"Dernière mise à jour: {updated} | Mode: {refresh_mode}")
+            if collector.last_message:
+                print(f"{Colors.YELLOW}{collector.last_message}{Colors.END}")
             
-            # Récupérer les infos GPU du système - optimisé avec cache
-            gpus = get_gpu_info()
+            # Infos GPU du système, issues du même relevé
+            gpus = snapshot['gpus']
             if gpus:
                 separator = "+" + "-" * (term_width - 2) + "+"
                 print(separator)
-                gpu_info = [f"{gpu['name']} ({gpu['mem_util']}%)" for gpu in gpus]
+                gpu_info = [f"{gpu.host + ': ' if gpu.host else ''}{gpu.name} ({gpu.mem_util}%)" for gpu in gpus]
                 gpu_summary = f"{Colors.GREEN}✓{Colors.END} {len(gpus)} GPU(s) détecté(s): {', '.join(gpu_info)}"
                 print(f"| {gpu_summary}")
             
-            # Récupérer les infos conteneurs - en parallèle pour améliorer la performance
-            containers = get_containers_parallel("gui_user_")
-            display_containers(containers)
+            if snapshot['hosts']:
+                display_host_summary(snapshot['hosts'])
+            
+            containers = snapshot['containers']
+            display_containers(containers, history)
             display_menu()
             
-            # Attente de l'input utilisateur avec timeout si auto-refresh est activé
+            # Attente de l'input utilisateur; l'écran est redessiné dès qu'un nouveau relevé est publié
             if auto_refresh:
                 import select
                 import sys
-                # Limiter le timeout pour éviter une attente trop longue
-                actual_refresh = min(refresh_interval, 60)  # Maximum 60 secondes
-                # Attente de l'input avec timeout
-                rlist, _, _ = select.select([sys.stdin], [], [], actual_refresh)
-                if rlist:
-                    # L'utilisateur a saisi quelque chose
-                    choice = sys.stdin.readline().strip()
-                else:
-                    # Timeout - rafraîchissement automatique
+                choice = None
+                while choice is None:
+                    rlist, _, _ = select.select([sys.stdin], [], [], 1)
+                    if rlist:
+                        # L'utilisateur a saisi quelque chose
+                        choice = sys.stdin.readline().strip()
+                    elif collector.version != shown_version:
+                        break
+                if choice is None:
+                    # Nouveau relevé disponible - rafraîchissement de l'affichage
                     continue
             else:
                 choice = input()
             
             if not choice:
-                # Entrée vide = rafraîchir
+                # Entrée vide = rafraîchir (sans attendre : le relevé actuel reste affiché)
+                collector.request_refresh()
                 continue
             
             if choice.lower() == 'q':
                 break
             
             if choice == '1':
-                # Rafraîchir - rien à faire, la boucle s'en charge
-                pass
+                # Rafraîchir : nouveau cycle de collecte, attendu au plus une seconde
+                collector.request_refresh()
+                collector.wait_for_update(shown_version, 1)
             
             elif choice == '2':
                 # Démarrer un conteneur
@@ -1760,24 +2424,8 @@ def main():
                 gpus = get_gpu_info()
                 display_gpu_info(gpus)
                 
-                # Afficher les processus utilisant le GPU
-                try:
-                    separator = "+" + "-" * (term_width - 2) + "+"
-                    print(separator)
-                    print(f"| {Colors.BOLD}Processus utilisant le GPU:{Colors.END}")
-                    print(separator)
-                    
-                    # Ajouter un timeout pour éviter le blocage
-                    nvidia_smi_proc = subprocess.check_output("nvidia-smi --query-compute-apps=pid,process_name,used_gpu_memory --format=csv", 
-                                                            shell=True, 
-                                                            timeout=1).decode()
-                    for line in nvidia_smi_proc.split('\n'):
-                        if line:
-                            print(f"| {line}")
-                    
-                    print(separator)
-                except (subprocess.TimeoutExpired, subprocess.CalledProcessError):
-                    print(f"{Colors.YELLOW}| Impossible de récupérer les processus GPU.{Colors.END}")
+                # Afficher l'utilisation GPU par conteneur
+                display_gpu_usage(containers)
                 
                 input(f"{Colors.BOLD}Appuie sur Entrée pour revenir au menu principal...{Colors.END}")
             
@@ -1797,9 +2445,26 @@ def main():
                 # Réinitialiser le mot de passe d'un utilisateur
                 reset_user_password()
             
+            elif choice.lower() == 'i':
+                # Import d'utilisateurs en masse
+                import_users_menu()
+            
+            elif choice.lower() == 'b':
+                # Actions groupées en parallèle
+                bulk_actions(containers)
+            
+            elif choice.lower() == 'p':
+                # Qui occupe quel port
+                clear_screen()
+                display_port_usage()
+                input(f"{Colors.BOLD}Appuie sur Entrée pour revenir au menu principal...{Colors.END}")
+            
             else:
                 print(f"{Colors.RED}Choix invalide. Appuie sur Entrée pour continuer...{Colors.END}")
                 input()
+            
+            # Les actions modifient l'état des conteneurs : relevé suivant sans attendre l'intervalle
+            collector.request_refresh()
                 
     except KeyboardInterrupt:
         print("\nArrêt du tableau de bord. À bientôt !")
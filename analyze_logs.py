@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Analyse des journaux pour dimensionner les machines à partir de l'usage réel.
+Sources : launch_log.jsonl et ses archives .gz (lancements, reconnexions, actions de idle_reaper.py),
+et cleanup.log pour les mises en veille antérieures au journal structuré.
+Les fichiers sont décodés en flux, ligne par ligne, dans des colonnes typées (array) : pas d'objet
+Python gardé par événement. Quantiles, regroupements et pics horaires sont vectorisés avec numpy
+s'il est installé (calcul en Python pur sinon, plus lent sur des mois de journaux).
+Rapports : latence de lancement p50/p95/p99 par image, par mode et par étape de script.sh,
+pic de sessions simultanées par heure de la journée, devenir des bureaux inactifs, plus gros consommateurs.
+Exécuter avec: python3 analyze_logs.py                  (tout l'historique)
+          ou: python3 analyze_logs.py --since 30d      (30 derniers jours)
+          ou: python3 analyze_logs.py --export lancements.csv   (ou .parquet avec pyarrow)
+"""
+import re
+import csv
+import time
+import argparse
+from array import array
+from datetime import datetime
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+import launch_log
+import scheduler
+from idle_reaper import LOG_FILE as CLEANUP_LOG_FILE, CONTAINER_PREFIX, parse_duration
+
+QUANTILES = (50, 95, 99)
+DEFAULT_TOP = 10
+SESSION_ACTIONS = ('freeze', 'stop', 'checkpoint')  # Actions de idle_reaper.py qui terminent une session
+
+# Lignes de idle_reaper.log() dans cleanup.log (historique antérieur à launch_log.jsonl)
+CLEANUP_PATTERNS = (
+    (re.compile(r"^(\S+ \S+) - Conteneur (\S+) inactif depuis (\d+) minutes, arrêt"), 'stop'),
+    (re.compile(r"^(\S+ \S+) - Conteneur (\S+) inactif depuis (\d+) minutes, gel"), 'freeze'),
+    (re.compile(r"^(\S+ \S+) - Conteneur (\S+) arrêté depuis (\d+) minutes, archivage"), 'archive'),
+    (re.compile(r"^(\S+ \S+) - Connexion détectée sur le conteneur gelé (\S+), dégel()"), 'thaw'),
+)
+
+class Codes:
+    """Dictionnaire de chaînes : chaque valeur distincte reçoit un entier (colonnes numériques)"""
+
+    def __init__(self):
+        self.index = {}
+        self.labels = []
+
+    def code(self, value):
+        value = value if value is not None else '?'
+        if value not in self.index:
+            self.index[value] = len(self.labels)
+            self.labels.append(value)
+        return self.index[value]
+
+class LogTables:
+    """Colonnes des événements, remplies au fil du décodage"""
+
+    def __init__(self):
+        self.users = Codes()
+        self.images = Codes()
+        self.modes = Codes()
+        self.outcomes = Codes()
+        self.stages = Codes()
+        self.actions = Codes()
+        # Lancements et reconnexions
+        self.launch = {'ts': array('d'), 'user': array('q'), 'image': array('q'), 'mode': array('q'),
+                       'outcome': array('q'), 'duration': array('d'), 'cpu': array('d'), 'memory': array('d')}
+        # Durée des étapes de script.sh (une ligne par étape mesurée)
+        self.stage = {'stage': array('q'), 'ms': array('d')}
+        # Actions de idle_reaper.py
+        self.reaper = {'ts': array('d'), 'user': array('q'), 'action': array('q'), 'idle': array('d')}
+
+    def add_launch(self, record):
+        granted = record.get('granted') or {}
+        try:
+            cpu = float(granted.get('cpu') or 0)
+            memory = scheduler.parse_size(granted['memory']) / 1024 ** 3 if granted.get('memory') else 0.0
+        except ValueError:
+            cpu, memory = 0.0, 0.0
+        columns = self.launch
+        columns['ts'].append(record['ts'])
+        columns['user'].append(self.users.code(record.get('user')))
+        columns['image'].append(self.images.code(record.get('image')))
+        columns['mode'].append(self.modes.code(record.get('mode') or record['event']))
+        columns['outcome'].append(self.outcomes.code(record.get('outcome')))
+        columns['duration'].append((record.get('duration_ms') or 0) / 1000)
+        columns['cpu'].append(cpu)
+        columns['memory'].append(memory)
+        for stage, ms in (record.get('stages') or {}).items():
+            self.stage['stage'].append(self.stages.code(stage))
+            self.stage['ms'].append(ms)
+
+    def add_reaper(self, ts, user, action, idle):
+        self.reaper['ts'].append(ts)
+        self.reaper['user'].append(self.users.code(user))
+        self.reaper['action'].append(self.actions.code(action))
+        self.reaper['idle'].append(idle if idle is not None else -1)
+
+def load_tables(path=launch_log.LAUNCH_LOG_FILE, cleanup_path=CLEANUP_LOG_FILE, since=None):
+    """Décode les journaux en colonnes (événements antérieurs à since ignorés)"""
+    tables = LogTables()
+    since = since or 0
+    first_reaper = None
+    for record in launch_log.read_events(path, since):
+        ts = record.get('ts')
+        if not isinstance(ts, (int, float)) or ts < since:
+            continue
+        event = record.get('event')
+        if event in ('launch', 'reconnect'):
+            tables.add_launch(record)
+        elif event == 'reaper':
+            first_reaper = ts if first_reaper is None else first_reaper
+            tables.add_reaper(ts, record.get('user'), record.get('action'), record.get('idle_seconds'))
+
+    # cleanup.log : uniquement les actions antérieures au journal structuré (pas de doublons)
+    try:
+        with open(cleanup_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if ' - Conteneur ' not in line and ' - Connexion détectée' not in line:
+                    continue
+                for pattern, action in CLEANUP_PATTERNS:
+                    match = pattern.match(line)
+                    if not match:
+                        continue
+                    try:
+                        ts = datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S').timestamp()
+                    except ValueError:
+                        break
+                    if ts >= since and (first_reaper is None or ts < first_reaper):
+                        idle = int(match.group(3)) * 60 if match.group(3) else None
+                        tables.add_reaper(ts, match.group(2)[len(CONTAINER_PREFIX):], action, idle)
+                    break
+    except FileNotFoundError:
+        pass
+    return tables
+
+def as_array(column):
+    """Vue numpy d'une colonne array (sans copie)"""
+    return numpy.frombuffer(column, dtype=numpy.float64 if column.typecode == 'd' else numpy.int64)
+
+def percentiles(values, quantiles=QUANTILES):
+    """Quantiles avec interpolation linéaire (même résultat que numpy.percentile)"""
+    if not len(values):
+        return [None] * len(quantiles)
+    if numpy is not None:
+        return numpy.percentile(values, quantiles).tolist()
+    ordered = sorted(values)
+    result = []
+    for q in quantiles:
+        position = (len(ordered) - 1) * q / 100
+        low = int(position)
+        high = min(low + 1, len(ordered) - 1)
+        result.append(ordered[low] + (ordered[high] - ordered[low]) * (position - low))
+    return result
+
+def group_percentiles(codes, values, labels, mask=None):
+    """{libellé: (nombre, quantiles)} des valeurs regroupées par code (mask : lignes retenues)"""
+    groups = {}
+    if numpy is not None:
+        codes, values = as_array(codes), as_array(values)
+        if mask is not None:
+            codes, values = codes[mask], values[mask]
+        order = numpy.argsort(codes, kind='stable')
+        codes, values = codes[order], values[order]
+        bounds = numpy.flatnonzero(numpy.diff(codes)) + 1
+        for group_codes, group_values in zip(numpy.split(codes, bounds), numpy.split(values, bounds)):
+            if len(group_codes):
+                groups[labels[group_codes[0]]] = (len(group_values), percentiles(group_values))
+        return groups
+    lists = {}
+    for i, (code, value) in enumerate(zip(codes, values)):
+        if mask is None or mask[i]:
+            lists.setdefault(code, []).append(value)
+    return {labels[code]: (len(group), percentiles(group)) for code, group in lists.items()}
+
+def build_sessions(tables):
+    """Sessions (utilisateur, début, fin, CPU, mémoire) : d'un lancement réussi (ou d'un dégel) à la
+    mise en veille suivante, moins le temps d'inactivité mesuré par idle_reaper.py.
+    Une session encore ouverte se termine au dernier événement analysé."""
+    launch, reaper = tables.launch, tables.reaper
+    ok = tables.outcomes.index.get('ok')
+    ending = {tables.actions.index.get(action) for action in SESSION_ACTIONS}
+    thaw = tables.actions.index.get('thaw')
+    # (ts, ordre, utilisateur, index) : lancements puis actions, dans l'ordre chronologique
+    events = [(launch['ts'][i], 0, launch['user'][i], i) for i in range(len(launch['ts']))
+              if launch['outcome'][i] == ok]
+    events += [(reaper['ts'][i], 1, reaper['user'][i], i) for i in range(len(reaper['ts']))]
+    events.sort()
+    end_of_data = events[-1][0] if events else 0
+
+    sessions = {'user': array('q'), 'start': array('d'), 'end': array('d'), 'cpu': array('d'), 'memory': array('d')}
+    open_sessions = {}  # utilisateur -> (début, CPU, mémoire)
+    last_limits = {}    # dernières limites accordées (reprises au dégel)
+    def close(user, end):
+        start, cpu, memory = open_sessions.pop(user)
+        sessions['user'].append(user)
+        sessions['start'].append(start)
+        sessions['end'].append(max(start, end))
+        sessions['cpu'].append(cpu)
+        sessions['memory'].append(memory)
+
+    for ts, kind, user, i in events:
+        if kind == 0:
+            # Nouveau lancement : la session précédente (bureau recréé) se termine ici
+            if user in open_sessions:
+                close(user, ts)
+            last_limits[user] = (launch['cpu'][i], launch['memory'][i])
+            open_sessions[user] = (ts,) + last_limits[user]
+        elif reaper['action'][i] in ending and user in open_sessions:
+            idle = reaper['idle'][i]
+            close(user, ts - idle if idle > 0 else ts)
+        elif reaper['action'][i] == thaw and user not in open_sessions:
+            open_sessions[user] = (ts,) + last_limits.get(user, (0.0, 0.0))
+    for user in list(open_sessions):
+        close(user, end_of_data)
+    return sessions
+
+def freeze_outcomes(tables):
+    """Devenir des bureaux gelés : (repris par un dégel ou une connexion, arrêtés, encore gelés)"""
+    launch, reaper = tables.launch, tables.reaper
+    ok = tables.outcomes.index.get('ok')
+    events = [(launch['ts'][i], 'launch', launch['user'][i]) for i in range(len(launch['ts']))
+              if launch['outcome'][i] == ok]
+    events += [(reaper['ts'][i], tables.actions.labels[reaper['action'][i]], reaper['user'][i])
+               for i in range(len(reaper['ts']))]
+    events.sort()
+    frozen = set()
+    resumed = stopped = 0
+    for _, action, user in events:
+        if user not in frozen:
+            if action == 'freeze':
+                frozen.add(user)
+        elif action in ('launch', 'thaw'):
+            resumed += 1
+            frozen.discard(user)
+        elif action in ('stop', 'checkpoint'):
+            stopped += 1
+            frozen.discard(user)
+    return resumed, stopped, len(frozen)
+
+def hourly_peaks(sessions):
+    """Pic de sessions simultanées de chaque heure (timestamps d'heure pleine, pics)"""
+    count = len(sessions['start'])
+    if not count:
+        return [], []
+    if numpy is not None:
+        times = numpy.concatenate([as_array(sessions['start']), as_array(sessions['end'])])
+        deltas = numpy.concatenate([numpy.ones(count, dtype=numpy.int64), -numpy.ones(count, dtype=numpy.int64)])
+        # À instant égal, les fins avant les débuts (une session qui en remplace une autre ne compte pas deux fois)
+        order = numpy.lexsort((deltas, times))
+        times, levels = times[order], numpy.cumsum(deltas[order])
+        hours = (times // 3600).astype(numpy.int64)
+        all_hours = numpy.arange(hours[0], hours[-1] + 1)
+        # Niveau à l'entrée de chaque heure : celui du dernier événement des heures précédentes
+        before = numpy.searchsorted(hours, all_hours, side='left') - 1
+        peaks = numpy.where(before >= 0, levels[numpy.maximum(before, 0)], 0)
+        starts = numpy.flatnonzero(numpy.r_[True, numpy.diff(hours) > 0])
+        in_hour = numpy.maximum.reduceat(levels, starts)
+        slots = hours[starts] - hours[0]
+        peaks[slots] = numpy.maximum(peaks[slots], in_hour)
+        return (all_hours * 3600).tolist(), peaks.tolist()
+    changes = sorted([(start, 1) for start in sessions['start']] + [(end, -1) for end in sessions['end']])
+    first, last = int(changes[0][0] // 3600), int(changes[-1][0] // 3600)
+    peaks = [0] * (last - first + 1)
+    level = 0
+    index = 0
+    for hour in range(first, last + 1):
+        peak = level
+        while index < len(changes) and changes[index][0] < (hour + 1) * 3600:
+            level += changes[index][1]
+            peak = max(peak, level)
+            index += 1
+        peaks[hour - first] = peak
+    return [hour * 3600 for hour in range(first, last + 1)], peaks
+
+def user_totals(sessions, user_count):
+    """Par utilisateur : (heures de session, heures-cœur CPU, Go-heures de mémoire, sessions)"""
+    if numpy is not None:
+        users = as_array(sessions['user'])
+        hours = (as_array(sessions['end']) - as_array(sessions['start'])) / 3600
+        return list(zip(numpy.bincount(users, hours, user_count).tolist(),
+                        numpy.bincount(users, hours * as_array(sessions['cpu']), user_count).tolist(),
+                        numpy.bincount(users, hours * as_array(sessions['memory']), user_count).tolist(),
+                        numpy.bincount(users, minlength=user_count).tolist()))
+    totals = [[0.0, 0.0, 0.0, 0] for _ in range(user_count)]
+    for user, start, end, cpu, memory in zip(sessions['user'], sessions['start'], sessions['end'],
+                                            sessions['cpu'], sessions['memory']):
+        hours = (end - start) / 3600
+        totals[user][0] += hours
+        totals[user][1] += hours * cpu
+        totals[user][2] += hours * memory
+        totals[user][3] += 1
+    return [tuple(total) for total in totals]
+
+def format_quantiles(values, unit=1, suffix='s'):
+    return ' '.join(f"{value / unit:>8.1f}{suffix}" if value is not None else f"{'-':>9}" for value in values)
+
+def print_latency_table(title, groups, unit=1, suffix='s', failures=None):
+    print(f"\n{title}")
+    header = f"  {'':<34} {'nombre':>7} " + ' '.join(f"{'p' + str(q):>9}" for q in QUANTILES)
+    if failures is not None:
+        header += f" {'échecs':>7}"
+    print(header)
+    for label, (count, values) in sorted(groups.items(), key=lambda item: -item[1][0]):
+        line = f"  {label[:34]:<34} {count:>7} {format_quantiles(values, unit, suffix)}"
+        if failures is not None:
+            line += f" {failures.get(label, 0):>7}"
+        print(line)
+    if not groups:
+        print("  (aucune donnée)")
+
+def report(tables, top=DEFAULT_TOP):
+    launch, reaper = tables.launch, tables.reaper
+    print(f"{len(launch['ts'])} lancement(s)/reconnexion(s), {len(reaper['ts'])} action(s) de mise en veille, "
+          f"{len(tables.users.labels)} utilisateur(s), numpy {'actif' if numpy is not None else 'absent (calcul en Python)'}")
+    if launch['ts']:
+        first, last = min(launch['ts']), max(launch['ts'])
+        print(f"Période des lancements : {datetime.fromtimestamp(first):%Y-%m-%d %H:%M} → "
+              f"{datetime.fromtimestamp(last):%Y-%m-%d %H:%M}")
+
+    # Latences des lancements réussis
+    ok = tables.outcomes.index.get('ok', -1)
+    if numpy is not None:
+        mask = as_array(launch['outcome']) == ok
+    else:
+        mask = [outcome == ok for outcome in launch['outcome']]
+    failures = {}
+    for image, outcome in zip(launch['image'], launch['outcome']):
+        if tables.outcomes.labels[outcome] in ('failed', 'timeout', 'error'):
+            label = tables.images.labels[image]
+            failures[label] = failures.get(label, 0) + 1
+    print_latency_table("Latence des lancements réussis par image", group_percentiles(
+        launch['image'], launch['duration'], tables.images.labels, mask), failures=failures)
+    print_latency_table("Latence par mode (created : nouveau conteneur, unpaused : dégel, restored : CRIU)",
+                        group_percentiles(launch['mode'], launch['duration'], tables.modes.labels, mask))
+    print_latency_table("Durée des étapes de script.sh", group_percentiles(
+        tables.stage['stage'], tables.stage['ms'], tables.stages.labels), unit=1000)
+
+    # Résultats
+    counts = {}
+    for outcome in launch['outcome']:
+        counts[tables.outcomes.labels[outcome]] = counts.get(tables.outcomes.labels[outcome], 0) + 1
+    if counts:
+        print("\nRésultats : " + ', '.join(f"{label} {count}" for label, count in sorted(counts.items(), key=lambda i: -i[1])))
+
+    # Sessions simultanées
+    sessions = build_sessions(tables)
+    hours, peaks = hourly_peaks(sessions)
+    if peaks:
+        by_hour = {}
+        for hour, peak in zip(hours, peaks):
+            by_hour.setdefault(datetime.fromtimestamp(hour).hour, []).append(peak)
+        highest = max(peaks)
+        print(f"\nSessions simultanées par heure de la journée (pic maximal {highest}, "
+              f"le {datetime.fromtimestamp(hours[peaks.index(highest)]):%Y-%m-%d à %Hh})")
+        print(f"  {'heure':<6} {'max':>5} {'moyen':>6} {'p95':>6}")
+        for hour_of_day in range(24):
+            values = by_hour.get(hour_of_day)
+            if not values:
+                continue
+            bar = '█' * int(round(max(values) / max(highest, 1) * 40))
+            print(f"  {hour_of_day:>2}h    {max(values):>5} {sum(values) / len(values):>6.1f} "
+                  f"{percentiles(values, (95,))[0]:>6.1f} {bar}")
+
+    # Devenir des bureaux inactifs
+    actions = {}
+    for action in reaper['action']:
+        actions[tables.actions.labels[action]] = actions.get(tables.actions.labels[action], 0) + 1
+    if actions:
+        frozen = actions.get('freeze', 0)
+        stopped = actions.get('stop', 0) + actions.get('checkpoint', 0)
+        print("\nMise en veille")
+        print(f"  gels: {frozen}, dégels: {actions.get('thaw', 0)}, arrêts: {stopped} "
+              f"(dont CRIU: {actions.get('checkpoint', 0)}), archivages: {actions.get('archive', 0)}")
+        if frozen:
+            resumed, frozen_stopped, still_frozen = freeze_outcomes(tables)
+            print(f"  devenir des gels : {resumed / frozen:.0%} repris, {frozen_stopped / frozen:.0%} arrêtés, "
+                  f"{still_frozen} encore gelé(s)")
+        stop_codes = {tables.actions.index.get(a) for a in ('stop', 'checkpoint')}
+        idle = [value / 60 for action, value in zip(reaper['action'], reaper['idle'])
+                if action in stop_codes and value >= 0]
+        if idle:
+            print("  inactivité avant arrêt : " + ', '.join(
+                f"p{q} {value:.0f} min" for q, value in zip(QUANTILES, percentiles(idle))))
+        wakeups = {}
+        for mode, outcome in zip(launch['mode'], launch['outcome']):
+            if outcome == ok:
+                wakeups[tables.modes.labels[mode]] = wakeups.get(tables.modes.labels[mode], 0) + 1
+        print(f"  reconnexions : {wakeups.get('unpaused', 0)} dégel(s) à la connexion, "
+              f"{wakeups.get('restored', 0)} restauration(s) CRIU")
+
+    # Plus gros consommateurs (ressources accordées × durée des sessions)
+    totals = user_totals(sessions, len(tables.users.labels))
+    ranked = sorted(((total, user) for user, total in enumerate(totals) if total[3]), reverse=True,
+                    key=lambda item: item[0][1])[:top]
+    if ranked:
+        print(f"\nPlus gros consommateurs (ressources accordées × heures de session, top {top})")
+        print(f"  {'utilisateur':<20} {'sessions':>8} {'heures':>8} {'cœur·h':>9} {'Go·h':>9}")
+        for (hours_total, cpu_hours, memory_hours, session_count), user in ranked:
+            print(f"  {tables.users.labels[user][:20]:<20} {session_count:>8} {hours_total:>8.1f} "
+                  f"{cpu_hours:>9.1f} {memory_hours:>9.1f}")
+
+def export_launches(tables, path):
+    """Écrit la table des lancements en CSV, ou en Parquet (pyarrow) selon l'extension"""
+    launch = tables.launch
+    columns = {
+        'time': [datetime.fromtimestamp(ts) for ts in launch['ts']],
+        'user': [tables.users.labels[code] for code in launch['user']],
+        'image': [tables.images.labels[code] for code in launch['image']],
+        'mode': [tables.modes.labels[code] for code in launch['mode']],
+        'outcome': [tables.outcomes.labels[code] for code in launch['outcome']],
+        'duration_s': list(launch['duration']),
+        'cpu': list(launch['cpu']),
+        'memory_gb': list(launch['memory'])
+    }
+    if path.endswith('.parquet'):
+        if pyarrow is None:
+            raise RuntimeError("pyarrow n'est pas installé (pip install pyarrow)")
+        pyarrow.parquet.write_table(pyarrow.table(columns), path)
+        return
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(list(columns))
+        writer.writerows(zip(*columns.values()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse des journaux de lancement et de mise en veille")
+    parser.add_argument('--since', help="Période analysée (ex: 7d, 12h); tout l'historique par défaut")
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help='Nombre de consommateurs affichés')
+    parser.add_argument('--log', default=launch_log.LAUNCH_LOG_FILE, help='Journal des lancements')
+    parser.add_argument('--cleanup-log', default=CLEANUP_LOG_FILE, help='Journal texte de idle_reaper.py')
+    parser.add_argument('--export', help='Écrit la table des lancements (.csv, ou .parquet avec pyarrow)')
+    args = parser.parse_args()
+
+    since = None
+    if args.since:
+        try:
+            since = time.time() - (parse_duration(args.since) or 0)
+        except ValueError:
+            parser.error(f"Durée invalide: {args.since}")
+
+    start = time.time()
+    tables = load_tables(args.log, args.cleanup_log, since)
+    loaded = time.time() - start
+    if args.export:
+        try:
+            export_launches(tables, args.export)
+        except (RuntimeError, OSError) as e:
+            print(f"Erreur: {e}")
+            raise SystemExit(1)
+        print(f"{len(tables.launch['ts'])} lancement(s) exporté(s) dans {args.export}")
+        return
+    report(tables, args.top)
+    print(f"\nJournaux lus en {loaded:.1f}s, analyse en {time.time() - start - loaded:.1f}s")
+
+if __name__ == "__main__":
+    main()
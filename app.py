@@ -1,16 +1,117 @@
-from flask import Flask, request, render_template_string, jsonify
+from flask import Flask, request, render_template_string, jsonify, Response
 import subprocess
-import tempfile
 import os
+import time
+import signal
+import threading
 import re
 import bcrypt  
 import shlex
+import session_probe
+import cgroup_metrics
+import gpu_telemetry
+import container_state
+import login_throttle
+import launch_log
+import docker_api
+import scheduler
+import speculative_wake
 
 app = Flask(__name__)
 
 # Constantes pour les fichiers de configuration
 POWER_USERS_FILE = "power_users.txt"
 USER_FILE = "users.txt"  # Ajout de cette constante pour le fichier utilisateurs
+# Messages de script.sh qui indiquent le résultat de l'authentification (compteurs de login_throttle)
+LOGIN_SUCCESS_MARKER = "✅ Connexion réussie"
+LOGIN_FAILURE_MARKERS = ("❌ Utilisateur inconnu", "❌ Mot de passe incorrect")
+
+LAUNCH_TIMEOUT = float(os.environ.get("LAUNCH_TIMEOUT", "600"))  # secondes max pour script.sh (pull d'image compris)
+KILL_GRACE = 5  # secondes entre SIGTERM et SIGKILL pour le groupe de processus d'un lancement
+LAUNCH_OUTCOMES = ('ok', 'failed', 'timeout', 'error')
+LAUNCH_INFO_PREFIX = "@launch "  # Mesures écrites par script.sh sur stderr pour launch_log.jsonl
+
+# Compteurs des lancements (exposés par /metrics)
+_launch_stats = {outcome: {'count': 0, 'seconds': 0.0} for outcome in LAUNCH_OUTCOMES}
+_launch_stats_lock = threading.Lock()
+
+def record_launch(outcome, duration):
+    """Compte un lancement de script.sh: ok, failed (code de sortie non nul), timeout ou error"""
+    with _launch_stats_lock:
+        _launch_stats[outcome]['count'] += 1
+        _launch_stats[outcome]['seconds'] += duration
+
+def kill_process_group(process):
+    """Termine tout le groupe de processus d'un lancement (bash, docker run, pull...).
+    Retourne (stdout, stderr) produits jusque-là (vides si le groupe ne s'est pas terminé)."""
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            break
+        try:
+            return process.communicate(timeout=KILL_GRACE)
+        except subprocess.TimeoutExpired:
+            continue
+    return '', ''
+
+def parse_launch_info(stderr):
+    """Sépare les mesures de script.sh (lignes '@launch clé=valeur') du reste de stderr.
+    Retourne (mesures, stderr sans ces lignes); les durées d'étapes (ms) sont regroupées dans 'stages'."""
+    info, stages, lines = {}, {}, []
+    for line in (stderr or '').splitlines():
+        if line.startswith(LAUNCH_INFO_PREFIX) and '=' in line:
+            key, value = line[len(LAUNCH_INFO_PREFIX):].split('=', 1)
+            if key.startswith('stage.'):
+                try:
+                    stages[key[len('stage.'):]] = int(value)
+                except ValueError:
+                    pass
+            else:
+                info[key] = value
+        else:
+            lines.append(line)
+    info['stages'] = stages
+    return info, "\n".join(lines)
+
+def rollback_container(username, created_by_launch):
+    """Supprime le conteneur d'un lancement interrompu : celui que le lancement a créé, ou un conteneur
+    resté à l'état 'created' (docker run interrompu avant le démarrage). Retourne True s'il a été supprimé."""
+    container_name = f"gui_user_{username}"
+    # Avec plusieurs nœuds (scheduler.py), le conteneur est sur le nœud de l'utilisateur;
+    # l'indice d'état (démon local) ne vaut alors rien : seul l'état 'created' est pris en compte
+    host = scheduler.get_user_host(username)
+    created_by_launch = created_by_launch and host is None
+    client = docker_api.get_client(host)
+    try:
+        status = client.inspect(container_name)['State']['Status']
+        if created_by_launch or status == 'created':
+            client.remove(container_name, force=True)
+            return True
+    except docker_api.DockerAPIError as e:
+        if e.status != 404:
+            print(f"Erreur lors de la suppression du conteneur {container_name}: {e}")
+    return False
+
+def log_launch(event, info, outcome, start, **extra):
+    """Enregistre un lancement dans launch_log.jsonl : 'reconnect' si script.sh a réactivé un bureau
+    en veille, 'launch' sinon, avec les mesures de script.sh (nœud, port, GPU, durées d'étapes)"""
+    info = dict(info)
+    mode = info.pop('mode', None)
+    gpu = info.pop('gpu', None)
+    if gpu is not None:
+        # script.sh renonce au GPU si la machine n'en a pas
+        event['granted']['gpu'] = gpu == 'true'
+    if info.get('port', '').isdigit():
+        info['port'] = int(info['port'])
+    launch_log.log_event('reconnect' if mode in ('unpaused', 'restored') else 'launch',
+                         mode=mode, outcome=outcome, duration_ms=int((time.time() - start) * 1000),
+                         **event, **info, **extra)
+
+def throttled_response(retry_after):
+    """Réponse 429 d'une tentative refusée par login_throttle"""
+    return (f"❌ Trop de tentatives de connexion. Réessaie dans {retry_after} secondes.", 429,
+            {'Retry-After': str(retry_after)})
 
 def is_power_user(username):
     """Vérifie si un utilisateur est un power user"""
@@ -80,31 +181,15 @@ def get_system_resources():
         mem_kb = int(subprocess.check_output("grep MemTotal /proc/meminfo | awk '{print $2}'", shell=True, text=True).strip())
         memory_gb = round(mem_kb / 1024 / 1024, 1)
         
-        # Vérifier si NVIDIA-SMI est disponible
-        nvidia_available = subprocess.run("command -v nvidia-smi", shell=True, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL).returncode == 0
-        
-        if nvidia_available:
-            # Obtenir le nombre de GPUs
-            gpu_count = int(subprocess.check_output("nvidia-smi --query-gpu=name --format=csv,noheader | wc -l", shell=True, text=True).strip())
-            
-            # Obtenir les détails des GPUs
-            if gpu_count > 0:
-                gpu_info = subprocess.check_output("nvidia-smi --query-gpu=index,name,memory.total --format=csv,noheader", shell=True, text=True).strip()
-                for line in gpu_info.split('\n'):
-                    if line.strip():
-                        parts = line.split(', ')
-                        if len(parts) >= 3:
-                            gpu_memory = parts[2]
-                            # Extraire la valeur numérique de la mémoire (par exemple "16376 MiB" -> 16376)
-                            memory_value = re.search(r'(\d+)', gpu_memory)
-                            if memory_value:
-                                memory_mib = int(memory_value.group(1))
-                                gpus_info.append({
-                                    'id': parts[0],
-                                    'name': parts[1],
-                                    'memory': gpu_memory,
-                                    'memory_mib': memory_mib
-                                })
+        # GPU via NVML (ou nvidia-smi en repli), avec cache
+        for gpu in gpu_telemetry.get_devices():
+            gpus_info.append({
+                'id': str(gpu.index),
+                'name': gpu.name,
+                'memory': f"{gpu.mem_total} MiB",
+                'memory_mib': gpu.mem_total
+            })
+        gpu_count = len(gpus_info)
     except Exception as e:
         print(f"Erreur lors de la récupération des ressources système: {str(e)}")
     
@@ -878,7 +963,10 @@ HTML_TEMPLATE = '''
             if (!username) return;
             
             try {
-                const response = await fetch(`/check_power_user?username=${encodeURIComponent(username)}`);
+                // L'image et l'option GPU permettent au serveur de réveiller le bureau pendant la saisie du mot de passe
+                const image = document.getElementById('image').value;
+                const useGpu = document.getElementById('use_gpu').checked;
+                const response = await fetch(`/check_power_user?username=${encodeURIComponent(username)}&image=${encodeURIComponent(image)}&use_gpu=${useGpu}`);
                 const data = await response.json();
                 
                 // Mettre à jour les sliders CPU et mémoire en fonction du statut power user
@@ -1149,6 +1237,12 @@ def check_power_user():
     """Vérifie si un utilisateur est un power user et retourne ses limites"""
     username = request.args.get('username', '')
     
+    # Réveil spéculatif du conteneur en veille (tâche de fond, réponse inchangée)
+    image = request.args.get('image')
+    if username and image:
+        speculative_wake.get_waker().request_wake(username, image, request.args.get('use_gpu') == "true",
+                                                  request.remote_addr or '')
+    
     power_status = is_power_user(username)
     limits = get_power_user_limits(username) if power_status else {'cpu': '4', 'memory': '4g', 'gpu_memory': '4096'}
     
@@ -1205,6 +1299,13 @@ def change_password_route():
     new_password = request.form.get('new_password', '')
     confirm_password = request.form.get('confirm_password', '')
     
+    # Tentatives trop nombreuses refusées avant tout appel à bash ou à bcrypt
+    throttle = login_throttle.get_throttle()
+    retry_after = throttle.check(username, request.remote_addr or '')
+    if retry_after:
+        launch_log.log_event('password_change', user=username, ip=request.remote_addr or '', outcome='throttled')
+        return throttled_response(retry_after)
+    
     print(f"Tentative de changement de mot de passe pour: {username}")
     
     # Vérifier si l'utilisateur existe - utiliser subprocess.run avec des arguments séparés
@@ -1217,6 +1318,8 @@ def change_password_route():
         user_exists = user_check.stdout.strip() == "true"
         if not user_exists:
             print(f"Utilisateur {username} inconnu")
+            throttle.record_failure(username, request.remote_addr or '')
+            launch_log.log_event('password_change', user=username, ip=request.remote_addr or '', outcome='denied')
             return "Utilisateur inconnu", 400
     except Exception as e:
         print(f"Erreur lors de la vérification de l'utilisateur: {str(e)}")
@@ -1233,7 +1336,10 @@ def change_password_route():
         print(f"Résultat de la vérification: {is_valid}")
         
         if not is_valid:
+            throttle.record_failure(username, request.remote_addr or '')
+            launch_log.log_event('password_change', user=username, ip=request.remote_addr or '', outcome='denied')
             return "Mot de passe actuel incorrect", 400
+        throttle.record_success(username, request.remote_addr or '')
     except Exception as e:
         print(f"Erreur lors de la vérification du mot de passe: {str(e)}")
         return f"Erreur lors de la vérification du mot de passe: {str(e)}", 500
@@ -1259,6 +1365,8 @@ def change_password_route():
         print(f"Exception lors du changement de mot de passe: {str(e)}")
         success = False
     
+    launch_log.log_event('password_change', user=username, ip=request.remote_addr or '',
+                         outcome='ok' if success else 'error')
     if success:
         print(f"Mot de passe changé avec succès pour {username}")
         return "Mot de passe changé avec succès", 200
@@ -1266,6 +1374,33 @@ def change_password_route():
         print(f"Erreur lors du changement de mot de passe pour {username}")
         return "Erreur lors du changement de mot de passe", 500
 
+@app.route('/metrics')
+def metrics():
+    """Métriques des conteneurs au format Prometheus (lecture directe des cgroups, accès local uniquement)"""
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        return "Accès refusé", 403
+    if not cgroup_metrics.is_available():
+        return "cgroup v2 non disponible", 503
+    
+    inventory = session_probe.get_inventory()
+    labels = {info['id']: {'name': name, 'image': info['image']} for name, info in inventory.items()}
+    samples = cgroup_metrics.sample(list(labels), {info['id']: info['pid'] for info in inventory.values()})
+    output = cgroup_metrics.format_prometheus(samples, labels)
+    
+    # Sessions RDP actives, lues depuis l'hôte
+    output += "# TYPE rdp_container_sessions gauge\n"
+    for name, count in session_probe.get_session_counts(list(inventory)).items():
+        output += f'rdp_container_sessions{{name="{name}",image="{inventory[name]["image"]}"}} {count["rdp"]}\n'
+    
+    # Lancements de script.sh par résultat (timeout distinct des échecs)
+    output += "# TYPE rdp_launches_total counter\n"
+    output += "# TYPE rdp_launch_seconds_total counter\n"
+    with _launch_stats_lock:
+        for outcome, stats in _launch_stats.items():
+            output += f'rdp_launches_total{{outcome="{outcome}"}} {stats["count"]}\n'
+            output += f'rdp_launch_seconds_total{{outcome="{outcome}"}} {stats["seconds"]:.3f}\n'
+    return Response(output, mimetype='text/plain; version=0.0.4')
+
 @app.route('/execute', methods=['POST'])
 def execute_script():
     # Nous forçons maintenant le choix 1 (connexion uniquement)
@@ -1274,6 +1409,22 @@ def execute_script():
     password = request.form.get('password', '')
     image = request.form.get('image', 'xfce_gui_container')
     
+    # Tentatives trop nombreuses refusées avant tout calcul (bcrypt, script.sh)
+    client_ip = request.remote_addr or ''
+    throttle = login_throttle.get_throttle()
+    retry_after = throttle.check(username, client_ip)
+    if retry_after:
+        launch_log.log_event('launch', user=username, ip=client_ip, image=image, outcome='throttled')
+        return throttled_response(retry_after)
+    
+    # Limites demandées, telles que reçues (journal des lancements)
+    requested = {
+        'cpu': request.form.get('cpu_limit', '1'),
+        'memory': request.form.get('memory_limit', '2'),
+        'gpu': request.form.get('use_gpu') == "true",
+        'gpu_memory': request.form.get('gpu_memory_limit', '0')
+    }
+    
     # Récupérer l'option GPU (cochée = "true", non-cochée = None)
     use_gpu = "o" if request.form.get('use_gpu') == "true" else "n"
     
@@ -1357,33 +1508,64 @@ def execute_script():
                 # Limiter à 4 GB (4096 MiB) pour les utilisateurs normaux
                 gpu_memory_limit = str(min(int(gpu_memory_limit), 4096))
     
-    # Créer un fichier temporaire avec les entrées
-    with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp:
-        # Les variables cpu_limit et memory_limit contiennent déjà les bonnes valeurs
-        # après les vérifications précédentes, donc tu peux les utiliser directement:
-        temp.write(f"{choice}\n{username}\n{password}\n{image}\n")
-        temp.write(f"{cpu_limit}\n{memory_limit}\n{use_gpu}\n")
-        if use_gpu == "o":
-            temp.write(f"{gpu_memory_limit}\n")
-        temp_name = temp.name
+    # Entrées du script, transmises par son entrée standard (le mot de passe n'est jamais écrit sur disque)
+    script_input = f"{choice}\n{username}\n{password}\n{image}\n{cpu_limit}\n{memory_limit}\n{use_gpu}\n"
+    if use_gpu == "o":
+        script_input += f"{gpu_memory_limit}\n"
+    
+    # Réveil spéculatif en cours (saisie du nom d'utilisateur) : script.sh doit voir le conteneur démarré
+    waker = speculative_wake.get_waker()
+    waker.settle(username)
     
+    # État du conteneur et ports occupés, lus dans le cache alimenté par docker events
+    state_hint = container_state.get_cache(wait=1).script_hint(f"gui_user_{username}")
+    script_env = dict(os.environ, **state_hint)
+    
+    # Événement du journal des lancements, complété par les mesures de script.sh
+    event = {'user': username, 'ip': client_ip, 'image': image, 'requested': requested,
+             'granted': {'cpu': cpu_limit, 'memory': memory_limit,
+                         'gpu_memory': gpu_memory_limit if use_gpu == "o" else None}}
+    start = time.time()
     try:
-        # Exécuter le script avec les entrées du fichier de manière sécurisée
-        result = subprocess.run(
-            ["bash", "-c", f"cat {shlex.quote(temp_name)} | bash ./script.sh"],
-            capture_output=True, 
-            text=True,
-            encoding='utf-8',
-            errors='replace'
+        # Groupe de processus dédié : en cas de dépassement, bash et ses commandes docker sont tués ensemble
+        process = subprocess.Popen(
+            ["bash", "./script.sh"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            env=script_env, start_new_session=True,
+            text=True, encoding='utf-8', errors='replace'
         )
-        
-        # Supprimer le fichier temporaire
-        os.unlink(temp_name)
+        try:
+            stdout, stderr = process.communicate(script_input, timeout=LAUNCH_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            _, stderr = kill_process_group(process)
+            # Conteneur créé par ce lancement mais jamais terminé : supprimé pour repartir proprement
+            created_by_launch = state_hint.get('CONTAINER_STATE_HINT', '').endswith(':absent')
+            rolled_back = rollback_container(username, created_by_launch)
+            waker.claim(username, False)
+            record_launch('timeout', time.time() - start)
+            log_launch(event, parse_launch_info(stderr)[0], 'timeout', start, rolled_back=rolled_back)
+            print(f"Lancement de {username} interrompu après {LAUNCH_TIMEOUT:g}s"
+                  f"{' (conteneur supprimé)' if rolled_back else ''}")
+            return (f"⏱️ Le lancement de ton bureau a dépassé {LAUNCH_TIMEOUT:g} secondes et a été annulé "
+                    f"(téléchargement de l'image ou démon Docker trop lent). Réessaie dans quelques minutes "
+                    f"ou contacte un administrateur.", 504)
+        outcome = 'ok' if process.returncode == 0 else 'failed'
+        record_launch(outcome, time.time() - start)
+        info, stderr = parse_launch_info(stderr)
+        
+        # Résultat de l'authentification faite par script.sh
+        if LOGIN_SUCCESS_MARKER in stdout:
+            throttle.record_success(username, client_ip)
+        elif any(marker in stdout for marker in LOGIN_FAILURE_MARKERS):
+            throttle.record_failure(username, client_ip)
+            outcome = 'denied'
+        log_launch(event, info, outcome, start)
+        waker.claim(username, LOGIN_SUCCESS_MARKER in stdout)
         
         # Construire la sortie
-        output = result.stdout
-        if result.stderr and not "standard in must be a tty" in result.stderr:
-            output += "\nErreurs:\n" + result.stderr
+        output = stdout
+        if stderr and not "standard in must be a tty" in stderr:
+            output += "\nErreurs:\n" + stderr
             
         # S'assurer que la sortie n'est pas vide
         if not output or output.strip() == "":
@@ -1396,9 +1578,12 @@ def execute_script():
         
         return output
     except Exception as e:
-        if os.path.exists(temp_name):
-            os.unlink(temp_name)
+        waker.claim(username, False)
+        record_launch('error', time.time() - start)
+        log_launch(event, {}, 'error', start, error=str(e))
         return f"Erreur d'exécution: {str(e)}"
 
 if __name__ == '__main__':
+    # Liste complète des conteneurs et abonnement à docker events dès le démarrage
+    container_state.get_cache(wait=0)
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
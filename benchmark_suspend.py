@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai du mode de veille par checkpoint CRIU.
+Pour chaque image, compare le démarrage à froid, le redémarrage après un arrêt simple
+et la restauration depuis un checkpoint (taille du checkpoint sur disque incluse).
+Un bureau est considéré prêt quand son port RDP est en écoute dans le conteneur.
+Nécessite criu sur l'hôte et le démon Docker en mode expérimental.
+Exécuter avec: sudo python3 benchmark_suspend.py [--images xfce_gui_container,lxqt_container] [--repeat 3]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+import session_probe
+
+BENCH_PREFIX = "bench_suspend_"
+CHECKPOINT_NAME = "idle"
+READY_TIMEOUT = 120  # secondes
+POLL_INTERVAL = 0.05
+
+def docker(*args, timeout=300):
+    """Exécute une commande docker et lève une erreur en cas d'échec"""
+    result = subprocess.run(["docker"] + list(args), capture_output=True, text=True, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(f"docker {args[0]}: {result.stderr.strip()}")
+    return result.stdout.strip()
+
+def load_images():
+    """Récupère la liste des images de images.txt"""
+    images = []
+    with open(session_probe.IMAGE_FILE, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                images.append(line.split(':')[0])
+    return images
+
+def get_pid(name):
+    """PID du processus init du conteneur (0 s'il n'est pas démarré)"""
+    pid = docker("inspect", "--format", "{{.State.Pid}}", name)
+    return int(pid) if pid.isdigit() else 0
+
+def wait_rdp_ready(name, ports):
+    """Attend que le port RDP soit en écoute (état LISTEN) dans le conteneur"""
+    deadline = time.time() + READY_TIMEOUT
+    while time.time() < deadline:
+        pid = get_pid(name)
+        if pid:
+            try:
+                if session_probe.count_in_state(session_probe.read_tcp_tables(pid), ports, '0A'):
+                    return
+            except OSError:
+                pass
+        time.sleep(POLL_INTERVAL)
+    raise RuntimeError(f"{name}: port RDP toujours fermé après {READY_TIMEOUT}s")
+
+def get_dir_size(path):
+    """Taille totale d'un répertoire en octets"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                pass
+    return total
+
+def get_memory_usage(name):
+    """Mémoire utilisée par le conteneur au moment du checkpoint"""
+    return docker("stats", "--no-stream", "--format", "{{.MemUsage}}", name).split('/')[0].strip()
+
+def bench_image(image, ports, checkpoint_root):
+    """Mesure une fois les trois chemins de reprise pour une image"""
+    name = f"{BENCH_PREFIX}{image}"
+    checkpoint_dir = os.path.join(checkpoint_root, image)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    subprocess.run(["docker", "rm", "-f", name], capture_output=True)
+    result = {}
+    try:
+        # Démarrage à froid (docker run complet)
+        start = time.time()
+        docker("run", "-d", "--name", name, "-e", "USERNAME=bench", "-e", "PASSWORD=bench", image)
+        wait_rdp_ready(name, ports)
+        result['cold'] = time.time() - start
+        result['memory'] = get_memory_usage(name)
+
+        # Arrêt simple puis redémarrage (bureau perdu, comme la veille par défaut)
+        docker("stop", name)
+        start = time.time()
+        docker("start", name)
+        wait_rdp_ready(name, ports)
+        result['warm'] = time.time() - start
+
+        # Checkpoint CRIU puis restauration
+        start = time.time()
+        docker("checkpoint", "create", "--checkpoint-dir", checkpoint_dir, name, CHECKPOINT_NAME)
+        result['checkpoint'] = time.time() - start
+        result['size'] = get_dir_size(os.path.join(checkpoint_dir, CHECKPOINT_NAME))
+
+        start = time.time()
+        docker("start", "--checkpoint-dir", checkpoint_dir, "--checkpoint", CHECKPOINT_NAME, name)
+        wait_rdp_ready(name, ports)
+        result['restore'] = time.time() - start
+    finally:
+        subprocess.run(["docker", "rm", "-f", name], capture_output=True)
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    return result
+
+def format_size(size):
+    """Formate une taille en octets"""
+    for unit in ('o', 'Ko', 'Mo', 'Go'):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} To"
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare checkpoint CRIU, redémarrage et démarrage à froid par image")
+    parser.add_argument('--images', help="Images à tester, séparées par des virgules (défaut: toutes celles de images.txt)")
+    parser.add_argument('-r', '--repeat', type=int, default=1, help="Nombre de mesures par image")
+    parser.add_argument('--checkpoint-dir', help="Répertoire des checkpoints (défaut: répertoire temporaire)")
+    args = parser.parse_args()
+
+    images = args.images.split(',') if args.images else load_images()
+    image_ports = session_probe.get_image_ports()
+    checkpoint_root = args.checkpoint_dir or tempfile.mkdtemp(prefix="bench_checkpoint_")
+
+    rows = []
+    try:
+        for image in images:
+            ports = image_ports.get(image, {'rdp': set(session_probe.DEFAULT_RDP_PORTS)})['rdp']
+            runs = []
+            for i in range(args.repeat):
+                print(f"{image}: mesure {i + 1}/{args.repeat}...", file=sys.stderr)
+                try:
+                    runs.append(bench_image(image, ports, checkpoint_root))
+                except (RuntimeError, subprocess.TimeoutExpired) as e:
+                    print(f"{image}: échec de la mesure: {e}", file=sys.stderr)
+                    break
+            if runs:
+                rows.append((image, runs))
+    finally:
+        if not args.checkpoint_dir:
+            shutil.rmtree(checkpoint_root, ignore_errors=True)
+
+    if not rows:
+        print("Aucune mesure réussie (criu installé et démon Docker en mode expérimental ?)")
+        return 1
+
+    header = f"{'Image':<30} {'Mémoire':>10} {'Froid':>8} {'Redém.':>8} {'Checkpt':>8} {'Restau.':>8} {'Taille':>10} {'Gain':>6}"
+    print(header)
+    print('-' * len(header))
+    for image, runs in rows:
+        median = {key: statistics.median(run[key] for run in runs)
+                  for key in ('cold', 'warm', 'checkpoint', 'restore', 'size')}
+        speedup = median['cold'] / median['restore'] if median['restore'] else 0
+        print(f"{image[:30]:<30} {runs[-1]['memory']:>10} {median['cold']:>7.2f}s {median['warm']:>7.2f}s "
+              f"{median['checkpoint']:>7.2f}s {median['restore']:>7.2f}s {format_size(median['size']):>10} {speedup:>5.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Lecture directe des métriques cgroup v2 des conteneurs (CPU, mémoire, I/O, nombre de processus).
+Remplace `docker stats --no-stream`, qui bloque ~2 s par appel pour calculer le delta CPU :
+ici le pourcentage CPU est calculé entre deux échantillons successifs de ce module,
+et la lecture d'un conteneur ne coûte que quelques appels open/read.
+Exécuter avec: python3 cgroup_metrics.py   (échantillonne les conteneurs utilisateurs)
+"""
+import os
+import time
+import threading
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+# Emplacements possibles selon le pilote cgroup de Docker (systemd ou cgroupfs)
+CGROUP_PATTERNS = (
+    "system.slice/docker-{id}.scope",
+    "docker/{id}",
+)
+PRIME_INTERVAL = 0.25  # secondes entre deux lectures quand aucun échantillon précédent n'existe
+
+# Chemin cgroup par ID complet de conteneur
+_cgroup_dirs = {}
+# Dernier échantillon CPU par ID: (instant, usage_usec)
+_previous_cpu = {}
+_lock = threading.Lock()
+
+def is_available():
+    """Vérifie que l'hôte utilise la hiérarchie unifiée cgroup v2"""
+    return os.path.exists(os.path.join(CGROUP_ROOT, "cgroup.controllers"))
+
+def find_cgroup_dir(container_id, pid=None):
+    """Trouve le répertoire cgroup d'un conteneur à partir de son ID complet
+    (ou, à défaut, de /proc/<pid>/cgroup)"""
+    path = _cgroup_dirs.get(container_id)
+    if path and os.path.isdir(path):
+        return path
+
+    path = None
+    for pattern in CGROUP_PATTERNS:
+        candidate = os.path.join(CGROUP_ROOT, pattern.format(id=container_id))
+        if os.path.isdir(candidate):
+            path = candidate
+            break
+    if path is None and pid:
+        try:
+            with open(f"/proc/{pid}/cgroup", 'r') as f:
+                for line in f:
+                    # Format cgroup v2: 0::/chemin
+                    if line.startswith("0::"):
+                        candidate = os.path.join(CGROUP_ROOT, line[3:].strip().lstrip('/'))
+                        if os.path.isdir(candidate):
+                            path = candidate
+                        break
+        except OSError:
+            pass
+
+    if path:
+        _cgroup_dirs[container_id] = path
+    else:
+        _cgroup_dirs.pop(container_id, None)
+    return path
+
+def read_file(path):
+    """Lit un fichier cgroup (None s'il n'existe pas, ex. contrôleur désactivé)"""
+    try:
+        with open(path, 'r') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def read_flat_keyed(content):
+    """Analyse un fichier 'clé valeur' (cpu.stat, memory.stat)"""
+    values = {}
+    for line in (content or '').splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[1].isdigit():
+            values[parts[0]] = int(parts[1])
+    return values
+
+def read_io_stat(content):
+    """Additionne les octets lus/écrits de tous les périphériques (io.stat)"""
+    read_bytes = write_bytes = 0
+    for line in (content or '').splitlines():
+        for field in line.split()[1:]:
+            key, _, value = field.partition('=')
+            if key == 'rbytes':
+                read_bytes += int(value)
+            elif key == 'wbytes':
+                write_bytes += int(value)
+    return read_bytes, write_bytes
+
+def read_int(content):
+    """Convertit le contenu d'un fichier à valeur unique ('max' = illimité -> None)"""
+    if content is None:
+        return None
+    content = content.strip()
+    return int(content) if content.isdigit() else None
+
+def read_container_metrics(path):
+    """Lit les métriques brutes d'un cgroup de conteneur"""
+    cpu = read_flat_keyed(read_file(os.path.join(path, "cpu.stat")))
+    if 'usage_usec' not in cpu:
+        raise OSError(f"cpu.stat illisible dans {path}")
+    memory_stat = read_flat_keyed(read_file(os.path.join(path, "memory.stat")))
+    memory_current = read_int(read_file(os.path.join(path, "memory.current"))) or 0
+    io_read, io_write = read_io_stat(read_file(os.path.join(path, "io.stat")))
+    return {
+        'cpu_usec': cpu['usage_usec'],
+        # Même calcul que docker stats: le cache de fichiers inactif n'est pas compté
+        'mem_usage': max(memory_current - memory_stat.get('inactive_file', 0), 0),
+        'mem_limit': read_int(read_file(os.path.join(path, "memory.max"))),
+        'mem_anon': memory_stat.get('anon', 0),
+        'mem_file': memory_stat.get('file', 0),
+        'io_read': io_read,
+        'io_write': io_write,
+        'pids': read_int(read_file(os.path.join(path, "pids.current"))) or 0,
+    }
+
+def sample(container_ids, pids=None, prime=True):
+    """Échantillonne les conteneurs donnés (IDs complets) et retourne {id: métriques}.
+    'cpu_percent' est calculé depuis l'échantillon précédent (100 % = un cœur, comme docker stats).
+    Si prime est vrai et qu'un conteneur n'a pas encore d'échantillon, une seconde lecture
+    est faite après PRIME_INTERVAL pour que le pourcentage CPU soit disponible dès le premier appel.
+    Les conteneurs dont le cgroup est introuvable sont absents du résultat."""
+    pids = pids or {}
+    results = {}
+    for container_id in container_ids:
+        path = find_cgroup_dir(container_id, pids.get(container_id))
+        if not path:
+            continue
+        try:
+            results[container_id] = read_container_metrics(path)
+        except OSError:
+            continue  # Conteneur arrêté entre-temps
+    now = time.time()
+
+    with _lock:
+        unprimed = [cid for cid in results if cid not in _previous_cpu]
+        for container_id, metrics in results.items():
+            _previous_cpu.setdefault(container_id, (now, metrics['cpu_usec']))
+
+    if prime and unprimed:
+        time.sleep(PRIME_INTERVAL)
+        return sample(container_ids, pids, prime=False)
+
+    with _lock:
+        for container_id, metrics in results.items():
+            previous_time, previous_usec = _previous_cpu[container_id]
+            elapsed = now - previous_time
+            if elapsed > 0 and metrics['cpu_usec'] >= previous_usec:
+                metrics['cpu_percent'] = (metrics['cpu_usec'] - previous_usec) / (elapsed * 1e6) * 100
+            else:
+                metrics['cpu_percent'] = None  # Premier échantillon ou conteneur redémarré
+            _previous_cpu[container_id] = (now, metrics['cpu_usec'])
+        # Oublier les conteneurs disparus
+        requested = set(container_ids)
+        for container_id in list(_previous_cpu):
+            if container_id in requested and container_id not in results:
+                del _previous_cpu[container_id]
+    return results
+
+def format_bytes(size):
+    """Formate une taille comme docker stats (ex. 512.3MiB)"""
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024:
+            return f"{size:.4g}{unit}"
+        size /= 1024
+    return f"{size:.4g}TiB"
+
+def format_docker_stats(metrics, host_memory=None):
+    """Convertit des métriques au format des colonnes de docker stats (CPU %, usage / limite, mémoire %)"""
+    limit = metrics['mem_limit'] or host_memory
+    cpu = f"{metrics['cpu_percent']:.2f}%" if metrics.get('cpu_percent') is not None else "N/A"
+    mem = f"{format_bytes(metrics['mem_usage'])} / {format_bytes(limit)}" if limit else format_bytes(metrics['mem_usage'])
+    mem_perc = f"{metrics['mem_usage'] / limit * 100:.2f}%" if limit else "N/A"
+    return {'cpu': cpu, 'mem': mem, 'mem_perc': mem_perc}
+
+def get_host_memory():
+    """Mémoire totale de l'hôte en octets (limite affichée pour les conteneurs sans --memory)"""
+    try:
+        with open("/proc/meminfo", 'r') as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def format_prometheus(samples, labels):
+    """Formate des échantillons au format texte Prometheus.
+    labels: {id: {'name': ..., 'image': ...}}"""
+    metrics = [
+        ('rdp_container_cpu_seconds_total', 'counter', lambda m: m['cpu_usec'] / 1e6),
+        ('rdp_container_cpu_percent', 'gauge', lambda m: m.get('cpu_percent')),
+        ('rdp_container_memory_bytes', 'gauge', lambda m: m['mem_usage']),
+        ('rdp_container_memory_limit_bytes', 'gauge', lambda m: m['mem_limit']),
+        ('rdp_container_io_read_bytes_total', 'counter', lambda m: m['io_read']),
+        ('rdp_container_io_write_bytes_total', 'counter', lambda m: m['io_write']),
+        ('rdp_container_pids', 'gauge', lambda m: m['pids']),
+    ]
+    lines = []
+    for metric, metric_type, getter in metrics:
+        lines.append(f"# TYPE {metric} {metric_type}")
+        for container_id, values in samples.items():
+            value = getter(values)
+            if value is None:
+                continue
+            info = labels.get(container_id, {})
+            lines.append(f'{metric}{{name="{info.get("name", container_id[:12])}",image="{info.get("image", "")}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+if __name__ == "__main__":
+    import session_probe
+    if not is_available():
+        print("cgroup v2 non disponible sur cet hôte")
+    else:
+        inventory = session_probe.get_inventory()
+        ids = {info['id']: name for name, info in inventory.items()}
+        pids = {info['id']: info['pid'] for info in inventory.values()}
+        samples = sample(list(ids), pids)
+        start = time.time()
+        samples = sample(list(ids), pids)
+        elapsed = time.time() - start
+        host_memory = get_host_memory()
+        for container_id, metrics in sorted(samples.items(), key=lambda item: ids[item[0]]):
+            stats = format_docker_stats(metrics, host_memory)
+            print(f"{ids[container_id]}: CPU {stats['cpu']}, mémoire {stats['mem']} ({stats['mem_perc']}), "
+                  f"{metrics['pids']} processus")
+        print(f"{len(samples)} conteneur(s) échantillonné(s) en {elapsed * 1000:.2f} ms")
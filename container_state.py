@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Cache de l'état des conteneurs alimenté par le flux `docker events`.
+Une seule liste complète au démarrage (docker ps -a + un docker inspect groupé), puis les
+événements create/start/die/stop/destroy/pause/unpause mettent le cache à jour en continu.
+Une réconciliation périodique rattrape les événements manqués (flux coupé, démon redémarré).
+Les questions « gui_user_X existe-t-il / tourne-t-il / quel conteneur tient ce port »
+sont des lectures de dictionnaire.
+Exécuter avec: python3 container_state.py   (affiche l'état puis les événements reçus)
+"""
+import json
+import time
+import logging
+import threading
+import subprocess
+
+RECONCILE_INTERVAL = 60  # secondes
+RESTART_DELAY = 5        # secondes avant de relancer un flux d'événements interrompu
+LISTING_TIMEOUT = 30
+EVENTS = ("create", "start", "die", "stop", "destroy", "pause", "unpause")
+
+log = logging.getLogger(__name__)
+
+def inspect_state(container_ids, timeout=LISTING_TIMEOUT):
+    """Inspecte des conteneurs et retourne {nom: état}"""
+    if not container_ids:
+        return {}
+    output = subprocess.run(
+        ["docker", "inspect", "--format",
+         "{{.Name}}|{{.Id}}|{{.State.Status}}|{{.Config.Image}}|{{json .HostConfig.PortBindings}}"] + container_ids,
+        capture_output=True, text=True, timeout=timeout
+    ).stdout
+    states = {}
+    for line in output.splitlines():
+        parts = line.strip().lstrip('/').split('|', 4)
+        if len(parts) != 5:
+            continue
+        ports = set()
+        try:
+            for bindings in (json.loads(parts[4]) or {}).values():
+                for binding in bindings or []:
+                    if binding.get('HostPort'):
+                        ports.add(int(binding['HostPort']))
+        except (ValueError, AttributeError):
+            pass
+        states[parts[0]] = {'name': parts[0], 'id': parts[1], 'status': parts[2], 'image': parts[3], 'ports': ports}
+    return states
+
+def list_all_states(timeout=LISTING_TIMEOUT):
+    """Liste complète : un docker ps -a puis un seul docker inspect pour tous les conteneurs"""
+    ids = subprocess.run(
+        ["docker", "ps", "-aq", "--no-trunc"], capture_output=True, text=True, timeout=timeout
+    ).stdout.split()
+    return inspect_state(ids, timeout)
+
+class ContainerStateCache:
+    """État de tous les conteneurs, tenu à jour par le flux d'événements Docker"""
+
+    def __init__(self, reconcile_interval=RECONCILE_INTERVAL):
+        self.reconcile_interval = reconcile_interval
+        self.states = {}
+        self.ports = {}    # port hôte -> noms des conteneurs qui le publient (en cours ou arrêtés)
+        self.replay = None  # événements reçus pendant une liste complète, rejoués sur celle-ci
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+        self.process = None
+        self.last_reconcile = 0
+        self.events_received = 0
+
+    def start(self):
+        """Liste complète puis abonnement aux événements (threads en arrière-plan)"""
+        threading.Thread(target=self._events_loop, daemon=True).start()
+        threading.Thread(target=self._reconcile_loop, daemon=True).start()
+        return self
+
+    def _replace(self, states):
+        with self.lock:
+            # Événements arrivés pendant la liste (un destroy ne doit pas être annulé par elle)
+            for action, name, created in self.replay or []:
+                self._apply_locked(states, action, name, created)
+            self.replay = None
+            ports = {}
+            for name, state in states.items():
+                for port in state['ports']:
+                    ports.setdefault(port, set()).add(name)
+            self.states = states
+            self.ports = ports
+            self.last_reconcile = time.time()
+        self.ready.set()
+
+    def reconcile(self):
+        """Recharge l'état complet (rattrape les événements manqués)"""
+        with self.lock:
+            self.replay = []
+        try:
+            states = list_all_states()
+        except (OSError, subprocess.TimeoutExpired) as e:
+            with self.lock:
+                self.replay = None
+            log.warning(f"Erreur lors de la liste des conteneurs: {e}")
+            return
+        self._replace(states)
+
+    def _reconcile_loop(self):
+        while True:
+            time.sleep(self.reconcile_interval)
+            self.reconcile()
+
+    def _events_loop(self):
+        while True:
+            try:
+                # Abonnement avant la liste complète : aucun événement ne tombe entre les deux
+                self.process = subprocess.Popen(
+                    ["docker", "events", "--format", "{{json .}}", "--filter", "type=container"] +
+                    [arg for event in EVENTS for arg in ("--filter", f"event={event}")],
+                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+                )
+                self.reconcile()
+                for line in self.process.stdout:
+                    try:
+                        self.apply_event(json.loads(line))
+                    except (ValueError, KeyError):
+                        continue
+            except OSError as e:
+                log.warning(f"Flux d'événements Docker indisponible: {e}")
+            # Flux interrompu (démon redémarré...) : les réponses reposent sur la réconciliation
+            self.ready.clear()
+            time.sleep(RESTART_DELAY)
+
+    def apply_event(self, event):
+        """Met à jour le cache à partir d'un événement Docker"""
+        action = event.get('Action') or event.get('status', '')
+        attributes = event.get('Actor', {}).get('Attributes', {})
+        name = attributes.get('name')
+        if not name or action not in EVENTS:
+            return
+        self.events_received += 1
+
+        created = None
+        if action == "create":
+            # Les ports publiés ne figurent pas dans l'événement
+            try:
+                created = inspect_state([event.get('id') or name], timeout=5).get(name)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+            if created is None:
+                created = {'name': name, 'id': event.get('id', ''), 'status': 'created',
+                           'image': attributes.get('image', ''), 'ports': set()}
+
+        with self.lock:
+            previous = self.states.get(name)
+            self._apply_locked(self.states, action, name, created)
+            if self.replay is not None:
+                self.replay.append((action, name, created))
+            if action == "create":
+                for port in created['ports']:
+                    self.ports.setdefault(port, set()).add(name)
+            elif action == "destroy" and previous:
+                for port in previous['ports']:
+                    owners = self.ports.get(port, set())
+                    owners.discard(name)
+                    if not owners:
+                        self.ports.pop(port, None)
+
+    @staticmethod
+    def _apply_locked(states, action, name, created):
+        """Applique un événement à un dictionnaire d'états (verrou tenu)"""
+        if action == "create":
+            states[name] = dict(created)
+        elif action == "destroy":
+            states.pop(name, None)
+        elif name in states:
+            # Conteneur absent : créé avant la dernière liste et déjà manqué, la réconciliation s'en charge
+            if action in ("start", "unpause"):
+                states[name]['status'] = 'running'
+            elif action == "pause":
+                states[name]['status'] = 'paused'
+            elif action in ("die", "stop"):
+                states[name]['status'] = 'exited'
+
+    def is_ready(self):
+        """Vrai si le cache est à jour (liste chargée et flux d'événements actif)"""
+        return self.ready.is_set()
+
+    def get(self, name):
+        """État d'un conteneur: {'name', 'id', 'status', 'image', 'ports'} ou None"""
+        with self.lock:
+            state = self.states.get(name)
+            return dict(state) if state else None
+
+    def exists(self, name):
+        return name in self.states
+
+    def is_running(self, name):
+        state = self.states.get(name)
+        return bool(state) and state['status'] == 'running'
+
+    def port_owner(self, port):
+        """Nom du conteneur auquel un port hôte est attribué (None si libre).
+        Plusieurs conteneurs peuvent publier le même port (un seul à la fois en cours) : le conteneur
+        en cours (ou gelé) est préféré à un conteneur arrêté."""
+        rank = {'running': 0, 'paused': 1}
+        with self.lock:
+            owners = [self.states[name] for name in self.ports.get(int(port), ()) if name in self.states]
+            if not owners:
+                return None
+            return min(owners, key=lambda state: (rank.get(state['status'], 2), state['name']))['name']
+
+    def used_ports(self):
+        """Ports hôte attribués à un conteneur (en cours ou arrêté)"""
+        with self.lock:
+            return set(self.ports)
+
+    def list(self, prefix=""):
+        """États des conteneurs dont le nom commence par prefix"""
+        with self.lock:
+            return [dict(state) for name, state in self.states.items() if name.startswith(prefix)]
+
+    def script_hint(self, name):
+        """Variables d'environnement transmises à script.sh pour lui éviter ses docker ps :
+        CONTAINER_STATE_HINT="<nom>:<statut>" ('absent' si le conteneur n'existe pas) et
+        DOCKER_PORTS_HINT (ports hôte attribués). Vide si le cache n'est pas à jour."""
+        if not self.is_ready():
+            return {}
+        state = self.get(name)
+        return {
+            'CONTAINER_STATE_HINT': f"{name}:{state['status'] if state else 'absent'}",
+            'DOCKER_PORTS_HINT': ' '.join(str(port) for port in sorted(self.used_ports()))
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache(wait=5):
+    """Retourne le cache partagé du processus (démarré au premier appel, attend la première liste)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ContainerStateCache().start()
+    _cache.ready.wait(wait)
+    return _cache
+
+if __name__ == "__main__":
+    start = time.time()
+    cache = get_cache(wait=LISTING_TIMEOUT)
+    print(f"{len(cache.states)} conteneur(s) chargé(s) en {(time.time() - start) * 1000:.0f} ms")
+    for state in sorted(cache.list("gui_user_"), key=lambda s: s['name']):
+        ports = ','.join(str(p) for p in sorted(state['ports']))
+        print(f"{state['name']}: {state['status']} ({state['image']}) ports {ports}")
+    print("En attente d'événements (Ctrl+C pour quitter)...")
+    try:
+        seen = cache.events_received
+        while True:
+            time.sleep(1)
+            if cache.events_received != seen:
+                seen = cache.events_received
+                running = sum(1 for s in cache.list() if s['status'] == 'running')
+                print(f"{seen} événement(s) reçu(s), {len(cache.states)} conteneur(s), {running} en cours")
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Collecte en arrière-plan pour le tableau de bord admin.
+Un thread rafraîchit l'inventaire (pool borné, une date limite globale par cycle) et publie
+des relevés complets : l'affichage lit toujours le dernier relevé publié sans jamais attendre,
+et les conteneurs dont une mesure n'a pas abouti à temps gardent leur valeur précédente
+marquée 'stale'. Le dernier relevé est enregistré dans dashboard_snapshot.json pour que le
+tableau de bord affiche des données dès son lancement.
+Les fonctions de collecte journalisent leurs erreurs (module logging) : MessageHandler les
+conserve pour la barre d'état, sans toucher à sys.stdout.
+"""
+import os
+import json
+import logging
+import time
+import threading
+from dataclasses import asdict
+
+import gpu_telemetry
+
+SNAPSHOT_FILE = "dashboard_snapshot.json"
+
+class MessageHandler(logging.Handler):
+    """Conserve les messages journalisés pendant la collecte pour la barre d'état
+    au lieu de les afficher au milieu du menu"""
+
+    def __init__(self, on_message):
+        super().__init__(logging.WARNING)
+        self.on_message = on_message
+
+    def emit(self, record):
+        self.on_message(self.format(record))
+
+def load_snapshot(path=SNAPSHOT_FILE):
+    """Relit le dernier relevé enregistré; tous ses conteneurs sont marqués 'stale'"""
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        for container in data['containers']:
+            container['stale'] = True
+        data['gpus'] = [gpu_telemetry.GpuDevice(**gpu) for gpu in data.get('gpus', [])]
+        data.setdefault('hosts', [])
+        data['persisted'] = True
+        return data
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def save_snapshot(snapshot, path=SNAPSHOT_FILE):
+    """Enregistre un relevé de façon atomique (fichier temporaire puis renommage);
+    lève OSError ou TypeError en cas d'échec"""
+    data = dict(snapshot, gpus=[asdict(gpu) for gpu in snapshot['gpus']])
+    data.pop('persisted', None)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+class SnapshotCollector(threading.Thread):
+    """Rafraîchit l'inventaire en continu et publie des relevés immuables.
+    collect_containers(previous, deadline) et collect_gpus() sont fournis par le tableau de bord.
+    Chaque relevé publié est ajouté à history (metrics_history.MetricsHistory) si elle est fournie.
+    collect_hosts() (tableau de bord multi-hôtes) fournit les lignes de synthèse par hôte du relevé."""
+
+    def __init__(self, collect_containers, collect_gpus, interval, deadline, snapshot_file=SNAPSHOT_FILE,
+                 history=None, collect_hosts=None):
+        super().__init__(daemon=True)
+        self.collect_containers = collect_containers
+        self.collect_gpus = collect_gpus
+        self.interval = interval
+        self.deadline = deadline
+        self.snapshot_file = snapshot_file
+        self.history = history
+        self.collect_hosts = collect_hosts
+        self.busy = False
+        self.messages = []
+        self.wakeup = threading.Event()
+        self.updated = threading.Condition()
+        # Relevé publié (remplacé en bloc, jamais modifié) et son numéro de version
+        self.snapshot = load_snapshot(snapshot_file) or {'time': 0, 'duration': 0, 'containers': [], 'gpus': [],
+                                                         'hosts': []}
+        self.version = 0
+
+    def add_message(self, message):
+        self.messages = (self.messages + [message])[-20:]
+
+    @property
+    def last_message(self):
+        return self.messages[-1] if self.messages else ""
+
+    def get_snapshot(self):
+        """Dernier relevé publié (à ne pas modifier)"""
+        return self.snapshot
+
+    def request_refresh(self):
+        """Demande un nouveau cycle sans attendre l'intervalle"""
+        self.wakeup.set()
+
+    def wait_for_update(self, version, timeout):
+        """Attend la publication d'un relevé plus récent que version (ou l'expiration du délai)"""
+        with self.updated:
+            self.updated.wait_for(lambda: self.version != version, timeout)
+        return self.version
+
+    def collect(self):
+        """Construit un nouveau relevé à partir du précédent"""
+        start = time.time()
+        previous = {c['name']: c for c in self.snapshot['containers']}
+        containers = self.collect_containers(previous, self.deadline)
+        try:
+            gpus = self.collect_gpus()
+        except Exception as e:
+            self.add_message(f"Erreur lors de la lecture des GPU: {e}")
+            gpus = self.snapshot['gpus']
+        hosts = self.collect_hosts() if self.collect_hosts is not None else []
+        return {'time': time.time(), 'duration': time.time() - start, 'containers': containers, 'gpus': gpus,
+                'hosts': hosts}
+
+    def run(self):
+        while True:
+            self.busy = True
+            try:
+                snapshot = self.collect()
+            except Exception as e:
+                self.add_message(f"Erreur de collecte: {e}")
+                snapshot = None
+            self.busy = False
+            if snapshot is not None:
+                # Publication : l'affichage passe d'un relevé complet au suivant
+                with self.updated:
+                    self.snapshot = snapshot
+                    self.version += 1
+                    self.updated.notify_all()
+                try:
+                    save_snapshot(snapshot, self.snapshot_file)
+                except (OSError, TypeError) as e:
+                    self.add_message(f"Erreur lors de l'enregistrement de {self.snapshot_file}: {e}")
+                if self.history is not None:
+                    try:
+                        self.history.record_containers(snapshot['containers'], snapshot['time'])
+                    except (OSError, ValueError) as e:
+                        self.add_message(f"Erreur lors de l'enregistrement de l'historique: {e}")
+            self.wakeup.wait(self.interval if self.interval > 0 else None)
+            self.wakeup.clear()
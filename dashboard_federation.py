@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tableau de bord multi-hôtes : collecte concurrente de plusieurs démons Docker.
+Chaque hôte est collecté dans sa propre tâche avec la date limite du cycle. Un hôte qui n'a pas
+répondu à temps garde ses dernières valeurs (marquées 'stale') et n'est pas relancé tant que sa
+collecte précédente n'est pas terminée : un nœud lent ne retarde jamais l'affichage des autres
+et n'accumule pas de tâches. Un hôte injoignable est signalé dans les lignes de synthèse.
+Les hôtes sont les nœuds de nodes.txt (scheduler.py), des adresses DOCKER_HOST, ou 'local'.
+"""
+import time
+import threading
+from dataclasses import replace
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+import docker_api
+import scheduler
+
+LOCAL_HOST = "local"
+HOST_OK = "en ligne"
+HOST_SLOW = "lent"
+HOST_DOWN = "injoignable"
+
+def is_local_address(address):
+    """Vrai si l'adresse désigne le démon local (collecte complète : cgroups, sessions, GPU)"""
+    return address in (LOCAL_HOST, f"unix://{docker_api.get_socket_path()}")
+
+def parse_hosts(spec, nodes_file=scheduler.NODES_FILE):
+    """Liste des hôtes de --hosts : noms de nœuds de nodes.txt ou adresses DOCKER_HOST séparés par
+    des virgules, 'local' pour le démon local; vide ou '*' = tous les nœuds de nodes.txt.
+    Retourne [{'name', 'host'}] (host None pour le démon local). Lève ValueError si la liste est invalide."""
+    nodes = {node['name']: node for node in scheduler.load_nodes(nodes_file)}
+    if spec.strip() in ("", "*"):
+        if not nodes:
+            raise ValueError(f"Aucun nœud déclaré dans {nodes_file}")
+        items = list(nodes)
+    else:
+        items = [item.strip() for item in spec.split(',') if item.strip()]
+    hosts = []
+    for item in items:
+        node = nodes.get(item)
+        address = node['host'] if node else item
+        if item == LOCAL_HOST or is_local_address(address):
+            name, address = item if node else LOCAL_HOST, None
+        else:
+            try:
+                docker_api.parse_docker_host(address)
+            except docker_api.DockerAPIError as e:
+                raise ValueError(f"Hôte '{item}' : ni un nœud de {nodes_file}, ni une adresse valide ({e})")
+            name = node['name'] if node else (urlparse(address).hostname or address)
+        if any(host['name'] == name for host in hosts):
+            raise ValueError(f"Hôte '{name}' indiqué deux fois")
+        hosts.append({'name': name, 'host': address})
+    return hosts
+
+class Federation:
+    """Agrège les relevés de plusieurs hôtes pour dashboard_collector.SnapshotCollector.
+    collect_host(host, previous, deadline) -> (conteneurs, GPU) est fourni par le tableau de bord;
+    previous contient les derniers conteneurs connus de cet hôte ({nom: détails})."""
+
+    def __init__(self, hosts, collect_host):
+        self.hosts = hosts
+        self.collect_host = collect_host
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(hosts)))
+        self.pending = {}
+        self.lock = threading.Lock()
+        # Dernier état connu de chaque hôte
+        self.states = {host['name']: {
+            'name': host['name'], 'host': host['host'] or LOCAL_HOST, 'status': HOST_SLOW,
+            'error': "en attente du premier relevé", 'time': 0, 'duration': 0, 'containers': [], 'gpus': []
+        } for host in hosts}
+
+    def _timed_collect(self, host, previous, deadline):
+        start = time.time()
+        containers, gpus = self.collect_host(host, previous, deadline)
+        return containers, gpus, time.time() - start
+
+    def collect_containers(self, previous, deadline):
+        """Un cycle : lance la collecte des hôtes disponibles, attend au plus deadline, puis fusionne
+        les derniers conteneurs de chaque hôte (étiquetés 'host')"""
+        for host in self.hosts:
+            name = host['name']
+            if name in self.pending:
+                continue  # Collecte précédente toujours en cours : pas de nouvelle tâche
+            # Relevé enregistré au lancement : les conteneurs de cet hôte servent de valeurs précédentes
+            state = self.states[name]
+            if not state['containers']:
+                state['containers'] = [c for c in previous.values() if c.get('host') == name]
+            host_previous = {c['name']: c for c in state['containers']}
+            self.pending[name] = self.executor.submit(self._timed_collect, host, host_previous, deadline)
+        wait(list(self.pending.values()), timeout=deadline)
+
+        containers = []
+        with self.lock:
+            for host in self.hosts:
+                name = host['name']
+                state = self.states[name]
+                future = self.pending[name]
+                fresh = False
+                if not future.done():
+                    state.update(status=HOST_SLOW, error=f"pas de réponse en {deadline:g}s")
+                else:
+                    del self.pending[name]
+                    try:
+                        host_containers, gpus, duration = future.result()
+                        for container in host_containers:
+                            container['host'] = name
+                        gpus = [replace(gpu, host=name) for gpu in gpus]
+                        state.update(status=HOST_OK, error='', time=time.time(), duration=duration,
+                                     containers=host_containers, gpus=gpus)
+                        fresh = True
+                    except Exception as e:
+                        state.update(status=HOST_DOWN, error=str(e))
+                if not fresh:
+                    # Dernières valeurs connues de l'hôte, signalées comme anciennes
+                    state['containers'] = [dict(c, stale=True) for c in state['containers']]
+                containers.extend(state['containers'])
+        return containers
+
+    def collect_gpus(self):
+        """GPU de tous les hôtes (dernier relevé de chacun)"""
+        with self.lock:
+            return [gpu for host in self.hosts for gpu in self.states[host['name']]['gpus']]
+
+    def summaries(self):
+        """Une ligne de synthèse par hôte : état, conteneurs, GPU, durée et date du dernier relevé"""
+        with self.lock:
+            return [{
+                'name': state['name'], 'host': state['host'], 'status': state['status'], 'error': state['error'],
+                'time': state['time'], 'duration': state['duration'],
+                'containers': len(state['containers']),
+                'running': sum(1 for c in state['containers'] if c['is_running']),
+                'gpus': len(state['gpus'])
+            } for state in (self.states[host['name']] for host in self.hosts)]
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Interface curses du tableau de bord admin (lancée par: python3 admin_dashboard.py --tui).
+- Seules les cellules modifiées depuis le dernier affichage sont réécrites (pas de `clear`)
+- Défilement, tri et filtres (utilisateur/image, statut, GPU) calculés sur les données en mémoire
+- Multi-hôtes (--hosts) : colonne 'Hôte' et une ligne de synthèse par hôte sous le titre
+- Les touches sont traitées immédiatement : la collecte tourne dans un thread séparé
+  (dashboard_collector), l'interface n'affiche que des relevés complets
+Seules les lignes visibles sont dessinées, ce qui reste fluide avec des milliers de conteneurs.
+"""
+import curses
+from datetime import datetime
+
+import admin_dashboard
+
+INPUT_TIMEOUT_MS = 100  # Réactivité du clavier (indépendante de l'intervalle de rafraîchissement)
+
+# (titre, largeur, clé de tri)
+COLUMNS = [
+    ("ID", 12, lambda c: c['id']),
+    ("Utilisateur", 16, lambda c: c['username']),
+    ("Status", 8, lambda c: (not c['is_running'], c['status'])),
+    ("CPU", 8, lambda c: -admin_dashboard.parse_percent(c['cpu'])),
+    ("CPU 1h", 12, None),  # Tri par moyenne sur la fenêtre de l'historique (voir sort_key)
+    ("Mémoire", 20, lambda c: -admin_dashboard.parse_percent(c['mem_perc'])),
+    ("GPU (MiB)", 10, lambda c: (not c['has_gpu'], -c['gpu_memory'])),
+    ("Uptime", 16, lambda c: c['uptime']),
+    ("Port", 6, lambda c: int(c['rdp_port']) if str(c['rdp_port']).isdigit() else 0),
+    ("Sess.", 5, lambda c: -(c.get('sessions') or 0)),
+    ("Image", 0, lambda c: c['image']),  # 0 = espace restant
+]
+HOST_COLUMN = ("Hôte", 10, lambda c: (c.get('host', ''), c['name']))  # Insérée avant Image en multi-hôtes
+HOST_COLORS = {'en ligne': 'green', 'lent': 'yellow'}  # Autres états (injoignable) en rouge
+STATUS_FILTERS = ("tous", "en cours", "arrêtés")
+GPU_FILTERS = ("tous", "GPU", "sans GPU")
+
+class DashboardTUI:
+    """Affichage différentiel du tableau des conteneurs"""
+
+    def __init__(self, screen, collector):
+        self.screen = screen
+        self.collector = collector
+        self.federated = collector.collect_hosts is not None
+        self.columns = COLUMNS[:-1] + [HOST_COLUMN] + COLUMNS[-1:] if self.federated else COLUMNS
+        self.sort_column = 2
+        self.sort_reverse = False
+        self.text_filter = ""
+        self.status_filter = 0
+        self.gpu_filter = 0
+        self.offset = 0
+        self.selected = 0
+        self.rows = []
+        self.rows_key = None
+        # Dernier contenu dessiné par ligne d'écran: liste de (texte, attribut) par cellule
+        self.drawn = {}
+        self.init_colors()
+
+    def init_colors(self):
+        curses.curs_set(0)
+        self.colors = {'default': curses.A_NORMAL, 'bold': curses.A_BOLD, 'reverse': curses.A_REVERSE}
+        if curses.has_colors():
+            curses.start_color()
+            try:
+                curses.use_default_colors()
+                background = -1
+            except curses.error:
+                background = curses.COLOR_BLACK
+            for number, (name, color) in enumerate([('green', curses.COLOR_GREEN), ('red', curses.COLOR_RED),
+                                                    ('yellow', curses.COLOR_YELLOW), ('cyan', curses.COLOR_CYAN)], 1):
+                curses.init_pair(number, color, background)
+                self.colors[name] = curses.color_pair(number)
+        else:
+            for name in ('green', 'red', 'yellow', 'cyan'):
+                self.colors[name] = curses.A_NORMAL
+
+    def column_widths(self, width):
+        """Largeurs des colonnes; la dernière prend l'espace restant"""
+        widths = [w for _, w, _ in self.columns[:-1]]
+        widths.append(max(10, width - sum(widths) - len(self.columns)))
+        return widths
+
+    def visible_rows(self):
+        """Applique filtres et tri, recalculés seulement si les données ou les critères changent"""
+        key = (self.collector.version, self.sort_column, self.sort_reverse,
+               self.text_filter, self.status_filter, self.gpu_filter)
+        if key == self.rows_key:
+            return self.rows
+        containers = self.collector.get_snapshot()['containers']
+        text = self.text_filter.lower()
+        rows = []
+        for container in containers:
+            if text and text not in container['username'].lower() and text not in container['image'].lower() \
+                    and text not in container.get('host', '').lower():
+                continue
+            if self.status_filter == 1 and not container['is_running']:
+                continue
+            if self.status_filter == 2 and container['is_running']:
+                continue
+            if self.gpu_filter == 1 and not container['has_gpu']:
+                continue
+            if self.gpu_filter == 2 and container['has_gpu']:
+                continue
+            rows.append(container)
+        rows.sort(key=self.sort_key(), reverse=self.sort_reverse)
+        self.rows = rows
+        self.rows_key = key
+        return rows
+
+    def sort_key(self):
+        """Clé de tri de la colonne choisie; les colonnes d'historique trient par moyenne sur la fenêtre"""
+        key = self.columns[self.sort_column][2]
+        if key is not None:
+            return key
+        history = self.collector.history
+        if history is None:
+            return lambda c: 0
+        return lambda c: -history.mean(c['name'], "cpu")
+
+    def format_cells(self, container, widths):
+        """Texte et attribut de chaque cellule d'une ligne"""
+        cpu = admin_dashboard.parse_percent(container['cpu'])
+        mem = admin_dashboard.parse_percent(container['mem_perc'])
+        if container['has_gpu']:
+            if container['is_running']:
+                gpu = (str(container['gpu_memory']), 'yellow' if not container['gpu_memory'] else 'default')
+            else:
+                gpu = ("✓ inactif", 'cyan')
+        else:
+            gpu = ("✗", 'default')
+        # Couleurs plutôt qu'emojis : leur largeur variable décalerait les colonnes
+        user_color = 'default'
+        if container.get('is_power_user'):
+            user_color = 'yellow'
+        elif container.get('is_blocked'):
+            user_color = 'red'
+        sessions = container.get('sessions')
+        history = self.collector.history
+        cpu_history = history.sparkline(container['name'], "cpu", COLUMNS[4][1]) if history is not None else ""
+        values = [
+            # ID en jaune : valeurs reprises du relevé précédent (mesure non terminée à temps)
+            (container['id'], 'yellow' if container.get('stale') else 'default'),
+            (container['username'], user_color),
+            (container['status'], 'green' if container['is_running'] else 'red'),
+            (container['cpu'], 'red' if container['is_running'] and cpu > 80 else 'default'),
+            (cpu_history, 'cyan'),
+            (container['mem'], 'red' if container['is_running'] and mem > 80 else 'default'),
+            gpu,
+            (container['uptime'], 'default'),
+            (str(container['rdp_port']), 'default'),
+            (str(sessions) if sessions is not None else "-", 'green' if sessions else 'default'),
+            (container['image'], 'default'),
+        ]
+        if self.federated:
+            values.insert(-1, (container.get('host', ''), 'default'))
+        return [(admin_dashboard.truncate_text(str(text), w).ljust(w) if w > 3 else str(text)[:w].ljust(w), color)
+                for (text, color), w in zip(values, widths)]
+
+    def draw_line(self, y, cells, widths, extra_attr=0):
+        """Écrit une ligne d'écran en ne réécrivant que les cellules qui ont changé"""
+        previous = self.drawn.get(y)
+        x = 0
+        for index, ((text, color), width) in enumerate(zip(cells, widths)):
+            attr = self.colors[color] | extra_attr
+            if previous is None or index >= len(previous) or previous[index] != (text, attr):
+                try:
+                    self.screen.addstr(y, x, text[:width], attr)
+                    if x + width < self.width - 1:
+                        self.screen.addstr(y, x + width, " ", extra_attr)
+                except curses.error:
+                    pass  # Écriture dans le coin inférieur droit
+            x += width + 1
+        self.drawn[y] = [(text, self.colors[color] | extra_attr) for text, color in cells]
+
+    def draw_text(self, y, text, color='default'):
+        """Écrit une ligne de texte libre (en-tête, barre d'état) si elle a changé"""
+        text = text[:self.width - 1].ljust(self.width - 1)
+        attr = self.colors[color]
+        if self.drawn.get(y) != [(text, attr)]:
+            try:
+                self.screen.addstr(y, 0, text, attr)
+            except curses.error:
+                pass
+            self.drawn[y] = [(text, attr)]
+
+    def draw(self):
+        self.height, self.width = self.screen.getmaxyx()
+        widths = self.column_widths(self.width)
+        rows = self.visible_rows()
+        collector = self.collector
+        snapshot = collector.get_snapshot()
+        hosts = snapshot.get('hosts', [])
+        body_height = self.body_height()
+
+        # Garder la sélection visible
+        self.selected = max(0, min(self.selected, len(rows) - 1))
+        if self.selected < self.offset:
+            self.offset = self.selected
+        elif self.selected >= self.offset + body_height:
+            self.offset = self.selected - body_height + 1
+        self.offset = max(0, min(self.offset, max(0, len(rows) - body_height)))
+
+        updated = datetime.fromtimestamp(snapshot['time']).strftime('%H:%M:%S') if snapshot['time'] else "--:--:--"
+        if snapshot.get('persisted'):
+            state = "relevé enregistré, collecte..."
+        else:
+            state = "collecte..." if collector.busy else f"{snapshot['duration']:.1f}s"
+        running = sum(1 for c in rows if c['is_running'])
+        self.draw_text(0, f" TABLEAU DE BORD ADMIN | {len(rows)} conteneur(s), {running} en cours | "
+                          f"mise à jour {updated} ({state})", 'bold')
+
+        # Synthèse par hôte (multi-hôtes) : un hôte lent ou injoignable garde ses derniers conteneurs
+        for line, host in enumerate(hosts, 1):
+            summary = (f" {host['name'][:12]:<12} {host['status']:<12} {host['running']:>4}/{host['containers']:<4} "
+                       f"en cours  {host['gpus']} GPU  collecte {host['duration']:.1f}s")
+            if host['error']:
+                summary += f"  {host['error']}"
+            self.draw_text(line, summary, HOST_COLORS.get(host['status'], 'red'))
+        top = 1 + len(hosts)
+
+        sort_title = self.columns[self.sort_column][0] + (" ▼" if self.sort_reverse else " ▲")
+        headers = [(title if i != self.sort_column else sort_title, 'bold')
+                   for i, (title, _, _) in enumerate(self.columns)]
+        self.draw_line(top, [(t[:w].ljust(w), c) for (t, c), w in zip(headers, widths)], widths, curses.A_UNDERLINE)
+
+        for line in range(body_height):
+            y = line + top + 1
+            index = self.offset + line
+            if index < len(rows):
+                attr = curses.A_REVERSE if index == self.selected else 0
+                self.draw_line(y, self.format_cells(rows[index], widths), widths, attr)
+            elif self.drawn.get(y) != []:
+                self.screen.move(y, 0)
+                self.screen.clrtoeol()
+                self.drawn[y] = []
+
+        filters = (f"filtre: '{self.text_filter}' | statut: {STATUS_FILTERS[self.status_filter]} | "
+                   f"GPU: {GPU_FILTERS[self.gpu_filter]}")
+        self.draw_text(self.height - 2, f" {filters} | {collector.last_message}",
+                       'yellow' if collector.last_message else 'default')
+        self.draw_text(self.height - 1, " ↑↓/PgUp/PgDn défiler | s/S trier | / filtrer | f statut | g GPU | "
+                                        "r rafraîchir | q quitter", 'cyan')
+        self.screen.noutrefresh()
+        curses.doupdate()
+
+    def prompt(self, label):
+        """Saisie d'un texte sur la dernière ligne (filtre)"""
+        curses.curs_set(1)
+        curses.echo()
+        self.screen.timeout(-1)
+        self.screen.move(self.height - 1, 0)
+        self.screen.clrtoeol()
+        self.screen.addstr(self.height - 1, 0, label)
+        try:
+            value = self.screen.getstr(self.height - 1, len(label), 60).decode(errors='replace')
+        finally:
+            curses.noecho()
+            curses.curs_set(0)
+            self.screen.timeout(INPUT_TIMEOUT_MS)
+        self.drawn.pop(self.height - 1, None)
+        return value.strip()
+
+    def body_height(self):
+        """Nombre de lignes du tableau (titre, synthèse des hôtes, en-têtes et barres d'état exclus)"""
+        return max(1, self.height - 4 - len(self.collector.get_snapshot().get('hosts', [])))
+
+    def handle_key(self, key):
+        """Traite une touche; retourne False pour quitter"""
+        body_height = self.body_height()
+        if key in (ord('q'), ord('Q'), 27):
+            return False
+        elif key == curses.KEY_RESIZE:
+            self.drawn.clear()
+            self.screen.erase()
+        elif key in (curses.KEY_DOWN, ord('j')):
+            self.selected += 1
+        elif key in (curses.KEY_UP, ord('k')):
+            self.selected -= 1
+        elif key == curses.KEY_NPAGE:
+            self.selected += body_height
+        elif key == curses.KEY_PPAGE:
+            self.selected -= body_height
+        elif key == curses.KEY_HOME:
+            self.selected = 0
+        elif key == curses.KEY_END:
+            self.selected = len(self.rows) - 1
+        elif key == ord('s'):
+            self.sort_column = (self.sort_column + 1) % len(self.columns)
+        elif key == ord('S'):
+            self.sort_reverse = not self.sort_reverse
+        elif key == ord('/'):
+            self.text_filter = self.prompt("Filtre (utilisateur, image ou hôte, vide = aucun): ")
+            self.selected = 0
+        elif key == ord('f'):
+            self.status_filter = (self.status_filter + 1) % len(STATUS_FILTERS)
+            self.selected = 0
+        elif key == ord('g'):
+            self.gpu_filter = (self.gpu_filter + 1) % len(GPU_FILTERS)
+            self.selected = 0
+        elif key == ord('r'):
+            self.collector.request_refresh()
+        return True
+
+    def run(self):
+        self.screen.timeout(INPUT_TIMEOUT_MS)
+        while True:
+            self.draw()
+            key = self.screen.getch()
+            if key != -1 and not self.handle_key(key):
+                break
+
+def run_tui(collector):
+    """Lance l'interface curses (collector: dashboard_collector.SnapshotCollector déjà démarré)
+    jusqu'à ce que l'utilisateur quitte"""
+    curses.wrapper(lambda screen: DashboardTUI(screen, collector).run())
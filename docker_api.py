@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Client minimal de l'API Docker Engine via le socket unix, sans lancer le CLI docker.
+Démons distants : tcp:// avec TLS (DOCKER_TLS_VERIFY / DOCKER_CERT_PATH, comme le CLI docker)
+ou ssh:// (docker system dial-stdio sur le nœud). tcp:// sans TLS (API sans authentification, donc accès root
+au nœud pour quiconque le joint) n'est accepté que sur la boucle locale (tunnel, démons de test).
+- Connexions HTTP/1.1 keep-alive réutilisées (pool borné), délai d'attente par appel
+- Identifiants passés dans l'URL (encodés), jamais interprétés par un shell
+- Logs et sorties de commandes (exec) lus en flux, ligne par ligne
+Exécuter avec: python3 docker_api.py   (liste les conteneurs et mesure la latence d'un appel)
+"""
+import os
+import ssl
+import json
+import time
+import queue
+import socket
+import threading
+import ipaddress
+import subprocess
+import http.client
+from urllib.parse import quote, urlencode, urlparse
+
+DOCKER_SOCKET = "/var/run/docker.sock"
+DEFAULT_TIMEOUT = 10  # secondes
+POOL_SIZE = 4
+
+class DockerAPIError(Exception):
+    """Erreur renvoyée par le démon Docker (status HTTP et message) ou socket inaccessible"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """Connexion HTTP sur un socket unix"""
+
+    def __init__(self, path, timeout=DEFAULT_TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self.sock = sock
+
+class SSHHTTPConnection(http.client.HTTPConnection):
+    """Connexion HTTP vers un démon distant via ssh : `docker system dial-stdio` relaie le socket
+    du nœud sur l'entrée/sortie de ssh, branchées sur une paire de sockets locale"""
+
+    def __init__(self, destination, timeout=DEFAULT_TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.destination = destination
+        self.process = None
+
+    def connect(self):
+        user, port = self.destination.username, self.destination.port
+        command = ["ssh", "-o", "BatchMode=yes", "-o", f"ConnectTimeout={max(int(self.timeout or 0), 1)}"]
+        if port:
+            command += ["-p", str(port)]
+        command += [f"{user}@{self.destination.hostname}" if user else self.destination.hostname,
+                    "--", "docker", "system", "dial-stdio"]
+        local, remote = socket.socketpair()
+        try:
+            self.process = subprocess.Popen(command, stdin=remote, stdout=remote, stderr=subprocess.DEVNULL)
+        except OSError:
+            local.close()
+            raise
+        finally:
+            remote.close()
+        local.settimeout(self.timeout)
+        self.sock = local
+
+    def close(self):
+        super().close()
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+def tls_context():
+    """Contexte TLS des démons tcp:// (DOCKER_CERT_PATH : ca.pem, cert.pem, key.pem), None sans DOCKER_TLS_VERIFY"""
+    if not os.environ.get("DOCKER_TLS_VERIFY"):
+        return None
+    cert_path = os.environ.get("DOCKER_CERT_PATH") or os.path.expanduser("~/.docker")
+    context = ssl.create_default_context(cafile=os.path.join(cert_path, "ca.pem"))
+    context.load_cert_chain(os.path.join(cert_path, "cert.pem"), os.path.join(cert_path, "key.pem"))
+    return context
+
+def is_loopback(hostname):
+    if hostname == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(hostname).is_loopback
+    except ValueError:
+        return False
+
+def get_socket_path():
+    """Chemin du socket Docker (DOCKER_HOST=unix://... s'il est défini)"""
+    host = os.environ.get("DOCKER_HOST", "")
+    if host.startswith("unix://"):
+        return host[len("unix://"):]
+    return DOCKER_SOCKET
+
+def parse_docker_host(host):
+    """Adresse d'un démon au format DOCKER_HOST : ('unix', chemin), ('tcp', (hôte, port))
+    ou ('ssh', url découpée)"""
+    if host.startswith("unix://"):
+        return "unix", host[len("unix://"):]
+    if host.startswith("ssh://"):
+        destination = urlparse(host)
+        try:
+            destination.port
+        except ValueError:
+            destination = None
+        if not destination or not destination.hostname:
+            raise DockerAPIError(f"Adresse de démon invalide: {host} (attendu ssh://utilisateur@hôte[:port])")
+        return "ssh", destination
+    if host.startswith("tcp://"):
+        address = host[len("tcp://"):].rstrip("/")
+        name, _, port = address.rpartition(":")
+        if not name or not port.isdigit():
+            raise DockerAPIError(f"Adresse de démon invalide: {host} (attendu tcp://hôte:port)")
+        return "tcp", (name.strip("[]"), int(port))
+    raise DockerAPIError(f"Adresse de démon non prise en charge: {host} (unix://, tcp:// ou ssh://)")
+
+def demux_stream(response):
+    """Découpe un flux multiplexé (conteneur sans TTY) : en-tête de 8 octets
+    [flux, 0, 0, 0, taille sur 4 octets] puis les données. Produit (flux, octets),
+    flux 1 = stdout, 2 = stderr."""
+    while True:
+        header = response.read(8)
+        if len(header) < 8:
+            return
+        size = int.from_bytes(header[4:8], "big")
+        data = response.read(size) if size else b""
+        yield header[0], data
+
+def iter_lines(chunks):
+    """Regroupe des (flux, octets) en (flux, ligne) complètes"""
+    pending = {}
+    for stream, data in chunks:
+        buffer = pending.get(stream, b"") + data
+        *lines, pending[stream] = buffer.split(b"\n")
+        for line in lines:
+            yield stream, line.decode(errors="replace").rstrip("\r")
+    for stream, rest in pending.items():
+        if rest:
+            yield stream, rest.decode(errors="replace")
+
+class DockerClient:
+    """Appels à l'API Engine sur des connexions keep-alive réutilisées.
+    host (format DOCKER_HOST, unix://, tcp:// ou ssh://) désigne un autre démon que le socket local."""
+
+    def __init__(self, socket_path=None, pool_size=POOL_SIZE, host=None):
+        self.address = None
+        self.ssh = None
+        self.tls = None
+        if host:
+            kind, address = parse_docker_host(host)
+            if kind == "tcp":
+                self.address = address
+                try:
+                    self.tls = tls_context()
+                except (OSError, ssl.SSLError) as e:
+                    raise DockerAPIError(f"Certificats TLS illisibles (DOCKER_CERT_PATH): {e}")
+                if not self.tls and not is_loopback(address[0]):
+                    raise DockerAPIError(f"{host} : tcp:// sans TLS refusé hors de la boucle locale "
+                                         f"(DOCKER_TLS_VERIFY=1 et DOCKER_CERT_PATH, ou ssh://)")
+            elif kind == "ssh":
+                self.ssh = address
+            else:
+                socket_path = address
+        self.socket_path = socket_path or get_socket_path()
+        self.endpoint = host or f"unix://{self.socket_path}"
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _get_connection(self, timeout):
+        try:
+            connection = self.pool.get_nowait()
+        except queue.Empty:
+            if self.address and self.tls:
+                connection = http.client.HTTPSConnection(*self.address, timeout=timeout, context=self.tls)
+            elif self.address:
+                connection = http.client.HTTPConnection(*self.address, timeout=timeout)
+            elif self.ssh:
+                connection = SSHHTTPConnection(self.ssh, timeout)
+            else:
+                connection = UnixHTTPConnection(self.socket_path, timeout)
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection
+
+    def _release(self, connection, response):
+        """Remet la connexion dans le pool si la réponse a été lue en entier et que le démon la garde ouverte"""
+        if response.will_close or not response.isclosed():
+            connection.close()
+            return
+        try:
+            self.pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _send(self, method, path, params=None, body=None, timeout=DEFAULT_TIMEOUT):
+        """Envoie une requête et retourne (connexion, réponse) sans lire le corps"""
+        url = path + ("?" + urlencode(params) if params else "")
+        headers = {"Host": "docker"}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        for attempt in range(2):
+            connection = self._get_connection(timeout)
+            reused = connection.sock is not None
+            try:
+                connection.request(method, url, body=payload, headers=headers)
+                return connection, connection.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                connection.close()
+                # Connexion du pool fermée par le démon entre-temps : une seule nouvelle tentative
+                if not reused or attempt:
+                    raise DockerAPIError(f"Connexion au démon Docker interrompue ({method} {path})")
+            except socket.timeout:
+                connection.close()
+                raise DockerAPIError(f"Délai dépassé ({timeout}s) pour {method} {path}")
+            except OSError as e:
+                connection.close()
+                raise DockerAPIError(f"Démon Docker inaccessible ({self.endpoint}): {e}")
+
+    def _check(self, connection, response):
+        """Lève DockerAPIError pour un status HTTP d'erreur (le corps contient {'message': ...})"""
+        if response.status < 400:
+            return
+        data = response.read()
+        self._release(connection, response)
+        try:
+            message = json.loads(data).get("message", "")
+        except ValueError:
+            message = data.decode(errors="replace")
+        raise DockerAPIError(message.strip() or f"HTTP {response.status}", response.status)
+
+    def request(self, method, path, params=None, body=None, timeout=DEFAULT_TIMEOUT):
+        """Requête complète : retourne le corps décodé (JSON si possible)"""
+        connection, response = self._send(method, path, params, body, timeout)
+        self._check(connection, response)
+        try:
+            data = response.read()
+        except socket.timeout:
+            connection.close()
+            raise DockerAPIError(f"Délai dépassé ({timeout}s) pour {method} {path}")
+        self._release(connection, response)
+        if not data:
+            return None
+        try:
+            return json.loads(data)
+        except ValueError:
+            return data.decode(errors="replace")
+
+    def stream(self, method, path, params=None, body=None, timeout=DEFAULT_TIMEOUT, tty=False):
+        """Requête dont la réponse est lue en flux : produit des (flux, ligne)"""
+        connection, response = self._send(method, path, params, body, timeout)
+        self._check(connection, response)
+        try:
+            if tty:
+                chunks = ((1, chunk) for chunk in iter(lambda: response.read1(65536), b""))
+            else:
+                chunks = demux_stream(response)
+            for item in iter_lines(chunks):
+                yield item
+        except socket.timeout:
+            raise DockerAPIError(f"Délai dépassé ({timeout}s) pour {method} {path}")
+        finally:
+            # Flux interrompu par l'appelant ou terminé : la connexion n'est pas réutilisable de façon sûre
+            connection.close()
+
+    # Conteneurs
+
+    def containers(self, all=True, filters=None, timeout=DEFAULT_TIMEOUT):
+        params = {"all": "1" if all else "0"}
+        if filters:
+            params["filters"] = json.dumps(filters)
+        return self.request("GET", "/containers/json", params, timeout=timeout)
+
+    def inspect(self, container, timeout=DEFAULT_TIMEOUT):
+        return self.request("GET", f"/containers/{quote(container, safe='')}/json", timeout=timeout)
+
+    def create(self, config, name=None, timeout=DEFAULT_TIMEOUT):
+        """Crée un conteneur (config au format de l'API : Image, Cmd, HostConfig...) et retourne son ID"""
+        params = {"name": name} if name else None
+        return self.request("POST", "/containers/create", params, body=config, timeout=timeout)["Id"]
+
+    def start(self, container, timeout=DEFAULT_TIMEOUT, checkpoint=None):
+        """Démarre un conteneur (sans erreur s'il tourne déjà); checkpoint : point de reprise CRIU à restaurer"""
+        params = {"checkpoint": checkpoint} if checkpoint else None
+        self.request("POST", f"/containers/{quote(container, safe='')}/start", params, timeout=timeout)
+
+    def wait(self, container, timeout=DEFAULT_TIMEOUT):
+        """Attend la fin d'un conteneur et retourne son code de sortie"""
+        return self.request("POST", f"/containers/{quote(container, safe='')}/wait", timeout=timeout)["StatusCode"]
+
+    def pause(self, container, timeout=DEFAULT_TIMEOUT):
+        self.request("POST", f"/containers/{quote(container, safe='')}/pause", timeout=timeout)
+
+    def unpause(self, container, timeout=DEFAULT_TIMEOUT):
+        self.request("POST", f"/containers/{quote(container, safe='')}/unpause", timeout=timeout)
+
+    def checkpoints(self, container, timeout=DEFAULT_TIMEOUT):
+        """Noms des points de reprise CRIU d'un conteneur (démon en mode expérimental)"""
+        return [c.get("Name") for c in self.request("GET", f"/containers/{quote(container, safe='')}/checkpoints",
+                                                      timeout=timeout) or []]
+
+    def remove_checkpoint(self, container, checkpoint, timeout=DEFAULT_TIMEOUT):
+        self.request("DELETE", f"/containers/{quote(container, safe='')}/checkpoints/{quote(checkpoint, safe='')}",
+                     timeout=timeout)
+
+    def stop(self, container, grace=10, timeout=None):
+        """Arrête un conteneur (SIGKILL après grace secondes)"""
+        self.request("POST", f"/containers/{quote(container, safe='')}/stop", {"t": grace},
+                     timeout=timeout or grace + DEFAULT_TIMEOUT)
+
+    def restart(self, container, grace=10, timeout=None):
+        """Redémarre un conteneur (arrêt avec grace secondes de délai puis démarrage)"""
+        self.request("POST", f"/containers/{quote(container, safe='')}/restart", {"t": grace},
+                     timeout=timeout or grace + DEFAULT_TIMEOUT)
+
+    def remove(self, container, force=True, timeout=DEFAULT_TIMEOUT):
+        self.request("DELETE", f"/containers/{quote(container, safe='')}", {"force": "1" if force else "0"},
+                     timeout=timeout)
+
+    def logs(self, container, tail=50, follow=False, timeout=DEFAULT_TIMEOUT):
+        """Produit les lignes de logs (flux, ligne); avec follow, timeout est le délai maximal entre deux lignes"""
+        tty = bool(self.inspect(container, timeout)["Config"].get("Tty"))
+        params = {"stdout": "1", "stderr": "1", "tail": str(tail), "follow": "1" if follow else "0"}
+        return self.stream("GET", f"/containers/{quote(container, safe='')}/logs", params, timeout=timeout, tty=tty)
+
+    # Exec
+
+    def exec_stream(self, container, cmd, timeout=DEFAULT_TIMEOUT):
+        """Lance une commande (liste d'arguments) dans un conteneur; produit (flux, ligne) au fil de
+        l'exécution. Le code de sortie est lu ensuite avec exec_exit_code(exec_id)."""
+        created = self.request("POST", f"/containers/{quote(container, safe='')}/exec", body={
+            "Cmd": cmd, "AttachStdout": True, "AttachStderr": True, "Tty": False
+        }, timeout=timeout)
+        exec_id = created["Id"]
+        lines = self.stream("POST", f"/exec/{exec_id}/start", body={"Detach": False, "Tty": False}, timeout=timeout)
+        return exec_id, lines
+
+    def exec_exit_code(self, exec_id, timeout=DEFAULT_TIMEOUT):
+        return self.request("GET", f"/exec/{exec_id}/json", timeout=timeout).get("ExitCode")
+
+    def exec_run(self, container, cmd, timeout=DEFAULT_TIMEOUT):
+        """Exécute une commande et retourne (code de sortie, stdout, stderr)"""
+        exec_id, lines = self.exec_stream(container, cmd, timeout)
+        output = {1: [], 2: []}
+        for stream, line in lines:
+            output.setdefault(stream, []).append(line)
+        return self.exec_exit_code(exec_id, timeout), "\n".join(output[1]), "\n".join(output[2])
+
+_clients = {}
+_client_lock = threading.Lock()
+
+def get_client(host=None):
+    """Client partagé du processus (son pool de connexions est réutilisé par tous les appels).
+    host (format DOCKER_HOST) : client partagé d'un autre démon, None pour le démon local."""
+    with _client_lock:
+        if host not in _clients:
+            _clients[host] = DockerClient(host=host)
+        return _clients[host]
+
+if __name__ == "__main__":
+    client = get_client()
+    try:
+        containers = client.containers()
+    except DockerAPIError as e:
+        print(f"Erreur: {e}")
+        raise SystemExit(1)
+    for container in containers:
+        print(f"{container['Id'][:12]} {container['Names'][0].lstrip('/')}: {container['State']} ({container['Image']})")
+    start = time.time()
+    for _ in range(20):
+        client.containers()
+    print(f"{len(containers)} conteneur(s), {(time.time() - start) / 20 * 1000:.1f} ms par appel (connexion réutilisée)")
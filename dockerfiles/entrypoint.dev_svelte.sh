@@ -7,6 +7,15 @@ PASSWORD=${PASSWORD:-password}
 SVELTE_PORT=${SVELTE_PORT:-5173}
 RDP_PORT=3390  # Port fixé pour la compatibilité avec le reste du système
 
+# Caches de paquets partagés montés par le lanceur (su - réinitialise l'environnement,
+# il faut donc les réexporter explicitement pour l'utilisateur)
+CACHE_EXPORTS=""
+for cache_var in BUN_INSTALL_CACHE_DIR npm_config_cache PIP_CACHE_DIR; do
+    if [ -n "${!cache_var}" ]; then
+        CACHE_EXPORTS="${CACHE_EXPORTS}export ${cache_var}=${!cache_var}; "
+    fi
+done
+
 # Nettoyage des fichiers PID s'ils existent
 PID_FILE="/var/run/xrdp/xrdp-sesman.pid"
 if [ -f "$PID_FILE" ]; then
@@ -52,6 +61,11 @@ if ! grep -Fxq "export PATH=/home/${USERNAME}/.bun/bin:/opt/venv/bin:\$PATH" /ho
     echo "export PATH=/home/${USERNAME}/.bun/bin:/opt/venv/bin:\$PATH" >> /home/${USERNAME}/.bashrc
 fi
 
+# Ajout des caches partagés à l'environnement de l'utilisateur
+if [ -n "$CACHE_EXPORTS" ] && ! grep -qxF "$CACHE_EXPORTS" /home/${USERNAME}/.bashrc; then
+    echo "$CACHE_EXPORTS" >> /home/${USERNAME}/.bashrc
+fi
+
 # Configuration de docker_shared
 mkdir -p /home/${USERNAME}/docker_shared
 if [ -d "/home/${USERNAME}/docker_shared" ]; then
@@ -62,7 +76,7 @@ fi
 if [ -d "/home/${USERNAME}/docker_shared" ] && [ -z "$(ls -A /home/${USERNAME}/docker_shared)" ]; then
     echo "Initialisation d'un projet Svelte de démonstration..."
     su - ${USERNAME} -c "cd /home/${USERNAME}/docker_shared && git clone https://github.com/sveltejs/realworld.git"
-    su - ${USERNAME} -c "cd /home/${USERNAME}/docker_shared/realworld && export PATH=/home/${USERNAME}/.bun/bin:\$PATH && bun install"
+    su - ${USERNAME} -c "cd /home/${USERNAME}/docker_shared/realworld && ${CACHE_EXPORTS}export PATH=/home/${USERNAME}/.bun/bin:\$PATH && bun install"
 fi
 
 # Démarrage du serveur Svelte dans un screen
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Attribution des processus GPU aux conteneurs en un seul passage.
+Un seul relevé des processus de calcul par cycle (gpu_telemetry : NVML ou nvidia-smi),
+puis chaque PID est rattaché à son conteneur en lisant /proc/<pid>/cgroup :
+plus de `docker top` ni de nvidia-smi par conteneur.
+Exécuter avec: python3 gpu_accounting.py   (affiche l'utilisation GPU par conteneur)
+"""
+import re
+import time
+import threading
+import gpu_telemetry
+
+CACHE_TTL = 2  # secondes : tous les appels d'un même rafraîchissement partagent le même relevé
+
+# ID complet de conteneur dans un chemin cgroup (pilotes systemd et cgroupfs, v1 et v2)
+CONTAINER_ID_RE = re.compile(r'docker[-/]([0-9a-f]{64})')
+
+_snapshot = None
+_snapshot_time = 0
+_snapshot_lock = threading.Lock()
+# Conteneur par PID (None si le processus appartient à l'hôte), purgé à chaque relevé
+_pid_containers = {}
+
+def get_container_id(pid):
+    """Retourne l'ID complet du conteneur auquel appartient un PID de l'hôte (None sinon)"""
+    if pid in _pid_containers:
+        return _pid_containers[pid]
+    container_id = None
+    try:
+        with open(f"/proc/{pid}/cgroup", 'r') as f:
+            match = CONTAINER_ID_RE.search(f.read())
+            if match:
+                container_id = match.group(1)
+    except OSError:
+        pass  # Processus terminé entre-temps
+    _pid_containers[pid] = container_id
+    return container_id
+
+def collect(with_utilization=True):
+    """Effectue un relevé complet et l'agrège par conteneur et par GPU.
+    Retourne {'time', 'processes': [...], 'containers': {id: {...}}, 'devices': {index: {...}}}"""
+    processes = [{
+        'pid': process.pid,
+        'gpu': process.gpu_index,
+        'name': process.name,
+        'memory': process.used_memory,
+        'sm': process.sm_util or 0
+    } for process in gpu_telemetry.get_processes(max_age=0, with_utilization=with_utilization)]
+
+    # Les PIDs disparus peuvent être réutilisés par un autre conteneur
+    current_pids = set(p['pid'] for p in processes)
+    for pid in list(_pid_containers):
+        if pid not in current_pids:
+            del _pid_containers[pid]
+
+    containers = {}
+    devices = {}
+    for process in processes:
+        process['container_id'] = get_container_id(process['pid'])
+
+        device = devices.setdefault(process['gpu'], {'memory': 0, 'sm': 0, 'processes': 0, 'containers': set()})
+        device['memory'] += process['memory']
+        device['sm'] += process['sm']
+        device['processes'] += 1
+        if process['container_id']:
+            device['containers'].add(process['container_id'])
+
+            container = containers.setdefault(process['container_id'],
+                                              {'memory': 0, 'sm': 0, 'processes': 0, 'devices': {}})
+            container['memory'] += process['memory']
+            container['sm'] += process['sm']
+            container['processes'] += 1
+            per_device = container['devices'].setdefault(process['gpu'], {'memory': 0, 'sm': 0})
+            per_device['memory'] += process['memory']
+            per_device['sm'] += process['sm']
+
+    return {'time': time.time(), 'processes': processes, 'containers': containers, 'devices': devices,
+            'utilization': with_utilization}
+
+def get_snapshot(max_age=CACHE_TTL, with_utilization=True):
+    """Retourne le dernier relevé s'il a moins de max_age secondes (et contient l'utilisation
+    si elle est demandée), sinon en effectue un nouveau"""
+    global _snapshot, _snapshot_time
+    with _snapshot_lock:
+        if (_snapshot is None or time.time() - _snapshot_time > max_age
+                or (with_utilization and not _snapshot['utilization'])):
+            _snapshot = collect(with_utilization)
+            _snapshot_time = time.time()
+        return _snapshot
+
+def get_container_usage(container_id, snapshot=None):
+    """Utilisation GPU d'un conteneur (ID complet) dans un relevé"""
+    snapshot = snapshot or get_snapshot()
+    return snapshot['containers'].get(container_id, {'memory': 0, 'sm': 0, 'processes': 0, 'devices': {}})
+
+if __name__ == "__main__":
+    import session_probe
+    start = time.time()
+    snapshot = get_snapshot()
+    elapsed = time.time() - start
+    names = {info['id']: name for name, info in session_probe.get_inventory().items()}
+    for container_id, usage in sorted(snapshot['containers'].items(), key=lambda item: -item[1]['memory']):
+        devices = ', '.join(f"GPU {index}" for index in sorted(usage['devices'], key=str))
+        print(f"{names.get(container_id, container_id[:12])}: {usage['memory']} MiB, SM {usage['sm']}%, "
+              f"{usage['processes']} processus ({devices})")
+    host = [p for p in snapshot['processes'] if not p['container_id']]
+    if host:
+        print(f"Hors conteneur: {sum(p['memory'] for p in host)} MiB ({len(host)} processus)")
+    print(f"{len(snapshot['processes'])} processus GPU attribués en {elapsed * 1000:.1f} ms")
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Télémétrie GPU unifiée : métriques par GPU et par processus via une seule API typée, avec cache.
+Trois sources possibles, choisies au premier appel :
+- NVML (bibliothèque pynvml / nvidia-ml-py) : un appel de fonction, sans lancer de processus
+- nvidia-smi : repli si pynvml n'est pas installé
+- fichier JSON (variable GPU_TELEMETRY_FAKE=chemin) : GPU simulés pour les essais sans matériel
+Exécuter avec: python3 gpu_telemetry.py   (affiche la source utilisée et les relevés)
+"""
+import os
+import json
+import time
+import logging
+import threading
+import subprocess
+from dataclasses import dataclass
+from typing import List, Optional
+
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+
+CACHE_TTL = 2  # secondes
+NVIDIA_SMI_TIMEOUT = 2
+PMON_TIMEOUT = 3
+FAKE_ENV = "GPU_TELEMETRY_FAKE"
+
+log = logging.getLogger(__name__)
+
+@dataclass
+class GpuDevice:
+    """État d'un GPU (mémoire en MiB, utilisations en %)"""
+    index: int
+    name: str
+    uuid: str = ""
+    driver: str = ""
+    temperature: int = 0
+    gpu_util: int = 0
+    mem_util: int = 0
+    mem_used: int = 0
+    mem_total: int = 0
+    host: str = ""  # Nom de l'hôte (tableau de bord multi-hôtes), vide pour la machine locale
+
+@dataclass
+class GpuProcess:
+    """Processus de calcul sur un GPU (mémoire en MiB, sm_util None si non mesuré)"""
+    pid: int
+    gpu_index: Optional[int]
+    name: str = ""
+    used_memory: int = 0
+    sm_util: Optional[int] = None
+
+def get_process_name(pid):
+    """Nom d'un processus de l'hôte (NVML ne le fournit pas)"""
+    try:
+        with open(f"/proc/{pid}/comm", 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+def to_int(value):
+    """Convertit une valeur nvidia-smi ('[N/A]', '45') en entier"""
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+class NvmlBackend:
+    """Relevés via la bibliothèque NVML (pynvml)"""
+    name = "nvml"
+
+    def __init__(self):
+        pynvml.nvmlInit()
+        self.driver = self._text(pynvml.nvmlSystemGetDriverVersion())
+        self.handles = [pynvml.nvmlDeviceGetHandleByIndex(i) for i in range(pynvml.nvmlDeviceGetCount())]
+        # Horodatage du dernier échantillon d'utilisation lu, par GPU
+        self.last_seen = [0] * len(self.handles)
+
+    @staticmethod
+    def _text(value):
+        # Les anciennes versions de pynvml renvoient des bytes
+        return value.decode() if isinstance(value, bytes) else value
+
+    def devices(self):
+        devices = []
+        for index, handle in enumerate(self.handles):
+            utilization = pynvml.nvmlDeviceGetUtilizationRates(handle)
+            memory = pynvml.nvmlDeviceGetMemoryInfo(handle)
+            devices.append(GpuDevice(
+                index=index,
+                name=self._text(pynvml.nvmlDeviceGetName(handle)),
+                uuid=self._text(pynvml.nvmlDeviceGetUUID(handle)),
+                driver=self.driver,
+                temperature=pynvml.nvmlDeviceGetTemperature(handle, pynvml.NVML_TEMPERATURE_GPU),
+                gpu_util=utilization.gpu,
+                mem_util=utilization.memory,
+                mem_used=memory.used // (1024 * 1024),
+                mem_total=memory.total // (1024 * 1024)
+            ))
+        return devices
+
+    def processes(self, with_utilization=False):
+        processes = []
+        for index, handle in enumerate(self.handles):
+            sm = {}
+            if with_utilization:
+                try:
+                    for sample in pynvml.nvmlDeviceGetProcessUtilization(handle, self.last_seen[index]):
+                        sm[sample.pid] = sample.smUtil
+                        self.last_seen[index] = max(self.last_seen[index], sample.timeStamp)
+                except pynvml.NVMLError:
+                    pass  # Aucun échantillon depuis le dernier relevé
+            for process in pynvml.nvmlDeviceGetComputeRunningProcesses(handle):
+                processes.append(GpuProcess(
+                    pid=process.pid,
+                    gpu_index=index,
+                    name=get_process_name(process.pid),
+                    used_memory=(process.usedGpuMemory or 0) // (1024 * 1024),
+                    sm_util=sm.get(process.pid, 0) if with_utilization else None
+                ))
+        return processes
+
+# Arguments nvidia-smi du relevé des cartes (aussi lancé dans le conteneur d'administration GPU d'un hôte distant)
+DEVICE_QUERY = ["--query-gpu=index,name,uuid,driver_version,temperature.gpu,utilization.gpu,"
+                "utilization.memory,memory.used,memory.total", "--format=csv,noheader,nounits"]
+
+def parse_devices(output, host=""):
+    """Convertit la sortie de nvidia-smi DEVICE_QUERY en GpuDevice"""
+    devices = []
+    for line in output.splitlines():
+        parts = [p.strip() for p in line.split(',')]
+        if len(parts) >= 9 and parts[0].isdigit():
+            devices.append(GpuDevice(
+                index=int(parts[0]), name=parts[1], uuid=parts[2], driver=parts[3],
+                temperature=to_int(parts[4]), gpu_util=to_int(parts[5]), mem_util=to_int(parts[6]),
+                mem_used=to_int(parts[7]), mem_total=to_int(parts[8]), host=host
+            ))
+    return devices
+
+class NvidiaSmiBackend:
+    """Relevés via l'outil nvidia-smi (un processus lancé par requête)"""
+    name = "nvidia-smi"
+
+    def __init__(self):
+        # Index des GPU par UUID (stable tant que le pilote n'est pas rechargé)
+        self.indexes = {}
+        for line in self._run(["--query-gpu=index,uuid", "--format=csv,noheader"]).splitlines():
+            parts = [p.strip() for p in line.split(',')]
+            if len(parts) == 2 and parts[0].isdigit():
+                self.indexes[parts[1]] = int(parts[0])
+        if not self.indexes:
+            raise OSError("nvidia-smi indisponible ou aucun GPU")
+
+    @staticmethod
+    def _run(args, timeout=NVIDIA_SMI_TIMEOUT):
+        try:
+            return subprocess.run(["nvidia-smi"] + args, capture_output=True, text=True, timeout=timeout).stdout
+        except (OSError, subprocess.TimeoutExpired):
+            return ""
+
+    def devices(self):
+        return parse_devices(self._run(DEVICE_QUERY))
+
+    def _utilization(self):
+        """Utilisation SM (%) par (GPU, PID) sur un échantillon de nvidia-smi pmon"""
+        utilization = {}
+        for line in self._run(["pmon", "-c", "1", "-s", "u"], timeout=PMON_TIMEOUT).splitlines():
+            # Format: gpu pid type sm mem enc dec command ('-' si non mesuré)
+            parts = line.split()
+            if line.startswith('#') or len(parts) < 4 or not parts[0].isdigit() or not parts[1].isdigit():
+                continue
+            if parts[3].isdigit():
+                utilization[(int(parts[0]), int(parts[1]))] = int(parts[3])
+        return utilization
+
+    def processes(self, with_utilization=False):
+        utilization = {}
+        if with_utilization:
+            # pmon échantillonne pendant ~1 s : lancé en parallèle de la requête des processus
+            result = {}
+            thread = threading.Thread(target=lambda: result.update(util=self._utilization()), daemon=True)
+            thread.start()
+        output = self._run(["--query-compute-apps=gpu_uuid,pid,process_name,used_memory",
+                            "--format=csv,noheader,nounits"])
+        if with_utilization:
+            thread.join(timeout=PMON_TIMEOUT + 1)
+            utilization = result.get('util', {})
+
+        processes = []
+        for line in output.splitlines():
+            parts = [p.strip() for p in line.split(',')]
+            if len(parts) < 4 or not parts[1].isdigit():
+                continue
+            gpu_index = self.indexes.get(parts[0])
+            processes.append(GpuProcess(
+                pid=int(parts[1]), gpu_index=gpu_index, name=parts[2], used_memory=to_int(parts[3]),
+                sm_util=utilization.get((gpu_index, int(parts[1])), 0) if with_utilization else None
+            ))
+        return processes
+
+class FakeBackend:
+    """GPU simulés décrits dans un fichier JSON, relu à chaque modification :
+    {"devices": [{"index": 0, "name": "...", "mem_total": 16376, ...}],
+     "processes": [{"pid": 1234, "gpu_index": 0, "used_memory": 512, "sm_util": 30}]}"""
+    name = "fake"
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.data = {}
+
+    def _load(self):
+        mtime = os.path.getmtime(self.path)
+        if mtime != self.mtime:
+            with open(self.path, 'r') as f:
+                self.data = json.load(f)
+            self.mtime = mtime
+        return self.data
+
+    def devices(self):
+        return [GpuDevice(**device) for device in self._load().get('devices', [])]
+
+    def processes(self, with_utilization=False):
+        processes = [GpuProcess(**process) for process in self._load().get('processes', [])]
+        if not with_utilization:
+            for process in processes:
+                process.sm_util = None
+        return processes
+
+_backend = None
+_backend_checked = False
+_cache = {}
+_lock = threading.Lock()
+
+def get_backend():
+    """Retourne la source de télémétrie (None si aucun GPU NVIDIA n'est accessible)"""
+    global _backend, _backend_checked
+    if _backend_checked:
+        return _backend
+    fake_path = os.environ.get(FAKE_ENV)
+    if fake_path:
+        _backend = FakeBackend(fake_path)
+    else:
+        candidates = [NvmlBackend] if pynvml is not None else []
+        candidates.append(NvidiaSmiBackend)
+        for backend_class in candidates:
+            try:
+                _backend = backend_class()
+                break
+            except Exception:
+                continue  # Bibliothèque NVML absente ou pilote non chargé : source suivante
+    _backend_checked = True
+    return _backend
+
+def reset_backend():
+    """Oublie la source choisie et le cache (changement de GPU_TELEMETRY_FAKE, rechargement du pilote)"""
+    global _backend, _backend_checked
+    with _lock:
+        _backend = None
+        _backend_checked = False
+        _cache.clear()
+
+def _cached(key, max_age, fetch):
+    """Retourne la valeur en cache si elle a moins de max_age secondes, sinon la recalcule"""
+    with _lock:
+        entry = _cache.get(key)
+        if entry and time.time() - entry[0] <= max_age:
+            return entry[1]
+        backend = get_backend()
+        value = []
+        if backend is not None:
+            try:
+                value = fetch(backend)
+            except Exception as e:
+                log.warning(f"Erreur de télémétrie GPU ({backend.name}): {e}")
+        _cache[key] = (time.time(), value)
+        return value
+
+def get_devices(max_age=CACHE_TTL) -> List[GpuDevice]:
+    """État de chaque GPU"""
+    return _cached('devices', max_age, lambda backend: backend.devices())
+
+def get_processes(max_age=CACHE_TTL, with_utilization=False) -> List[GpuProcess]:
+    """Processus de calcul de chaque GPU (avec l'utilisation SM si demandée)"""
+    key = 'processes_util' if with_utilization else 'processes'
+    return _cached(key, max_age, lambda backend: backend.processes(with_utilization))
+
+if __name__ == "__main__":
+    start = time.time()
+    devices = get_devices()
+    processes = get_processes(with_utilization=True)
+    elapsed = time.time() - start
+    backend = get_backend()
+    print(f"Source: {backend.name if backend else 'aucune'}")
+    for device in devices:
+        print(f"GPU {device.index}: {device.name} | {device.temperature}°C | {device.gpu_util}% | "
+              f"{device.mem_used}/{device.mem_total} MiB")
+    for process in processes:
+        print(f"  PID {process.pid} ({process.name}) sur GPU {process.gpu_index}: "
+              f"{process.used_memory} MiB, SM {process.sm_util}%")
+    print(f"Relevé en {elapsed * 1000:.1f} ms")
@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+"""
+Démon de mise en veille des conteneurs inactifs (remplace la boucle de cleanup_inactive.sh)
+La mise en veille se fait par paliers, configurables par image dans idle_policy.txt :
+gel (docker pause), puis arrêt (docker stop, ou point de reprise CRIU en mode checkpoint),
+puis archivage (dossier utilisateur compressé).
+Chaque passage couvre le démon local et les nœuds distants de nodes.txt (scheduler.py).
+Exécuter avec: python3 idle_reaper.py            (démon, vérification toutes les --interval secondes)
+          ou: python3 idle_reaper.py --once     (un seul passage, utilisé par le cron)
+"""
+import os
+import sys
+import json
+import time
+import fcntl
+import signal
+import argparse
+import shutil
+import tarfile
+import threading
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait
+import session_probe
+import cgroup_metrics
+import launch_log
+import docker_api
+import scheduler
+import pkg_cache
+
+# Constantes
+CONTAINER_PREFIX = "gui_user_"
+LOG_FILE = "cleanup.log"
+SUSPENDED_FILE = "suspended_containers.txt"
+ACTIVITY_FILE = "last_activity.json"  # Timestamps de dernière activité, stockés sur l'hôte
+PID_FILE = "idle_reaper.pid"
+LOCK_FILE = "idle_reaper.lock"  # Verrou d'instance (démon et --once), jamais supprimé
+POLICY_FILE = "idle_policy.txt"
+DATA_DIR = "./user_data"
+ARCHIVE_DIR = "./archives"
+CHECKPOINT_NAME = "idle"  # Nom du point de reprise CRIU restauré par script.sh
+SUSPEND_MODES = ('stop', 'checkpoint')
+
+DEFAULT_INTERVAL = 300      # Vérification toutes les 5 minutes
+DEFAULT_TIMEOUT = 3600      # Arrêt après 1 heure d'inactivité
+DEFAULT_DEADLINE = 30       # Durée maximale d'un passage de vérification
+DEFAULT_WORKERS = 16        # Nombre de vérifications / arrêts simultanés
+DEFAULT_BUSY_CPU = 0        # % CPU au-dessus duquel un conteneur sans session reste actif (0 = désactivé)
+
+# Affichage sur la sortie standard (désactivé avec --quiet)
+_verbose = True
+# Les passages des différents nœuds ajoutent au même fichier des conteneurs suspendus
+_suspended_lock = threading.Lock()
+
+def log(message):
+    """Écrit un message horodaté dans le fichier de log (et sur la sortie standard)"""
+    line = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {message}"
+    if _verbose:
+        print(line)
+    try:
+        with open(LOG_FILE, 'a') as f:
+            f.write(line + "\n")
+    except Exception as e:
+        print(f"Erreur lors de l'écriture dans {LOG_FILE}: {e}")
+
+def parse_docker_time(value):
+    """Convertit une date Docker (RFC 3339 avec nanosecondes) en timestamp"""
+    try:
+        value = value.replace('Z', '+00:00')
+        # Python ne gère que les microsecondes
+        if '.' in value:
+            head, tail = value.split('.', 1)
+            digits = ''.join(c for c in tail if c.isdigit())
+            value = f"{head}.{digits[:6]}{tail[len(digits):]}"
+        return datetime.fromisoformat(value).timestamp()
+    except Exception:
+        return 0
+
+def parse_duration(value):
+    """Convertit une durée ('90', '15m', '2h', '7d') en secondes. Vide ou 0 = palier désactivé."""
+    value = value.strip().lower()
+    if not value:
+        return None
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    multiplier = 1
+    if value[-1] in units:
+        multiplier = units[value[-1]]
+        value = value[:-1]
+    seconds = int(float(value) * multiplier)
+    return seconds if seconds > 0 else None
+
+def load_idle_policies(default_stop):
+    """Charge la politique de mise en veille par image depuis idle_policy.txt
+    Format: image_id:gel_après:arrêt_après:archivage_après[:stop|checkpoint]
+    (ligne 'default' pour les autres images)"""
+    policies = {'default': {'freeze': None, 'stop': default_stop, 'archive': None, 'mode': 'stop'}}
+    try:
+        if os.path.exists(POLICY_FILE):
+            with open(POLICY_FILE, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith('#'):
+                        continue
+                    # rsplit: l'identifiant d'image peut contenir ':' (tag)
+                    mode = 'stop'
+                    parts = line.rsplit(':', 4)
+                    if len(parts) == 5 and parts[4] in SUSPEND_MODES:
+                        mode = parts.pop()
+                    else:
+                        parts = line.rsplit(':', 3)
+                    if len(parts) != 4:
+                        log(f"Ligne ignorée dans {POLICY_FILE}: {line}")
+                        continue
+                    policies[parts[0]] = {
+                        'freeze': parse_duration(parts[1]),
+                        'stop': parse_duration(parts[2]),
+                        'archive': parse_duration(parts[3]),
+                        'mode': mode
+                    }
+    except Exception as e:
+        log(f"Erreur lors de la lecture de {POLICY_FILE}: {e}")
+    return policies
+
+def docker_env(host):
+    """Environnement des commandes docker visant le démon host (adresse DOCKER_HOST, None = démon local)"""
+    return dict(os.environ, DOCKER_HOST=host) if host else None
+
+def get_reaper_hosts():
+    """Démons surveillés, {adresse DOCKER_HOST: nom} : le démon local (None) puis chaque nœud
+    distant de nodes.txt (scheduler.py). Les dossiers utilisateurs sont partagés avec les nœuds
+    (vérifié au placement), ils sont donc lus et archivés depuis cette machine."""
+    hosts = {None: "local"}
+    for node in scheduler.load_nodes():
+        if not scheduler.is_local_node(node):
+            hosts.setdefault(node['host'], node['name'])
+    return hosts
+
+def list_user_containers(timeout=10, host=None):
+    """Liste tous les conteneurs utilisateurs (actifs, gelés et arrêtés) avec leur état
+    (un seul `docker ps` et un seul `docker inspect` pour tous les conteneurs)"""
+    names = subprocess.run(
+        ["docker", "ps", "-a", "--filter", f"name={CONTAINER_PREFIX}", "--format", "{{.Names}}"],
+        capture_output=True, text=True, timeout=timeout, env=docker_env(host)
+    ).stdout.split()
+    names = [n for n in names if n.startswith(CONTAINER_PREFIX)]
+    if not names:
+        return []
+
+    inspect = subprocess.run(
+        ["docker", "inspect", "--format",
+         "{{.Name}}|{{.Id}}|{{.State.Pid}}|{{.State.Status}}|{{.Config.Image}}|{{.State.StartedAt}}|{{.State.FinishedAt}}"] + names,
+        capture_output=True, text=True, timeout=timeout, env=docker_env(host)
+    ).stdout
+
+    containers = []
+    for line in inspect.splitlines():
+        parts = line.strip().lstrip('/').split('|')
+        if len(parts) == 7:
+            containers.append({
+                'name': parts[0],
+                'id': parts[1],
+                'pid': int(parts[2]) if parts[2].isdigit() else 0,
+                'username': parts[0][len(CONTAINER_PREFIX):],
+                'status': parts[3],
+                'image': parts[4],
+                'started_at': parse_docker_time(parts[5]),
+                'finished_at': parse_docker_time(parts[6])
+            })
+    return containers
+
+def get_login_time(username):
+    """Date de la dernière connexion signalée par script.sh ou l'entrypoint
+    (fichier .last_activity dans le dossier de l'utilisateur, lu depuis l'hôte)"""
+    try:
+        return os.path.getmtime(os.path.join(DATA_DIR, username, ".last_activity"))
+    except OSError:
+        return 0
+
+def count_rdp_connections(container_name, timeout, host=None):
+    """Compte les connexions RDP établies d'un conteneur via docker exec
+    (solution de repli quand /proc n'est pas lisible depuis l'hôte, et pour les nœuds distants)"""
+    result = subprocess.run(
+        ["docker", "exec", container_name, "cat", "/proc/net/tcp", "/proc/net/tcp6"],
+        capture_output=True, text=True, timeout=timeout, env=docker_env(host)
+    )
+    return session_probe.count_established(result.stdout, session_probe.DEFAULT_RDP_PORTS)
+
+def load_activity():
+    """Charge les timestamps de dernière activité depuis l'hôte"""
+    try:
+        if os.path.exists(ACTIVITY_FILE):
+            with open(ACTIVITY_FILE, 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        log(f"Erreur lors de la lecture de {ACTIVITY_FILE}: {e}")
+    return {}
+
+def save_activity(activity):
+    """Sauvegarde les timestamps de dernière activité (écriture atomique)"""
+    tmp_file = f"{ACTIVITY_FILE}.tmp"
+    try:
+        with open(tmp_file, 'w') as f:
+            json.dump(activity, f, indent=1, sort_keys=True)
+        os.replace(tmp_file, ACTIVITY_FILE)
+    except Exception as e:
+        log(f"Erreur lors de l'écriture de {ACTIVITY_FILE}: {e}")
+
+def mark_suspended(container_names):
+    """Enregistre les conteneurs arrêtés dans le fichier des conteneurs suspendus"""
+    with _suspended_lock:
+        suspended = set()
+        if os.path.exists(SUSPENDED_FILE):
+            with open(SUSPENDED_FILE, 'r') as f:
+                suspended = set(line.strip() for line in f if line.strip())
+        with open(SUSPENDED_FILE, 'a') as f:
+            for name in container_names:
+                if name not in suspended:
+                    f.write(f"{name}\n")
+
+def check_containers(containers, deadline, workers, host=None):
+    """Vérifie l'activité de tous les conteneurs. Les sessions sont lues depuis l'hôte
+    (session_probe, démon local seulement); les conteneurs illisibles et ceux des nœuds distants
+    sont vérifiés par docker exec en parallèle avec une échéance globale.
+    Retourne {nom: nombre de connexions}; les conteneurs non vérifiés à temps sont absents."""
+    results = {}
+    if not containers:
+        return results
+
+    sessions = {}
+    if host is None:
+        try:
+            sessions = session_probe.get_session_counts([c['name'] for c in containers])
+        except Exception as e:
+            log(f"Erreur lors de la lecture des sessions depuis l'hôte: {e}")
+    for name, count in sessions.items():
+        results[name] = count['rdp'] + count['extra']
+
+    remaining = [c for c in containers if c['name'] not in results]
+    if not remaining:
+        return results
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = {executor.submit(count_rdp_connections, c['name'], deadline, host): c['name'] for c in remaining}
+    done, not_done = wait(futures, timeout=deadline)
+    for future in not_done:
+        future.cancel()
+    executor.shutdown(wait=False)
+
+    for future in done:
+        name = futures[future]
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            log(f"Erreur lors de la vérification de {name}: {e}")
+    for future in not_done:
+        log(f"Conteneur {futures[future]} non vérifié avant l'échéance de {deadline}s, ignoré")
+
+    return results
+
+def run_parallel(action, container_names, workers):
+    """Applique une action (fonction nom -> bool) à plusieurs conteneurs en parallèle.
+    Retourne la liste des conteneurs pour lesquels l'action a réussi."""
+    def safe_action(name):
+        try:
+            return action(name)
+        except Exception as e:
+            log(f"Erreur sur le conteneur {name}: {e}")
+            return False
+
+    succeeded = []
+    if not container_names:
+        return succeeded
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for name, ok in zip(container_names, executor.map(safe_action, container_names)):
+            if ok:
+                succeeded.append(name)
+    return succeeded
+
+def docker_command(*args, timeout=30, host=None):
+    """Exécute une commande docker (sur le démon host, local par défaut) et indique si elle a réussi"""
+    result = subprocess.run(["docker"] + list(args), capture_output=True, text=True, timeout=timeout,
+                            env=docker_env(host))
+    if result.returncode != 0:
+        log(f"Échec de 'docker {' '.join(args)}'{f' sur {host}' if host else ''}: {result.stderr.strip()}")
+    return result.returncode == 0
+
+def freeze_container(name, host=None):
+    """Gèle un conteneur (cgroup freezer): plus aucun cycle CPU ni réveil de timer"""
+    return docker_command("pause", name, host=host)
+
+def thaw_container(name, host=None):
+    """Dégèle un conteneur gelé"""
+    return docker_command("unpause", name, host=host)
+
+def stop_container(name, paused=False, host=None):
+    """Arrête un conteneur (dégelé d'abord s'il est gelé, pour un arrêt propre)"""
+    if paused and not thaw_container(name, host):
+        return False
+    return docker_command("stop", name, host=host)
+
+def checkpoint_container(name, paused=False, host=None):
+    """Suspend un conteneur avec CRIU : l'arbre de processus et la mémoire sont écrits sur disque
+    et le conteneur est arrêté (RAM libérée). script.sh le restaure avec les applications ouvertes.
+    Nécessite criu et le mode expérimental du démon Docker; en cas d'échec, arrêt classique."""
+    if paused and not thaw_container(name, host):
+        return False
+    # Un ancien point de reprise du même nom empêcherait la création
+    subprocess.run(["docker", "checkpoint", "rm", name, CHECKPOINT_NAME], capture_output=True, timeout=30,
+                   env=docker_env(host))
+    if docker_command("checkpoint", "create", name, CHECKPOINT_NAME, timeout=300, host=host):
+        log(f"Point de reprise CRIU créé pour {name}")
+        return True
+    log(f"Point de reprise impossible pour {name}, arrêt classique")
+    return docker_command("stop", name, host=host)
+
+def archive_container(name, host=None):
+    """Archive un conteneur arrêté : le dossier de l'utilisateur est compressé dans ARCHIVE_DIR,
+    puis le conteneur et les dossiers sont supprimés. script.sh restaure l'archive à la connexion.
+    Sous le verrou ARCHIVE_DIR/<utilisateur>.lock, que script.sh tient pendant toute la connexion :
+    une connexion en cours n'est pas archivée, une connexion qui arrive attend la fin de l'archivage."""
+    username = name[len(CONTAINER_PREFIX):]
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    with open(os.path.join(ARCHIVE_DIR, f"{username}.lock"), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            log(f"Connexion en cours pour {username}, archivage reporté")
+            return False
+        # Redémarré depuis la liste des conteneurs : plus inactif
+        status = subprocess.run(["docker", "inspect", "-f", "{{.State.Status}}", name],
+                                capture_output=True, text=True, timeout=30, env=docker_env(host)).stdout.strip()
+        if status not in ("exited", "created"):
+            return False
+
+        user_dirs = [d for d in (username, f"{username}_config") if os.path.isdir(os.path.join(DATA_DIR, d))]
+        archive_path = os.path.join(ARCHIVE_DIR, f"{username}.tar.gz")
+        tmp_path = f"{archive_path}.tmp"
+        with tarfile.open(tmp_path, "w:gz") as tar:
+            for d in user_dirs:
+                tar.add(os.path.join(DATA_DIR, d), arcname=d)
+        os.replace(tmp_path, archive_path)
+
+        if not docker_command("rm", name, host=host):
+            return False
+        for d in user_dirs:
+            shutil.rmtree(os.path.join(DATA_DIR, d), ignore_errors=True)
+        # Volumes et couches de cache de paquets : recréés vides à la prochaine connexion
+        try:
+            pkg_cache.remove_user(username, [host])
+        except (docker_api.DockerAPIError, OSError) as e:
+            log(f"Caches de paquets de {username} non supprimés: {e}")
+        return True
+
+def sample_resources(containers):
+    """Lit CPU et mémoire des conteneurs dans leur cgroup, indexés par nom (vide sans cgroup v2)"""
+    if not containers or not cgroup_metrics.is_available():
+        return {}
+    names = {c['id']: c['name'] for c in containers}
+    try:
+        samples = cgroup_metrics.sample(list(names), {c['id']: c['pid'] for c in containers})
+    except Exception as e:
+        log(f"Erreur lors de la lecture des cgroups: {e}")
+        return {}
+    return {names[cid]: metrics for cid, metrics in samples.items()}
+
+def reap_host(host, node_name, policies, deadline, workers, busy_cpu, activity):
+    """Passage sur un démon (host : adresse DOCKER_HOST, None = démon local) : vérification de l'activité
+    puis application des paliers. activity ({nom: timestamp}) est mis à jour en place.
+    Retourne les noms des conteneurs du démon, None s'ils n'ont pas pu être listés."""
+    start = time.time()
+    where = f" sur le nœud {node_name}" if host else ""
+    try:
+        containers = list_user_containers(host=host)
+    except Exception as e:
+        log(f"Erreur lors de la récupération des conteneurs{where}: {e}")
+        return None
+
+    # Les connexions vers un conteneur gelé sont acceptées par le noyau et visibles dans /proc
+    live = [c for c in containers if c['status'] in ('running', 'paused')]
+    connections = check_containers(live, deadline, workers, host)
+    # Cgroups lisibles pour le démon local seulement : pas de seuil CPU sur les nœuds distants
+    resources = sample_resources([c for c in live if c['status'] == 'running']) if host is None else {}
+    now = time.time()
+    to_thaw, to_freeze, to_stop, to_archive = [], [], [], []
+    checkpoint_names = set()
+    idle_seconds = {}
+
+    for container in containers:
+        name = container['name']
+        policy = policies.get(container['image'], policies['default'])
+
+        if container['status'] in ('running', 'paused'):
+            if name not in connections:
+                continue  # Pas de décision sans mesure
+            cpu_percent = resources.get(name, {}).get('cpu_percent')
+            if connections[name] > 0 or (busy_cpu and cpu_percent is not None and cpu_percent > busy_cpu):
+                activity[name] = now
+                if container['status'] == 'paused':
+                    to_thaw.append(name)
+                continue
+            # Un conteneur (re)démarré ou dégelé par une connexion après la dernière activité
+            # enregistrée repart de zéro
+            last_activity = max(activity.get(name, now), container['started_at'],
+                                get_login_time(container['username']))
+        else:
+            last_activity = activity.get(name) or container['finished_at'] or now
+
+        activity[name] = last_activity
+        inactive_time = now - last_activity
+        idle_seconds[name] = int(inactive_time)
+        minutes = int(inactive_time / 60)
+
+        if container['status'] == 'exited':
+            if policy['archive'] and inactive_time > policy['archive']:
+                log(f"Conteneur {name} arrêté depuis {minutes} minutes, archivage...")
+                to_archive.append(name)
+        elif policy['stop'] and inactive_time > policy['stop']:
+            log(f"Conteneur {name} inactif depuis {minutes} minutes, arrêt...")
+            to_stop.append(name)
+            if policy['mode'] == 'checkpoint':
+                checkpoint_names.add(name)
+        elif policy['freeze'] and inactive_time > policy['freeze'] and container['status'] == 'running':
+            log(f"Conteneur {name} inactif depuis {minutes} minutes, gel...")
+            to_freeze.append(name)
+
+    paused = set(c['name'] for c in containers if c['status'] == 'paused')
+    thawed = run_parallel(lambda name: thaw_container(name, host), to_thaw, workers)
+    for name in thawed:
+        log(f"Connexion détectée sur le conteneur gelé {name}, dégel")
+    frozen = run_parallel(lambda name: freeze_container(name, host), to_freeze, workers)
+    def suspend(name):
+        if name in checkpoint_names:
+            return checkpoint_container(name, name in paused, host)
+        return stop_container(name, name in paused, host)
+    stopped = run_parallel(suspend, to_stop, workers)
+    if stopped:
+        mark_suspended(stopped)
+    archived = run_parallel(lambda name: archive_container(name, host), to_archive, workers)
+
+    # Une ligne par action dans le journal des lancements (launch_log.jsonl)
+    for action, names in (('thaw', thawed), ('freeze', frozen), ('stop', stopped), ('archive', archived)):
+        for name in names:
+            launch_log.log_event('reaper', container=name, user=name[len(CONTAINER_PREFIX):], node=node_name,
+                                 action='checkpoint' if action == 'stop' and name in checkpoint_names else action,
+                                 idle_seconds=idle_seconds.get(name),
+                                 mem_freed=resources.get(name, {}).get('mem_usage') if action == 'stop' else None)
+
+    active = sum(1 for n in connections.values() if n > 0)
+    freed = sum(resources[name]['mem_usage'] for name in stopped if name in resources)
+    log(f"Passage terminé{where} en {time.time() - start:.1f}s : {len(containers)} conteneur(s), "
+        f"{active} actif(s), {len(thawed)} dégelé(s), {len(frozen)} gelé(s), "
+        f"{len(stopped)} arrêté(s) ({freed / (1024 * 1024):.0f} Mio libérés), {len(archived)} archivé(s)")
+    return set(c['name'] for c in containers) - set(archived)
+
+def run_cycle(policies, deadline, workers, busy_cpu=DEFAULT_BUSY_CPU):
+    """Effectue un passage complet sur le démon local et sur chaque nœud distant de nodes.txt, en
+    parallèle : vérification de l'activité puis application des paliers (dégel si une connexion
+    arrive sur un conteneur gelé, gel, arrêt, archivage).
+    Un conteneur sans session dont le CPU dépasse busy_cpu % (compilation en cours...) reste actif."""
+    hosts = get_reaper_hosts()
+    activity = load_activity()
+    with ThreadPoolExecutor(max_workers=len(hosts)) as executor:
+        futures = {executor.submit(reap_host, host, node_name, policies, deadline, workers, busy_cpu, activity): node_name
+                   for host, node_name in hosts.items()}
+    existing_names = set()
+    complete = True
+    for future, node_name in futures.items():
+        try:
+            names = future.result()
+        except Exception as e:
+            log(f"Erreur lors du passage sur {node_name}: {e}")
+            names = None
+        if names is None:
+            complete = False
+        else:
+            existing_names |= names
+
+    # Oublier les conteneurs qui n'existent plus (seulement si tous les démons ont été listés)
+    if complete:
+        activity = {name: ts for name, ts in activity.items() if name in existing_names}
+    save_activity(activity)
+
+def acquire_instance_lock():
+    """Verrou exclusif (flock) tenu pendant toute la vie du processus : un seul démon ou passage
+    --once à la fois. Retourne le fichier verrouillé, None si une autre instance le tient."""
+    lock = open(LOCK_FILE, 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return None
+    return lock
+
+def main():
+    """Fonction principale du démon"""
+    global _verbose
+    parser = argparse.ArgumentParser(description="Mise en veille des conteneurs utilisateurs inactifs")
+    parser.add_argument('--once', action='store_true', help='Effectuer un seul passage puis quitter')
+    parser.add_argument('-i', '--interval', type=int, default=DEFAULT_INTERVAL, help='Intervalle entre deux vérifications (secondes)')
+    parser.add_argument('-t', '--timeout', type=int, default=DEFAULT_TIMEOUT, help=f"Durée d'inactivité avant arrêt si {POLICY_FILE} n'a pas de ligne 'default' (secondes)")
+    parser.add_argument('-d', '--deadline', type=int, default=DEFAULT_DEADLINE, help='Durée maximale de vérification par passage (secondes)')
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS, help='Nombre de vérifications simultanées')
+    parser.add_argument('-b', '--busy-cpu', type=float, default=DEFAULT_BUSY_CPU, help='%% CPU au-dessus duquel un conteneur sans session reste actif (0 = désactivé)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Ne rien afficher (log uniquement dans cleanup.log)')
+    args = parser.parse_args()
+    _verbose = not args.quiet
+
+    # Conservé jusqu'à la sortie : le verrou est libéré à la fermeture du fichier (ou à la mort du processus)
+    instance_lock = acquire_instance_lock()
+    if instance_lock is None:
+        log("Une autre instance de idle_reaper.py est en cours, abandon")
+        sys.exit(0 if args.once else 1)
+
+    if args.once:
+        run_cycle(load_idle_policies(args.timeout), args.deadline, args.workers, args.busy_cpu)
+        return
+
+    with open(PID_FILE, 'w') as f:
+        f.write(str(os.getpid()))
+    # Arrêt par kill / systemd : même sortie que Ctrl+C (le fichier PID est supprimé)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    log(f"Démarrage du démon de mise en veille (intervalle {args.interval}s, inactivité max {args.timeout}s)")
+    try:
+        while True:
+            cycle_start = time.time()
+            # Politique relue à chaque passage pour prendre en compte les modifications
+            run_cycle(load_idle_policies(args.timeout), args.deadline, args.workers, args.busy_cpu)
+            time.sleep(max(1, args.interval - (time.time() - cycle_start)))
+    except (KeyboardInterrupt, SystemExit):
+        log("Arrêt du démon de mise en veille")
+    finally:
+        try:
+            with open(PID_FILE) as f:
+                ours = f.read().strip() == str(os.getpid())
+            if ours:
+                os.unlink(PID_FILE)
+        except OSError:
+            pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Journal structuré des lancements (une ligne JSON par événement, launch_log.jsonl).
+Événements : launch / reconnect (app.py, /execute), password_change (app.py),
+reaper (idle_reaper.py : gel, dégel, arrêt, archivage),
+speculative_wake / speculative_wake_result (speculative_wake.py : réveil pendant la saisie du mot de passe).
+- log_event() ne fait que déposer l'événement dans une file bornée : aucune écriture disque
+  ni attente sur le chemin de la requête (file pleine : événement compté puis abandonné)
+- Un thread d'écriture regroupe les lignes et les ajoute au fichier au plus toutes les FLUSH_INTERVAL secondes
+- Rotation par taille (MAX_BYTES) ou par âge (MAX_AGE) : le fichier est renommé puis compressé
+  en .gz par le thread d'écriture; seules les BACKUP_COUNT dernières archives sont gardées
+- Plusieurs processus (app.py, idle_reaper.py) écrivent le même fichier : ajout et rotation
+  sous verrou (flock), fichier rouvert s'il a été tourné par un autre processus
+Exécuter avec: python3 launch_log.py   (affiche les derniers événements)
+"""
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import queue
+import fcntl
+import atexit
+import shutil
+import threading
+from datetime import datetime
+
+LAUNCH_LOG_FILE = "launch_log.jsonl"
+MAX_BYTES = 20 * 1024 * 1024  # taille du fichier avant rotation
+MAX_AGE = 86400               # secondes : rotation quotidienne même si le fichier est petit
+BACKUP_COUNT = 14             # archives compressées gardées
+FLUSH_INTERVAL = 1            # secondes entre deux écritures groupées
+QUEUE_SIZE = 10000            # événements en attente d'écriture
+
+class EventLog:
+    """File d'événements vidée par un thread d'écriture (démarré au premier événement)"""
+
+    def __init__(self, path=LAUNCH_LOG_FILE):
+        self.path = path
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = 0
+        self.thread = None
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def log(self, event, **fields):
+        """Ajoute un événement horodaté (sans bloquer)"""
+        record = {'ts': round(time.time(), 3), 'event': event}
+        record.update(fields)
+        if self.thread is None:
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+                atexit.register(self.close)
+        return self
+
+    def close(self, timeout=5):
+        """Écrit les événements en attente (appelé à la sortie du processus)"""
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            stopping = self.stopping.wait(FLUSH_INTERVAL)
+            records = []
+            try:
+                while True:
+                    records.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            if self.dropped:
+                records.append({'ts': round(time.time(), 3), 'event': 'log_dropped', 'count': self.dropped})
+                self.dropped = 0
+            if records:
+                self._write(records)
+            if stopping:
+                return
+
+    def _open_locked(self):
+        """Ouvre le fichier courant en ajout, verrouillé (rouvert s'il a été tourné pendant l'attente du verrou)"""
+        while True:
+            f = open(self.path, 'a', encoding='utf-8')
+            fcntl.flock(f, fcntl.LOCK_EX)
+            if os.path.exists(self.path) and os.path.samestat(os.fstat(f.fileno()), os.stat(self.path)):
+                return f
+            f.close()
+
+    def _write(self, records):
+        lines = ''.join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records)
+        rotated = None
+        try:
+            f = self._open_locked()
+            try:
+                if self._should_rotate(f):
+                    rotated = f"{self.path}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+                    os.rename(self.path, rotated)
+                    f.close()
+                    f = self._open_locked()
+                f.write(lines)
+            finally:
+                f.close()
+        except OSError as e:
+            print(f"Erreur lors de l'écriture dans {self.path}: {e}", file=sys.stderr)
+        if rotated:
+            self._compress(rotated)
+
+    def _should_rotate(self, f):
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return False
+        if size >= MAX_BYTES:
+            return True
+        # Âge du fichier : horodatage de son premier événement
+        try:
+            with open(self.path, 'r', encoding='utf-8') as reader:
+                first = json.loads(reader.readline())
+            return time.time() - first['ts'] >= MAX_AGE
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+    def _compress(self, rotated):
+        """Compresse un fichier tourné (hors de la requête) et supprime les archives les plus anciennes"""
+        try:
+            with open(rotated, 'rb') as src, gzip.open(f"{rotated}.gz.tmp", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(f"{rotated}.gz.tmp", f"{rotated}.gz")
+            os.unlink(rotated)
+            for old in sorted(glob.glob(f"{glob.escape(self.path)}.*.gz"))[:-BACKUP_COUNT]:
+                os.unlink(old)
+        except OSError as e:
+            print(f"Erreur lors de la compression de {rotated}: {e}", file=sys.stderr)
+
+def read_events(path=LAUNCH_LOG_FILE, since=None):
+    """Événements du journal, archives compressées comprises (de la plus ancienne au fichier courant).
+    Avec since (timestamp), les archives tournées avant cette date ne sont pas décompressées."""
+    files = sorted(glob.glob(f"{glob.escape(path)}.*.gz")) + [path]
+    for name in files:
+        if since and name.endswith('.gz'):
+            stamp = name[len(path) + 1:-len('.gz')]
+            try:
+                if datetime.strptime(stamp, '%Y%m%d-%H%M%S-%f').timestamp() < since:
+                    continue  # Archive tournée avant since : tous ses événements sont plus anciens
+            except ValueError:
+                pass
+        try:
+            opener = gzip.open if name.endswith('.gz') else open
+            with opener(name, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # Ligne tronquée (arrêt brutal pendant une écriture)
+        except FileNotFoundError:
+            continue
+
+_log = None
+_log_lock = threading.Lock()
+
+def get_log(path=LAUNCH_LOG_FILE):
+    """Journal partagé du processus"""
+    global _log
+    with _log_lock:
+        if _log is None:
+            _log = EventLog(path)
+        return _log
+
+def log_event(event, **fields):
+    """Enregistre un événement dans le journal partagé (retour immédiat)"""
+    get_log().log(event, **fields)
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    events = list(read_events())[-count:]
+    for record in events:
+        when = datetime.fromtimestamp(record.get('ts', 0)).strftime('%Y-%m-%d %H:%M:%S')
+        details = {k: v for k, v in record.items() if k not in ('ts', 'event')}
+        print(f"{when} {record.get('event', '?'):<16} {json.dumps(details, ensure_ascii=False)}")
+    if not events:
+        print(f"Aucun événement dans {LAUNCH_LOG_FILE}.")
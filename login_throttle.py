@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Limitation des tentatives de connexion (/execute, /change_password) par utilisateur et par IP.
+- Seaux à jetons reconstitués avec le temps, délai exponentiel après quelques échecs
+- Verrouillage d'un compte depuis une IP seulement (paire utilisateur + IP) : des échecs
+  envoyés depuis d'autres IP ne peuvent pas bloquer le vrai utilisateur
+- Par utilisateur (toutes IP) et par IP, seuls les échecs coûtent un jeton : une attaque
+  distribuée est ralentie, une classe entière derrière le NAT de l'école se connecte sans attente
+- La décision est prise avant toute vérification bcrypt et avant de lancer script.sh :
+  une rafale de tentatives refusées ne coûte presque rien
+Les compteurs sont en mémoire; avec un fichier (login_throttle.json pour app.py), ils sont
+rechargés au démarrage et enregistrés de façon atomique au plus toutes les SAVE_INTERVAL secondes.
+Exécuter avec: python3 login_throttle.py   (affiche les clés verrouillées ou ralenties du fichier)
+"""
+import os
+import json
+import time
+import threading
+
+THROTTLE_FILE = "login_throttle.json"
+SAVE_INTERVAL = 5     # secondes minimum entre deux enregistrements (sauf début de verrouillage)
+MAX_ENTRIES = 10000   # clés gardées en mémoire (noms et IP arbitraires envoyés par un attaquant)
+
+# charge : ce qui consomme un jeton ('attempt' = toute tentative, 'failure' = échec seulement)
+# backoff_after / lockout_failures : None = ni délai exponentiel ni verrouillage pour ce type de clé
+LIMITS = {
+    # Un utilisateur depuis une IP : seule cette source est ralentie puis verrouillée
+    'user_ip': {'capacity': 5, 'refill': 12, 'charge': 'attempt', 'backoff_after': 3, 'lockout_failures': 10},
+    # Un utilisateur depuis toutes les IP (essais distribués) : ralenti, jamais verrouillé
+    'user': {'capacity': 20, 'refill': 30, 'charge': 'failure', 'backoff_after': None, 'lockout_failures': None},
+    # Une IP peut regrouper beaucoup d'utilisateurs (NAT de l'école) : les connexions réussies ne comptent pas
+    'ip': {'capacity': 30, 'refill': 2, 'charge': 'failure', 'backoff_after': None, 'lockout_failures': None},
+}
+BACKOFF_BASE = 2      # secondes, doublées à chaque échec supplémentaire
+BACKOFF_MAX = 300
+LOCKOUT_WINDOW = 900  # secondes de verrouillage; les échecs plus anciens sont oubliés
+
+class LoginThrottle:
+    """Compteurs de tentatives par clé ('user_ip:<nom>@<adresse>', 'user:<nom>', 'ip:<adresse>')"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.last_save = 0
+        if path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Erreur lors de la lecture de {self.path}: {e}")
+
+    def save(self):
+        """Enregistre les compteurs (fichier temporaire puis renommage)"""
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+            self.last_save = time.time()
+        except OSError as e:
+            print(f"Erreur lors de l'enregistrement de {self.path}: {e}")
+
+    def _entry(self, kind, value, now):
+        """Compteur d'une clé, jetons reconstitués et échecs anciens oubliés"""
+        key = f"{kind}:{value}"
+        limits = LIMITS[kind]
+        entry = self.entries.get(key)
+        if entry is None:
+            if len(self.entries) >= MAX_ENTRIES:
+                self._prune(now)
+            entry = self.entries[key] = {'tokens': limits['capacity'], 'updated': now,
+                                         'failures': 0, 'last_failure': 0, 'locked_until': 0}
+        entry['tokens'] = min(limits['capacity'], entry['tokens'] + (now - entry['updated']) / limits['refill'])
+        entry['updated'] = now
+        if entry['failures'] and now - entry['last_failure'] > LOCKOUT_WINDOW:
+            entry['failures'] = 0
+        return entry
+
+    def _prune(self, now):
+        """Supprime les clés sans restriction en cours, puis les plus anciennes si nécessaire"""
+        for key, entry in list(self.entries.items()):
+            if entry['locked_until'] <= now and (not entry['failures'] or now - entry['last_failure'] > LOCKOUT_WINDOW):
+                del self.entries[key]
+        if len(self.entries) >= MAX_ENTRIES:
+            for key in sorted(self.entries, key=lambda k: self.entries[k]['updated'])[:len(self.entries) // 10 + 1]:
+                del self.entries[key]
+
+    def _wait(self, kind, entry, now):
+        """Secondes avant la prochaine tentative autorisée pour cette clé (0 = autorisée)"""
+        limits = LIMITS[kind]
+        wait = max(0, entry['locked_until'] - now) if limits['lockout_failures'] else 0
+        extra_failures = entry['failures'] - limits['backoff_after'] if limits['backoff_after'] is not None else -1
+        if extra_failures >= 0:
+            backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** extra_failures)
+            wait = max(wait, entry['last_failure'] + backoff - now)
+        if entry['tokens'] < 1:
+            wait = max(wait, (1 - entry['tokens']) * limits['refill'])
+        return wait
+
+    @staticmethod
+    def _keys(username, ip):
+        return [('user_ip', f"{username}@{ip}"), ('user', username), ('ip', ip)]
+
+    def check(self, username, ip):
+        """Décide si une tentative est autorisée, sans rien calculer de coûteux.
+        Retourne 0 (tentative autorisée, un jeton consommé par les clés chargées à la tentative)
+        ou le nombre de secondes à attendre."""
+        now = time.time()
+        with self.lock:
+            entries = [(kind, self._entry(kind, value, now)) for kind, value in self._keys(username, ip)]
+            wait = max(self._wait(kind, entry, now) for kind, entry in entries)
+            if wait > 0:
+                return int(wait) + 1
+            for kind, entry in entries:
+                if LIMITS[kind]['charge'] == 'attempt':
+                    entry['tokens'] -= 1
+            return 0
+
+    def record_failure(self, username, ip):
+        """Échec d'authentification : jeton consommé (clés chargées aux échecs), délai allongé,
+        verrouillage au-delà du seuil"""
+        now = time.time()
+        with self.lock:
+            locked = False
+            for kind, value in self._keys(username, ip):
+                limits = LIMITS[kind]
+                entry = self._entry(kind, value, now)
+                entry['failures'] += 1
+                entry['last_failure'] = now
+                if limits['charge'] == 'failure':
+                    entry['tokens'] = max(0, entry['tokens'] - 1)
+                if limits['lockout_failures'] and entry['failures'] >= limits['lockout_failures']:
+                    entry['locked_until'] = now + LOCKOUT_WINDOW
+                    entry['failures'] = 0
+                    locked = True
+                    print(f"Connexion verrouillée pour {kind} {value} pendant {LOCKOUT_WINDOW}s")
+            if self.path and (locked or now - self.last_save >= SAVE_INTERVAL):
+                self.save()
+
+    def record_success(self, username, ip):
+        """Authentification réussie : les échecs de l'utilisateur sont oubliés (pas ceux de l'IP,
+        qui peut être partagée avec un attaquant)"""
+        now = time.time()
+        with self.lock:
+            for kind, value in self._keys(username, ip)[:2]:
+                entry = self._entry(kind, value, now)
+                entry['failures'] = 0
+                entry['locked_until'] = 0
+            if self.path and now - self.last_save >= SAVE_INTERVAL:
+                self.save()
+
+_throttle = None
+_throttle_lock = threading.Lock()
+
+def get_throttle(path=THROTTLE_FILE):
+    """Compteurs partagés du processus (path=None : en mémoire uniquement)"""
+    global _throttle
+    with _throttle_lock:
+        if _throttle is None:
+            _throttle = LoginThrottle(path)
+        return _throttle
+
+if __name__ == "__main__":
+    throttle = LoginThrottle(THROTTLE_FILE)
+    now = time.time()
+    shown = 0
+    for key, entry in sorted(throttle.entries.items()):
+        kind = key.split(':', 1)[0]
+        if kind not in LIMITS:
+            continue
+        wait = throttle._wait(kind, throttle._entry(kind, key.split(':', 1)[1], now), now)
+        if wait > 0 or entry['failures']:
+            state = f"verrouillé encore {int(entry['locked_until'] - now)}s" if entry['locked_until'] > now \
+                else f"attente {int(wait)}s" if wait > 0 else "actif"
+            print(f"{key}: {entry['failures']} échec(s) récent(s), {state}")
+            shown += 1
+    if not shown:
+        print(f"Aucune restriction en cours ({len(throttle.entries)} clé(s) dans {THROTTLE_FILE}).")
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Historique des métriques par conteneur (CPU %, mémoire %, mémoire GPU en MiB, sessions RDP).
+Tampon circulaire de taille fixe dans un fichier projeté en mémoire (mmap) : les dernières
+N heures à une résolution donnée, conservées entre deux lancements du tableau de bord.
+Un seul axe de temps pour tous les conteneurs : la case d'un instant t est (t // résolution) % points.
+La géométrie (durée, résolution) est celle du fichier existant : le tableau de bord ne le réinitialise
+qu'avec --history-reset; la lecture et l'export l'ouvrent en lecture seule.
+Exécuter avec: python3 metrics_history.py              (sparklines de la dernière heure)
+               python3 metrics_history.py --export historique.csv   (ou .parquet avec pyarrow)
+               python3 metrics_history.py --reset --hours 24 --resolution 60   (efface l'historique)
+"""
+import os
+import csv
+import math
+import mmap
+import time
+import struct
+import argparse
+import threading
+from datetime import datetime
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+HISTORY_FILE = "metrics_history.bin"
+DEFAULT_HOURS = 6
+DEFAULT_RESOLUTION = 30  # secondes par point
+MAX_CONTAINERS = 512
+SPARKLINE_WINDOW = 3600  # secondes affichées dans le tableau
+METRICS = ("cpu", "mem", "gpu_memory", "sessions")
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+MAGIC = b"RDPHIST1"
+# magic, points, résolution, conteneurs max, métriques, dernière case écrite (-1 si vide)
+HEADER = struct.Struct("<8sIIIIq")
+HEADER_SIZE = 64
+NAME_SIZE = 56
+# nom du conteneur, dernière case écrite pour ce conteneur
+SLOT = struct.Struct(f"<{NAME_SIZE}sq")
+NAN = struct.pack("<f", math.nan)
+
+def to_float(value):
+    """Convertit une valeur du tableau de bord ('12.5%', 3, None, 'N/A') en nombre (None si inconnue)"""
+    if value is None:
+        return None
+    try:
+        return float(str(value).rstrip('%'))
+    except ValueError:
+        return None
+
+def container_samples(containers):
+    """Valeurs à enregistrer pour les conteneurs d'un relevé du tableau de bord : seuls les conteneurs
+    en cours et mesurés dans ce cycle (une valeur 'stale' est une répétition du relevé précédent)"""
+    samples = {}
+    for container in containers:
+        if not container.get('is_running') or container.get('stale'):
+            continue
+        samples[container['name']] = {
+            'cpu': to_float(container.get('cpu')),
+            'mem': to_float(container.get('mem_perc')),
+            'gpu_memory': container.get('gpu_memory') if container.get('has_gpu') else None,
+            'sessions': container.get('sessions')
+        }
+    return samples
+
+def sparkline(values, width, scale_max=None):
+    """Réduit une série à width caractères (maximum de chaque groupe); ' ' pour une période sans mesure"""
+    if not values or width <= 0:
+        return ""
+    measured = [v for v in values if not math.isnan(v)]
+    top = max(measured + [scale_max or 0]) if measured else 0
+    chars = []
+    for i in range(width):
+        group = values[i * len(values) // width:max((i + 1) * len(values) // width, i * len(values) // width + 1)]
+        group = [v for v in group if not math.isnan(v)]
+        if not group:
+            chars.append(" ")
+        elif top <= 0:
+            chars.append(SPARK_CHARS[0])
+        else:
+            level = int(max(group) / top * (len(SPARK_CHARS) - 1) + 0.5)
+            chars.append(SPARK_CHARS[max(0, min(level, len(SPARK_CHARS) - 1))])
+    return "".join(chars)
+
+def read_header(path):
+    """En-tête d'un fichier d'historique existant (None s'il est absent ou invalide)"""
+    try:
+        with open(path, 'rb') as f:
+            header = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return None
+    return header if header[0] == MAGIC else None
+
+class MetricsHistory:
+    """Tampon circulaire des métriques de max_containers conteneurs, projeté en mémoire.
+    Un fichier existant garde sa géométrie (hours, resolution, max_containers ne servent qu'à en créer
+    un nouveau) sauf avec reset=True. readonly=True : lecture seule d'un fichier existant."""
+
+    def __init__(self, path=HISTORY_FILE, hours=None, resolution=None, max_containers=None,
+                 readonly=False, reset=False):
+        self.path = path
+        self.readonly = readonly
+        self.resolution = int(resolution or DEFAULT_RESOLUTION)
+        self.points = max(2, int((hours or DEFAULT_HOURS) * 3600 // self.resolution))
+        self.max_containers = max_containers or MAX_CONTAINERS
+        stored = read_header(path)
+        if readonly and (stored is None or reset):
+            raise ValueError(f"Aucun historique lisible dans {path}")
+        if stored and stored[4] == len(METRICS) and not reset:
+            _, points, stored_resolution, stored_max, _, _ = stored
+            if (points, stored_resolution, stored_max) != (self.points, self.resolution, self.max_containers) \
+                    and (hours or resolution or max_containers) and not readonly:
+                print(f"Historique {path} conservé ({points * stored_resolution / 3600:g} h, {stored_resolution} s "
+                      f"par point) : --history-reset pour appliquer la nouvelle durée ou résolution")
+            self.points, self.resolution, self.max_containers = points, stored_resolution, stored_max
+        self.lock = threading.Lock()
+        self.slots_offset = HEADER_SIZE
+        self.data_offset = HEADER_SIZE + self.max_containers * SLOT.size
+        self.size = self.data_offset + self.max_containers * len(METRICS) * self.points * 4
+        self._open(reset)
+
+    def _open(self, reset):
+        expected = (MAGIC, self.points, self.resolution, self.max_containers, len(METRICS))
+        header = read_header(self.path)
+        if reset or header is None or header[:5] != expected or os.path.getsize(self.path) != self.size:
+            if self.readonly:
+                raise ValueError(f"Historique {self.path} illisible (taille ou en-tête invalide)")
+            if os.path.exists(self.path):
+                print(f"Historique {self.path} " + ("réinitialisé" if reset else "illisible, réinitialisé"))
+            self._create()
+        if self.readonly:
+            self.file = open(self.path, 'rb')
+            self.mm = mmap.mmap(self.file.fileno(), self.size, access=mmap.ACCESS_READ)
+        else:
+            self.file = open(self.path, 'r+b')
+            self.mm = mmap.mmap(self.file.fileno(), self.size)
+        self.data = memoryview(self.mm)[self.data_offset:].cast('f')
+        self.head = HEADER.unpack_from(self.mm, 0)[5]
+        # Nom -> numéro d'emplacement, et dernière case écrite de chaque emplacement
+        self.slots = {}
+        self.last_bucket = []
+        self.free = []
+        for slot in range(self.max_containers):
+            name, last = SLOT.unpack_from(self.mm, self.slots_offset + slot * SLOT.size)
+            name = name.rstrip(b"\0").decode(errors="replace")
+            if name:
+                self.slots[name] = slot
+            else:
+                self.free.append(slot)
+            self.last_bucket.append(last if name else -1)
+        self.free.reverse()
+
+    def _create(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, self.points, self.resolution, self.max_containers, len(METRICS), -1)
+                    .ljust(HEADER_SIZE, b"\0"))
+            f.write(b"\0" * (self.data_offset - HEADER_SIZE))
+            row = NAN * self.points
+            for _ in range(self.max_containers * len(METRICS)):
+                f.write(row)
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        with self.lock:
+            self.data.release()
+            if not self.readonly:
+                self.mm.flush()
+            self.mm.close()
+            self.file.close()
+
+    def _clear_slot(self, slot):
+        start = self.data_offset + slot * len(METRICS) * self.points * 4
+        self.mm[start:start + len(METRICS) * self.points * 4] = NAN * (len(METRICS) * self.points)
+
+    def _slot(self, name, bucket):
+        """Emplacement d'un conteneur; un nouveau conteneur prend un emplacement libre,
+        sinon celui du conteneur mesuré le moins récemment"""
+        slot = self.slots.get(name)
+        if slot is None:
+            if self.free:
+                slot = self.free.pop()
+            else:
+                slot = min(range(self.max_containers), key=lambda s: self.last_bucket[s])
+                for old_name, old_slot in list(self.slots.items()):
+                    if old_slot == slot:
+                        del self.slots[old_name]
+            self._clear_slot(slot)
+            self.slots[name] = slot
+        self.last_bucket[slot] = bucket
+        SLOT.pack_into(self.mm, self.slots_offset + slot * SLOT.size, name.encode()[:NAME_SIZE], bucket)
+        return slot
+
+    def _advance(self, bucket):
+        """Avance l'axe du temps jusqu'à bucket en vidant les cases réutilisées"""
+        if self.head >= 0 and bucket - self.head < self.points:
+            for b in range(self.head + 1, bucket + 1):
+                index = b % self.points
+                for slot in self.slots.values():
+                    for m in range(len(METRICS)):
+                        self.data[(slot * len(METRICS) + m) * self.points + index] = math.nan
+        else:
+            # Premier enregistrement ou interruption plus longue que l'historique : tout est périmé
+            self.mm[self.data_offset:] = NAN * (self.max_containers * len(METRICS) * self.points)
+        self.head = bucket
+        struct.pack_into("<q", self.mm, HEADER.size - 8, bucket)
+
+    def record(self, samples, timestamp=None):
+        """Enregistre {nom: {métrique: valeur}} à l'instant timestamp (par défaut maintenant);
+        une nouvelle mesure dans la même case remplace la précédente"""
+        if self.readonly:
+            raise ValueError(f"Historique {self.path} ouvert en lecture seule")
+        bucket = int((timestamp or time.time()) // self.resolution)
+        with self.lock:
+            if bucket <= self.head - self.points:
+                return  # Plus ancien que l'historique conservé
+            if bucket > self.head:
+                self._advance(bucket)
+            index = bucket % self.points
+            for name, values in samples.items():
+                slot = self._slot(name, bucket)
+                for m, metric in enumerate(METRICS):
+                    value = values.get(metric)
+                    if value is not None:
+                        self.data[(slot * len(METRICS) + m) * self.points + index] = float(value)
+            self.mm.flush()
+
+    def record_containers(self, containers, timestamp=None):
+        """Enregistre les conteneurs d'un relevé du tableau de bord"""
+        self.record(container_samples(containers), timestamp)
+
+    def series(self, name, metric, window=None):
+        """Valeurs d'un conteneur de la plus ancienne à la plus récente (NaN si non mesurée) sur les
+        window dernières secondes (tout l'historique par défaut), jusqu'à maintenant"""
+        count = self.points if window is None else max(1, min(self.points, int(window // self.resolution)))
+        with self.lock:
+            slot = self.slots.get(name)
+            if slot is None or self.head < 0:
+                return [math.nan] * count
+            end = max(self.head, int(time.time() // self.resolution))
+            base = (slot * len(METRICS) + METRICS.index(metric)) * self.points
+            values = []
+            for bucket in range(end - count + 1, end + 1):
+                if bucket > self.head or bucket <= self.head - self.points:
+                    values.append(math.nan)
+                else:
+                    values.append(self.data[base + bucket % self.points])
+            return values
+
+    def mean(self, name, metric, window=SPARKLINE_WINDOW):
+        """Moyenne des valeurs mesurées sur la fenêtre (0 sans mesure)"""
+        measured = [v for v in self.series(name, metric, window) if not math.isnan(v)]
+        return sum(measured) / len(measured) if measured else 0
+
+    def sparkline(self, name, metric="cpu", width=12, window=SPARKLINE_WINDOW):
+        """Sparkline d'une métrique (échelle 0-100 pour les pourcentages)"""
+        return sparkline(self.series(name, metric, window), width, 100 if metric in ("cpu", "mem") else None)
+
+    def names(self):
+        with self.lock:
+            return sorted(self.slots)
+
+    def rows(self, names=None):
+        """Lignes (horodatage, conteneur, cpu, mem, gpu_memory, sessions) des cases mesurées"""
+        rows = []
+        for name in names or self.names():
+            columns = [self.series(name, metric) for metric in METRICS]
+            end = max(self.head, int(time.time() // self.resolution))
+            for i, values in enumerate(zip(*columns)):
+                if all(math.isnan(v) for v in values):
+                    continue
+                timestamp = (end - self.points + 1 + i) * self.resolution
+                rows.append((timestamp, name) + tuple(None if math.isnan(v) else round(v, 2) for v in values))
+        return rows
+
+    def export_csv(self, path, names=None):
+        """Exporte l'historique dans un fichier CSV; retourne le nombre de lignes"""
+        rows = self.rows(names)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(("time", "container") + METRICS)
+            for row in rows:
+                writer.writerow((datetime.fromtimestamp(row[0]).isoformat(),) + row[1:])
+        return len(rows)
+
+    def export_parquet(self, path, names=None):
+        """Exporte l'historique au format Parquet (nécessite pyarrow); retourne le nombre de lignes"""
+        if pyarrow is None:
+            raise RuntimeError("pyarrow n'est pas installé (pip install pyarrow)")
+        rows = self.rows(names)
+        columns = {"time": [datetime.fromtimestamp(row[0]) for row in rows], "container": [row[1] for row in rows]}
+        for i, metric in enumerate(METRICS):
+            columns[metric] = [row[2 + i] for row in rows]
+        pyarrow.parquet.write_table(pyarrow.table(columns), path)
+        return len(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Historique des métriques des conteneurs")
+    parser.add_argument('-f', '--file', default=HISTORY_FILE, help='Fichier d\'historique')
+    parser.add_argument('--reset', action='store_true', help='Efface l\'historique et le recrée avec --hours et --resolution')
+    parser.add_argument('--hours', type=float, help=f'Durée conservée en heures avec --reset (défaut: {DEFAULT_HOURS})')
+    parser.add_argument('--resolution', type=int, help=f'Secondes par point avec --reset (défaut: {DEFAULT_RESOLUTION})')
+    parser.add_argument('-m', '--metric', choices=METRICS, default="cpu", help='Métrique affichée')
+    parser.add_argument('--export', metavar='FICHIER', help='Exporter en CSV (.csv) ou Parquet (.parquet)')
+    args = parser.parse_args()
+
+    if args.reset:
+        MetricsHistory(args.file, args.hours, args.resolution, reset=True).close()
+        raise SystemExit(0)
+    try:
+        history = MetricsHistory(args.file, readonly=True)
+    except (OSError, ValueError) as e:
+        print(f"Erreur: {e}")
+        raise SystemExit(1)
+    if args.export:
+        try:
+            if args.export.endswith(".parquet"):
+                count = history.export_parquet(args.export)
+            else:
+                count = history.export_csv(args.export)
+            print(f"{count} ligne(s) exportée(s) dans {args.export}")
+        except (OSError, RuntimeError) as e:
+            print(f"Erreur lors de l'export: {e}")
+    else:
+        names = sorted(history.names(), key=lambda n: -history.mean(n, args.metric))
+        for name in names:
+            print(f"{name:<30} {history.sparkline(name, args.metric, 60)} moy. {history.mean(name, args.metric):.1f}")
+    history.close()
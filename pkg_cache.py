@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Caches de paquets partagés (option --pkg-cache de images.txt), adressés par contenu.
+- package_cache/store/<sha256> : chaque fichier une seule fois, nommé par son empreinte
+- package_cache/versions/<image>/<outil>/<n> : versions publiées, des liens physiques vers le store,
+  jamais modifiées après publication (overlayfs ne permet pas de modifier une couche inférieure montée)
+- package_cache/current/<image>/<outil> : lien symbolique vers la dernière version, remplacé de façon
+  atomique; script.sh monte la version qu'il désigne comme couche inférieure (lecture seule) du volume
+  overlay de l'utilisateur, dont la couche supérieure est user_data/<user>_pkgcache/<image>/<outil>/<n>
+Un seul écrivain à la fois (verrou package_cache/store.lock) : publication d'un dossier pré-rempli par
+l'admin, ou promotion des fichiers vérifiables des couches des utilisateurs (contenu npm nommé par son
+empreinte, paquets .deb vérifiés par apt contre ses index signés). Les autres fichiers des
+utilisateurs restent dans leur couche : personne ne peut déposer un paquet que les autres installeraient.
+Exécuter avec: python3 pkg_cache.py                          (versions publiées)
+          ou: python3 pkg_cache.py publish IMAGE OUTIL DOSSIER  (publie un dossier pré-rempli)
+          ou: python3 pkg_cache.py maintain                 (promotion puis nettoyage, lancé par le cron)
+          ou: python3 pkg_cache.py remove USER              (volumes et couches d'un utilisateur)
+"""
+import os
+import sys
+import json
+import fcntl
+import shutil
+import hashlib
+import argparse
+import tempfile
+from urllib.parse import quote
+
+import docker_api
+import scheduler
+
+CACHE_DIR = "package_cache"
+STORE_DIR = os.path.join(CACHE_DIR, "store")
+VERSIONS_DIR = os.path.join(CACHE_DIR, "versions")
+CURRENT_DIR = os.path.join(CACHE_DIR, "current")
+EMPTY_DIR = os.path.join(CACHE_DIR, "empty")  # Couche inférieure tant que rien n'est publié (version 0)
+LOCK_FILE = os.path.join(CACHE_DIR, "store.lock")
+DATA_DIR = "./user_data"
+USER_SUFFIX = "_pkgcache"    # user_data/<user>_pkgcache : couches supérieures de l'utilisateur
+VOLUME_ROLE = "pkgcache"     # Étiquette rdp.role des volumes créés par script.sh (rdp.user = utilisateur)
+KEEP_VERSIONS = 2            # Anciennes versions gardées en plus de la version courante et de celles montées
+CHUNK_SIZE = 1024 * 1024
+
+def file_digest(path, algorithm="sha256"):
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def verify_npm(path, relpath):
+    """Contenu du cache npm (cacache) : content-v2/<algo>/<xx>/<yy>/<reste>, nommé par son empreinte.
+    npm le retrouve par l'empreinte annoncée par le registre, un contenu falsifié n'est jamais lu."""
+    parts = relpath.split(os.sep)
+    if len(parts) != 5 or parts[0] != "content-v2" or parts[1] not in ("sha512", "sha256", "sha1"):
+        return False
+    return file_digest(path, parts[1]) == "".join(parts[2:])
+
+def verify_apt(path, relpath):
+    """Paquets .deb complets (les téléchargements en cours sont dans partial/) : apt les vérifie
+    contre les empreintes de ses index signés avant de les installer"""
+    return os.sep not in relpath and relpath.endswith(".deb")
+
+# Outils dont les fichiers des utilisateurs peuvent être promus dans le cache partagé
+VERIFIERS = {'npm': verify_npm, 'apt': verify_apt}
+
+def lock_store(path=LOCK_FILE):
+    """Verrou exclusif de l'écrivain du cache; libéré à la fermeture du fichier retourné"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lock = open(path, 'a')
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    return lock
+
+def add_to_store(path):
+    """Copie un fichier dans le store (sous le verrou) et retourne son empreinte. La copie est relue
+    avant le renommage atomique : un fichier modifié pendant la copie est refusé (ValueError)."""
+    digest = file_digest(path)
+    target = os.path.join(STORE_DIR, digest)
+    if os.path.exists(target):
+        return digest
+    os.makedirs(STORE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=STORE_DIR, prefix=".tmp.")
+    try:
+        with os.fdopen(fd, 'wb') as out, open(path, 'rb') as f:
+            shutil.copyfileobj(f, out, CHUNK_SIZE)
+        if file_digest(tmp_path) != digest:
+            raise ValueError(f"{path} modifié pendant la copie")
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return digest
+
+def current_version(image, tool):
+    """Numéro et chemin de la version courante d'un cache ((0, None) si rien n'est publié)"""
+    path = os.path.join(CURRENT_DIR, image, tool)
+    if not os.path.islink(path):
+        return 0, None
+    target = os.path.realpath(path)
+    return int(os.path.basename(target)), target
+
+def current_links():
+    """Liens courants, {chemin du lien: version désignée}"""
+    links = {}
+    for directory, dirs, names in os.walk(CURRENT_DIR):
+        for name in dirs + names:
+            path = os.path.join(directory, name)
+            if os.path.islink(path):
+                links[path] = os.path.realpath(path)
+    return links
+
+def list_files(root):
+    """Fichiers ordinaires d'une arborescence, {chemin relatif: chemin} (liens et fichiers spéciaux
+    ignorés, dont les marques de suppression d'overlayfs)"""
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            if os.path.isfile(path) and not os.path.islink(path):
+                files[os.path.relpath(path, root)] = path
+    return files
+
+def publish(image, tool, additions):
+    """Publie une nouvelle version (sous le verrou) : la version courante plus additions
+    ({chemin relatif: empreinte dans le store}). Retourne son numéro, None si rien n'est nouveau."""
+    number, previous = current_version(image, tool)
+    existing = list_files(previous) if previous else {}
+    additions = {relpath: digest for relpath, digest in additions.items() if relpath not in existing}
+    if not additions:
+        return None
+    versions_dir = os.path.join(VERSIONS_DIR, image, tool)
+    os.makedirs(versions_dir, exist_ok=True)
+    number = max([number] + [int(name) for name in os.listdir(versions_dir) if name.isdigit()]) + 1
+    tmp_dir = tempfile.mkdtemp(dir=versions_dir, prefix=".tmp.")
+    try:
+        # Liens physiques : la nouvelle version ne copie rien et la précédente reste intacte
+        sources = dict(existing)
+        sources.update({relpath: os.path.join(STORE_DIR, digest) for relpath, digest in additions.items()})
+        for relpath, source in sources.items():
+            target = os.path.join(tmp_dir, relpath)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.link(source, target)
+        for directory, _, _ in os.walk(tmp_dir):
+            os.chmod(directory, 0o755)
+        version_dir = os.path.join(versions_dir, str(number))
+        os.rename(tmp_dir, version_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    # Bascule atomique du lien courant (relatif : même chemin sur les nœuds qui partagent le dossier)
+    current = os.path.join(CURRENT_DIR, image, tool)
+    os.makedirs(os.path.dirname(current), exist_ok=True)
+    tmp_link = f"{current}.{os.getpid()}.tmp"
+    os.symlink(os.path.relpath(version_dir, os.path.dirname(current)), tmp_link)
+    os.replace(tmp_link, current)
+    return number
+
+def publish_tree(image, tool, source_dir):
+    """Publie un dossier pré-rempli par l'admin (conteneur jetable, voir README)"""
+    with lock_store():
+        additions = {relpath: add_to_store(path) for relpath, path in list_files(source_dir).items()}
+        return publish(image, tool, additions)
+
+def user_layers(username=None):
+    """Couches supérieures des utilisateurs : [(utilisateur, image, outil, dossier de la version)]"""
+    layers = []
+    if not os.path.isdir(DATA_DIR):
+        return layers
+    for entry in sorted(os.listdir(DATA_DIR)):
+        if not entry.endswith(USER_SUFFIX) or (username and entry != f"{username}{USER_SUFFIX}"):
+            continue
+        root = os.path.join(DATA_DIR, entry)
+        for directory, dirs, _ in os.walk(root):
+            if 'upper' in dirs:
+                dirs[:] = []  # Pas de parcours des couches elles-mêmes ici
+                parts = os.path.relpath(directory, root).split(os.sep)
+                if len(parts) >= 3:
+                    layers.append((entry[:-len(USER_SUFFIX)], os.path.join(*parts[:-2]), parts[-2], directory))
+    return layers
+
+def promote(username=None):
+    """Promeut dans le cache partagé les fichiers vérifiables des couches des utilisateurs.
+    Retourne {(image, outil): nouvelle version}."""
+    published = {}
+    with lock_store():
+        candidates = {}
+        for _, image, tool, layer_dir in user_layers(username):
+            verify = VERIFIERS.get(tool)
+            if verify is None:
+                continue
+            for relpath, path in list_files(os.path.join(layer_dir, 'upper')).items():
+                try:
+                    if verify(path, relpath):
+                        candidates.setdefault((image, tool), {})[relpath] = add_to_store(path)
+                except (OSError, ValueError):
+                    continue  # Fichier en cours d'écriture ou supprimé entre-temps
+        for (image, tool), additions in candidates.items():
+            number = publish(image, tool, additions)
+            if number is not None:
+                published[(image, tool)] = number
+    return published
+
+def get_daemon_hosts():
+    """Démons où script.sh crée des volumes : local (None) et nœuds distants de nodes.txt"""
+    return [None] + [node['host'] for node in scheduler.load_nodes() if not scheduler.is_local_node(node)]
+
+def list_volumes(client, label):
+    filters = json.dumps({'label': [f"rdp.role={VOLUME_ROLE}", label] if label else [f"rdp.role={VOLUME_ROLE}"]})
+    return client.request("GET", "/volumes", {'filters': filters}).get('Volumes') or []
+
+def overlay_dirs(volume):
+    """(lowerdir, upperdir) d'un volume overlay"""
+    options = dict(item.split('=', 1) for item in ((volume.get('Options') or {}).get('o') or "").split(',')
+                   if '=' in item)
+    return options.get('lowerdir'), options.get('upperdir')
+
+def remove_volumes(host=None, username=None, keep_current=False):
+    """Supprime les volumes de cache inutilisés d'un démon (ceux d'un utilisateur, ou tous) et les couches
+    de l'utilisateur qui vont avec; un volume utilisé par un conteneur, même arrêté, est gardé (refus
+    du démon), ainsi qu'avec keep_current ceux de la version courante, réutilisés à la prochaine connexion.
+    Retourne les couches inférieures montées par les volumes gardés."""
+    client = docker_api.get_client(host)
+    current = set(current_links().values()) | {os.path.realpath(EMPTY_DIR)}
+    mounted = set()
+    for volume in list_volumes(client, f"rdp.user={username}" if username else None):
+        lowerdir, upperdir = overlay_dirs(volume)
+        lowerdir = os.path.realpath(lowerdir) if lowerdir else None
+        if keep_current and lowerdir in current:
+            mounted.add(lowerdir)
+            continue
+        try:
+            client.request("DELETE", f"/volumes/{quote(volume['Name'], safe='')}")
+        except docker_api.DockerAPIError:
+            mounted.add(lowerdir)
+            continue
+        if upperdir:
+            shutil.rmtree(os.path.dirname(upperdir), ignore_errors=True)
+    return mounted
+
+def remove_user(username, hosts=None):
+    """Volumes et couches d'un utilisateur archivé ou supprimé, une fois son conteneur supprimé
+    (hosts : démons à nettoyer, tous par défaut). Ses fichiers vérifiables sont d'abord promus."""
+    promote(username)
+    for host in hosts if hosts is not None else get_daemon_hosts():
+        try:
+            remove_volumes(host, username)
+        except docker_api.DockerAPIError as e:
+            print(f"Volumes de {username} non supprimés sur {host or 'le démon local'}: {e}", file=sys.stderr)
+    shutil.rmtree(os.path.join(DATA_DIR, f"{username}{USER_SUFFIX}"), ignore_errors=True)
+
+def collect_garbage(keep=KEEP_VERSIONS):
+    """Supprime les volumes inutilisés des anciennes versions, les versions qui ne sont ni courantes,
+    ni récentes, ni montées, puis les fichiers du store qui ne sont plus dans aucune version.
+    Sans réponse d'un démon, aucune version n'est supprimée. Retourne le nombre de versions supprimées."""
+    mounted = set()
+    try:
+        for host in get_daemon_hosts():
+            mounted |= remove_volumes(host, keep_current=True)
+    except docker_api.DockerAPIError as e:
+        print(f"Démon injoignable, versions conservées: {e}", file=sys.stderr)
+        return 0
+    removed = 0
+    with lock_store():
+        for directory, dirs, _ in os.walk(VERSIONS_DIR):
+            numbers = sorted((int(name) for name in dirs if name.isdigit()), reverse=True)
+            if not numbers:
+                continue
+            dirs[:] = [name for name in dirs if not name.isdigit()]
+            current = os.path.realpath(os.path.join(CURRENT_DIR, os.path.relpath(directory, VERSIONS_DIR)))
+            for number in numbers[keep + 1:]:
+                path = os.path.realpath(os.path.join(directory, str(number)))
+                if path != current and path not in mounted:
+                    shutil.rmtree(path)
+                    removed += 1
+        if os.path.isdir(STORE_DIR):
+            for name in os.listdir(STORE_DIR):
+                path = os.path.join(STORE_DIR, name)
+                if os.stat(path).st_nlink == 1:
+                    os.unlink(path)
+    return removed
+
+def print_status():
+    links = current_links()
+    if not links:
+        print(f"Aucun cache publié dans {CACHE_DIR}.")
+        return
+    for link, target in sorted(links.items()):
+        image, tool = os.path.split(os.path.relpath(link, CURRENT_DIR))
+        files = list_files(target)
+        size = sum(os.path.getsize(path) for path in files.values())
+        print(f"{image:<40} {tool:<5} version {os.path.basename(target):<4} {len(files):>7} fichier(s) "
+              f"{size / 1024 ** 2:>9.1f} Mio")
+
+def main():
+    parser = argparse.ArgumentParser(description="Caches de paquets partagés, adressés par contenu")
+    subparsers = parser.add_subparsers(dest='command')
+    publish_parser = subparsers.add_parser('publish', help="Publie un dossier pré-rempli comme nouvelle version")
+    publish_parser.add_argument('image')
+    publish_parser.add_argument('tool')
+    publish_parser.add_argument('directory')
+    maintain = subparsers.add_parser('maintain', help="Promotion des couches des utilisateurs puis nettoyage")
+    maintain.add_argument('-q', '--quiet', action='store_true')
+    remove = subparsers.add_parser('remove', help="Volumes et couches d'un utilisateur")
+    remove.add_argument('username')
+    args = parser.parse_args()
+
+    if args.command == 'publish':
+        if not os.path.isdir(args.directory):
+            print(f"Dossier introuvable: {args.directory}", file=sys.stderr)
+            sys.exit(1)
+        number = publish_tree(args.image, args.tool, args.directory)
+        print(f"Version {number} publiée." if number else "Rien de nouveau à publier.")
+    elif args.command == 'maintain':
+        published = promote()
+        removed = collect_garbage()
+        if not args.quiet or published or removed:
+            for (image, tool), number in sorted(published.items()):
+                print(f"{image}/{tool} : version {number} publiée")
+            print(f"{removed} ancienne(s) version(s) supprimée(s)")
+    elif args.command == 'remove':
+        remove_user(args.username)
+    else:
+        print_status()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Préchauffage des bureaux avant les connexions habituelles (cours à heures fixes chaque semaine).
+Le modèle apprend, sur les dernières semaines de launch_log.jsonl, la probabilité qu'un utilisateur
+se connecte dans chaque créneau de la semaine (jour, quart d'heure) : part des semaines avec une
+connexion dans ce créneau. Quelques minutes avant un créneau probable, son conteneur en veille est
+démarré (restauration CRIU si un point de reprise existe) ou dégelé, dans la limite d'un budget
+(nombre de conteneurs, CPU et mémoire réservés) et seulement si la machine garde de la marge pour
+les utilisateurs actifs. script.sh réutilise le conteneur préchauffé (fichier .prewarmed).
+Un préchauffage sans connexion dans HIT_WINDOW est un échec : le conteneur est regelé.
+Succès et échecs sont enregistrés dans launch_log.jsonl.
+Exécuter avec: python3 prewarm.py               (démon, vérification toutes les --interval secondes)
+          ou: python3 prewarm.py --predict     (prochaines connexions prévues, sans rien démarrer)
+          ou: python3 prewarm.py --report      (taux de succès des préchauffages)
+"""
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+
+import docker_api
+import launch_log
+import scheduler
+from idle_reaper import CONTAINER_PREFIX, DATA_DIR, CHECKPOINT_NAME
+
+STATE_FILE = "prewarm_state.json"
+MARKER_FILE = ".prewarmed"   # Dans le dossier de l'utilisateur, consommé par script.sh
+SLOT_MINUTES = 15            # Taille d'un créneau de la semaine
+DEFAULT_WEEKS = 8            # Historique appris
+DEFAULT_LEAD = 10            # Minutes d'avance sur le créneau prévu
+DEFAULT_THRESHOLD = 0.5      # Probabilité minimale de connexion
+MIN_OCCURRENCES = 2          # Connexions minimales dans un créneau pour le retenir
+DEFAULT_INTERVAL = 60
+DEFAULT_MAX_CONTAINERS = 10  # Conteneurs préchauffés en attente de connexion, au plus
+DEFAULT_CPU_BUDGET = 16      # Cœurs réservés (--cpus) par les conteneurs préchauffés, au plus
+DEFAULT_MEMORY_BUDGET = "32g"
+DEFAULT_MEMORY_RESERVE = 25  # % de la mémoire de la machine laissé libre pour les utilisateurs actifs
+DEFAULT_LOAD_LIMIT = 0.7     # Charge moyenne maximale (par cœur) pour préchauffer
+HIT_WINDOW = 45 * 60         # Secondes après le créneau prévu pour compter une connexion
+MODEL_REFRESH = 3600         # Secondes entre deux apprentissages
+WEEK = 7 * 86400
+
+def slot_of(ts):
+    """Créneau de la semaine (jour, quart d'heure) d'un timestamp, en heure locale"""
+    moment = datetime.fromtimestamp(ts)
+    return moment.weekday(), (moment.hour * 60 + moment.minute) // SLOT_MINUTES
+
+def slot_label(slot):
+    day, index = slot
+    minutes = index * SLOT_MINUTES
+    return f"{('lun', 'mar', 'mer', 'jeu', 'ven', 'sam', 'dim')[day]} {minutes // 60:02d}h{minutes % 60:02d}"
+
+class LoginModel:
+    """Probabilité de connexion par utilisateur et par créneau, connexions attendues par image"""
+
+    def __init__(self, weeks=DEFAULT_WEEKS):
+        self.weeks = weeks
+        self.users = {}   # utilisateur -> {créneau: probabilité}
+        self.images = {}  # image -> {créneau: connexions moyennes par semaine}
+        self.learned = 0
+
+    def learn(self, path=launch_log.LAUNCH_LOG_FILE, now=None):
+        now = now or time.time()
+        since = now - self.weeks * WEEK
+        seen = {}        # (utilisateur, créneau) -> semaines avec une connexion
+        first_login = {}
+        image_logins = {}
+        for record in launch_log.read_events(path, since):
+            if record.get('event') not in ('launch', 'reconnect') or record.get('outcome') != 'ok':
+                continue
+            ts = record.get('ts', 0)
+            if ts < since:
+                continue
+            user, slot = record.get('user'), slot_of(ts)
+            seen.setdefault((user, slot), set()).add(int((now - ts) // WEEK))
+            first_login[user] = min(first_login.get(user, ts), ts)
+            key = (record.get('image'), slot)
+            image_logins[key] = image_logins.get(key, 0) + 1
+
+        self.users = {}
+        for (user, slot), weeks_seen in seen.items():
+            if len(weeks_seen) < MIN_OCCURRENCES:
+                continue
+            # Semaines observées depuis la première connexion de l'utilisateur (nouveaux comptes)
+            observed = min(self.weeks, int((now - first_login[user]) // WEEK) + 1)
+            self.users.setdefault(user, {})[slot] = min(1.0, len(weeks_seen) / observed)
+        self.images = {}
+        for (image, slot), count in image_logins.items():
+            self.images.setdefault(image, {})[slot] = count / self.weeks
+        self.learned = now
+        return self
+
+    def predict(self, slot, threshold=DEFAULT_THRESHOLD):
+        """Utilisateurs probables dans un créneau : [(probabilité, utilisateur)], les plus probables d'abord"""
+        return sorted(((slots[slot], user) for user, slots in self.users.items()
+                       if slots.get(slot, 0) >= threshold), reverse=True)
+
+    def expected_by_image(self, slot):
+        return {image: slots[slot] for image, slots in self.images.items() if slots.get(slot)}
+
+def load_state():
+    """Préchauffages en attente de connexion : {utilisateur: {'time', 'slot_time', 'likelihood', 'action', ...}}"""
+    try:
+        with open(STATE_FILE, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Erreur lors de la lecture de {STATE_FILE}: {e}")
+        return {}
+
+def save_state(state):
+    tmp_path = f"{STATE_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, STATE_FILE)
+
+def host_has_headroom(memory_needed, memory_reserve, load_limit):
+    """Vrai si la machine locale garde de la marge après le préchauffage (mémoire disponible, charge)"""
+    try:
+        meminfo = {}
+        with open('/proc/meminfo') as f:
+            for line in f:
+                key, value = line.split(':', 1)
+                meminfo[key] = int(value.split()[0]) * 1024
+        if meminfo['MemAvailable'] - memory_needed < meminfo['MemTotal'] * memory_reserve / 100:
+            return False
+    except (OSError, KeyError, ValueError):
+        pass
+    return os.getloadavg()[0] / (os.cpu_count() or 1) < load_limit
+
+def reservations(client, name):
+    """Cœurs et octets réservés par un conteneur (--cpus, --memory)"""
+    host_config = client.inspect(name).get('HostConfig') or {}
+    cpu = host_config.get('NanoCpus', 0) / 1e9
+    if not cpu and host_config.get('CpuQuota', 0) > 0 and host_config.get('CpuPeriod'):
+        cpu = host_config['CpuQuota'] / host_config['CpuPeriod']
+    return cpu, host_config.get('Memory') or 0
+
+def warm_container(client, name, status):
+    """Démarre un conteneur arrêté (point de reprise CRIU s'il existe) ou dégèle un conteneur gelé.
+    Retourne l'action effectuée."""
+    if status == 'paused':
+        client.unpause(name)
+        return 'thaw'
+    try:
+        checkpoints = client.checkpoints(name)
+    except docker_api.DockerAPIError:
+        checkpoints = []  # Démon sans mode expérimental
+    if CHECKPOINT_NAME in checkpoints:
+        try:
+            client.start(name, timeout=120, checkpoint=CHECKPOINT_NAME)
+            restored = True
+        except docker_api.DockerAPIError:
+            restored = False
+        # Point de reprise consommé, ou inutilisable (comme dans script.sh)
+        client.remove_checkpoint(name, CHECKPOINT_NAME)
+        if restored:
+            return 'restore'
+    client.start(name, timeout=60)
+    return 'start'
+
+def mark_prewarmed(username, slot_time):
+    """Fichier lu par script.sh pour réutiliser le conteneur; .last_activity daté du créneau prévu
+    pour que idle_reaper.py ne remette pas le conteneur en veille avant l'arrivée de l'utilisateur"""
+    user_dir = os.path.join(DATA_DIR, username)
+    with open(os.path.join(user_dir, MARKER_FILE), 'w') as f:
+        f.write(str(int(time.time())))
+    activity = os.path.join(user_dir, ".last_activity")
+    with open(activity, 'a'):
+        pass
+    os.utime(activity, (slot_time, slot_time))
+
+def settle(state, now):
+    """Décide des préchauffages en attente : succès si l'utilisateur s'est connecté depuis,
+    échec si le créneau est passé depuis HIT_WINDOW (conteneur regelé)"""
+    if not state:
+        return
+    oldest = min(entry['time'] for entry in state.values())
+    logins = {}
+    for record in launch_log.read_events(since=oldest):
+        if record.get('event') in ('launch', 'reconnect') and record.get('outcome') == 'ok' \
+                and record.get('user') in state and record.get('ts', 0) >= state[record['user']]['time']:
+            logins.setdefault(record['user'], record)
+    for username, entry in list(state.items()):
+        login = logins.get(username)
+        if login is None and now < entry['slot_time'] + HIT_WINDOW:
+            continue
+        del state[username]
+        result = {'user': username, 'action': entry['action'], 'likelihood': entry['likelihood'],
+                  'slot_time': entry['slot_time']}
+        if login is not None:
+            launch_log.log_event('prewarm_result', result='hit', reused=login.get('mode') == 'prewarmed',
+                                 wait_seconds=int(login['ts'] - entry['time']), **result)
+            continue
+        launch_log.log_event('prewarm_result', result='miss', **result)
+        marker = os.path.join(DATA_DIR, username, MARKER_FILE)
+        if os.path.exists(marker):
+            os.unlink(marker)
+            try:
+                client = docker_api.get_client(entry.get('host'))
+                if client.inspect(f"{CONTAINER_PREFIX}{username}")['State']['Status'] == 'running':
+                    # Conteneur jamais utilisé : plus aucun cycle CPU, idle_reaper.py l'arrêtera ensuite
+                    client.pause(f"{CONTAINER_PREFIX}{username}")
+            except docker_api.DockerAPIError as e:
+                print(f"Impossible de regeler le conteneur de {username}: {e}")
+
+def container_statuses(host):
+    """État des conteneurs utilisateurs d'un démon ({nom: état}, vide s'il est injoignable)"""
+    try:
+        containers = docker_api.get_client(host).containers(filters={'name': [CONTAINER_PREFIX]})
+    except docker_api.DockerAPIError as e:
+        print(f"Démon {host or 'local'} injoignable: {e}")
+        return {}
+    return {c['Names'][0].lstrip('/'): c['State'] for c in containers}
+
+def run_cycle(model, args, now=None):
+    """Un passage : bilan des préchauffages en attente, puis préchauffage du créneau à venir"""
+    now = now or time.time()
+    state = load_state()
+    settle(state, now)
+
+    target = now + args.lead * 60
+    slot_time = target - target % (SLOT_MINUTES * 60)
+    candidates = model.predict(slot_of(target), args.threshold)
+    cpu_used = sum(entry.get('cpu', 0) for entry in state.values())
+    memory_used = sum(entry.get('memory', 0) for entry in state.values())
+    node_map = scheduler.load_node_map()
+    hosts = {node['name']: node['host'] for node in scheduler.load_nodes()}
+    statuses = {}
+    local_full = False
+    for likelihood, username in candidates:
+        if username in state or len(state) >= args.max_containers:
+            continue
+        host = hosts.get(node_map.get(username))
+        name = f"{CONTAINER_PREFIX}{username}"
+        if host not in statuses:
+            statuses[host] = container_statuses(host)
+        status = statuses[host].get(name)
+        if status not in ('paused', 'exited'):
+            continue  # Déjà actif, ou pas de conteneur (archivé ou jamais créé)
+        try:
+            client = docker_api.get_client(host)
+            cpu, memory = reservations(client, name)
+            if cpu_used + cpu > args.cpu_budget or memory_used + memory > args.memory_budget:
+                continue
+            if host is None and (local_full or not host_has_headroom(memory, args.memory_reserve, args.load_limit)):
+                if not local_full:
+                    print(f"Marge insuffisante sur la machine, préchauffage local suspendu ({slot_label(slot_of(target))})")
+                local_full = True
+                continue
+            action = warm_container(client, name, status)
+            mark_prewarmed(username, slot_time)
+        except (docker_api.DockerAPIError, OSError) as e:
+            print(f"Préchauffage impossible pour {username}: {e}")
+            continue
+        cpu_used += cpu
+        memory_used += memory
+        state[username] = {'time': now, 'slot_time': slot_time, 'likelihood': round(likelihood, 2),
+                           'action': action, 'host': host, 'cpu': cpu, 'memory': memory}
+        launch_log.log_event('prewarm', user=username, action=action, likelihood=round(likelihood, 2),
+                             slot_time=slot_time, host=host)
+        print(f"{datetime.now().strftime('%H:%M:%S')} - {username} préchauffé ({action}, "
+              f"probabilité {likelihood:.0%} pour {slot_label(slot_of(target))})")
+    save_state(state)
+
+def print_predictions(model, start, hours, threshold):
+    """Connexions prévues pour les prochains créneaux (sans rien démarrer)"""
+    slot_seconds = SLOT_MINUTES * 60
+    first = start - start % slot_seconds
+    shown = 0
+    for ts in range(int(first), int(start + hours * 3600), slot_seconds):
+        slot = slot_of(ts)
+        users = model.predict(slot, threshold)
+        if not users:
+            continue
+        images = model.expected_by_image(slot)
+        print(f"{datetime.fromtimestamp(ts):%a %d/%m %H:%M} : " +
+              ', '.join(f"{user} ({likelihood:.0%})" for likelihood, user in users[:12]) +
+              (f" +{len(users) - 12}" if len(users) > 12 else '') +
+              "  | attendu par image : " + ', '.join(f"{image} {count:.1f}" for image, count in
+                                                    sorted(images.items(), key=lambda i: -i[1])))
+        shown += 1
+    if not shown:
+        print(f"Aucune connexion prévue dans les {hours} prochaines heures (seuil {threshold:.0%}).")
+
+def print_report(days):
+    """Taux de succès des préchauffages, par tranche de probabilité, et part des connexions préchauffées"""
+    since = time.time() - days * 86400
+    results, logins, prewarmed_logins = [], 0, 0
+    for record in launch_log.read_events(since=since):
+        if record.get('ts', 0) < since:
+            continue
+        if record.get('event') == 'prewarm_result':
+            results.append(record)
+        elif record.get('event') in ('launch', 'reconnect') and record.get('outcome') == 'ok':
+            logins += 1
+            prewarmed_logins += record.get('mode') == 'prewarmed'
+    if not results:
+        print(f"Aucun préchauffage terminé sur les {days} derniers jours.")
+        return
+    hits = [r for r in results if r['result'] == 'hit']
+    print(f"Préchauffages sur {days} jours : {len(results)}, succès {len(hits)} ({len(hits) / len(results):.0%}), "
+          f"échecs {len(results) - len(hits)}")
+    print(f"Conteneur préchauffé réutilisé : {sum(1 for r in hits if r.get('reused'))} fois")
+    if logins:
+        print(f"Connexions servies par un préchauffage : {prewarmed_logins}/{logins} ({prewarmed_logins / logins:.0%})")
+    if hits:
+        waits = sorted(r.get('wait_seconds', 0) for r in hits)
+        print(f"Attente médiane entre préchauffage et connexion : {waits[len(waits) // 2] / 60:.0f} min")
+    # Taux de succès par tranche de probabilité, pour régler --threshold
+    print(f"\n{'probabilité':<12} {'préchauffages':>13} {'succès':>7}")
+    for low, high in ((0.9, 2), (0.8, 0.9), (0.7, 0.8), (0.6, 0.7), (0.5, 0.6), (0, 0.5)):
+        bucket = [r for r in results if low <= r['likelihood'] < high]
+        if bucket:
+            rate = sum(1 for r in bucket if r['result'] == 'hit') / len(bucket)
+            print(f"{'≥ ' + format(low, '.0%'):<12} {len(bucket):>13} {rate:>7.0%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Préchauffage des bureaux avant les connexions habituelles")
+    parser.add_argument('--once', action='store_true', help='Effectuer un seul passage puis quitter')
+    parser.add_argument('--predict', nargs='?', type=float, const=24, metavar='HEURES',
+                        help='Afficher les connexions prévues (24 h par défaut) sans rien démarrer')
+    parser.add_argument('--report', nargs='?', type=int, const=28, metavar='JOURS',
+                        help='Taux de succès des préchauffages (28 jours par défaut)')
+    parser.add_argument('-i', '--interval', type=int, default=DEFAULT_INTERVAL, help='Intervalle entre deux passages (secondes)')
+    parser.add_argument('-l', '--lead', type=int, default=DEFAULT_LEAD, help="Minutes d'avance sur le créneau prévu")
+    parser.add_argument('-s', '--threshold', type=float, default=DEFAULT_THRESHOLD, help='Probabilité minimale de connexion (0-1)')
+    parser.add_argument('-w', '--weeks', type=int, default=DEFAULT_WEEKS, help="Semaines d'historique apprises")
+    parser.add_argument('--max-containers', type=int, default=DEFAULT_MAX_CONTAINERS, help='Conteneurs préchauffés en attente, au plus')
+    parser.add_argument('--cpu-budget', type=float, default=DEFAULT_CPU_BUDGET, help='Cœurs réservés par les conteneurs préchauffés, au plus')
+    parser.add_argument('--memory-budget', default=DEFAULT_MEMORY_BUDGET, help='Mémoire réservée par les conteneurs préchauffés, au plus (ex: 32g)')
+    parser.add_argument('--memory-reserve', type=float, default=DEFAULT_MEMORY_RESERVE, help='%% de la mémoire de la machine gardé libre')
+    parser.add_argument('--load-limit', type=float, default=DEFAULT_LOAD_LIMIT, help='Charge moyenne par cœur au-delà de laquelle rien n\'est préchauffé')
+    args = parser.parse_args()
+    args.memory_budget = scheduler.parse_size(args.memory_budget)
+
+    if args.report is not None:
+        print_report(args.report)
+        return
+    model = LoginModel(args.weeks).learn()
+    if args.predict is not None:
+        print_predictions(model, time.time(), args.predict, args.threshold)
+        return
+    if args.once:
+        run_cycle(model, args)
+        return
+
+    print(f"Préchauffage actif : {len(model.users)} utilisateur(s) avec des connexions régulières, "
+          f"{args.lead} min d'avance, seuil {args.threshold:.0%}")
+    try:
+        while True:
+            cycle_start = time.time()
+            if cycle_start - model.learned > MODEL_REFRESH:
+                model.learn()
+            run_cycle(model, args)
+            time.sleep(max(1, args.interval - (time.time() - cycle_start)))
+    except KeyboardInterrupt:
+        print("Arrêt du préchauffage")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Placement des bureaux utilisateurs sur plusieurs démons Docker (nœuds).
+Les nœuds sont déclarés dans nodes.txt (adresse DOCKER_HOST, IP publique, capacités).
+Un nouvel utilisateur est placé sur le nœud joignable qui a le plus de CPU, de mémoire
+(et de GPU s'il en demande) non réservés par les conteneurs en cours. Il y reste ensuite
+(node_map.txt). Les dossiers utilisateurs restent gérés depuis cette machine : un nœud distant
+n'est retenu que s'il monte le même dossier user_data (vérifié par un conteneur éphémère).
+Les lectures-écritures de node_map.txt se font sous verrou (node_map.txt.lock) : chaque
+connexion lance son propre `scheduler.py place`.
+Sans nodes.txt, script.sh garde le démon local et n'appelle pas ce module.
+Exécuter avec: python3 scheduler.py                       (état des nœuds)
+          ou: python3 scheduler.py place USER CPU MEM [--gpu] [--image IMAGE]   (utilisé par script.sh)
+          ou: python3 scheduler.py release USER          (libère l'affectation d'un utilisateur)
+"""
+import os
+import sys
+import json
+import time
+import fcntl
+import secrets
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+import docker_api
+
+NODES_FILE = "nodes.txt"
+NODE_MAP_FILE = "node_map.txt"
+NODE_MAP_LOCK = "node_map.txt.lock"
+PROBE_TIMEOUT = 3   # secondes par appel à un nœud
+PROBE_DEADLINE = 8  # durée maximale de l'interrogation de tous les nœuds
+# Dossiers utilisateurs : script.sh et idle_reaper.py les lisent et les modifient depuis cette machine,
+# un nœud distant doit donc monter le même stockage au même chemin (NFS...)
+DATA_DIR = "user_data"
+STORAGE_ID_FILE = ".storage_id"        # Jeton aléatoire du stockage, relu par un conteneur sur le nœud
+STORAGE_CHECK_FILE = "node_storage.json"  # Nœuds dont le partage a été vérifié : {nom: {'host', 'time'}}
+STORAGE_CHECK_TTL = 600                # secondes avant de revérifier un nœud
+STORAGE_CHECK_TIMEOUT = 120            # création (téléchargement de l'image compris) et exécution
+STORAGE_CHECK_IMAGE = "busybox"        # Image de vérification si celle du bureau n'est pas indiquée
+SIZE_UNITS = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+def parse_size(value):
+    """Convertit une taille ('2g', '2.0g', '512m', octets) en octets"""
+    value = str(value).strip().lower().rstrip('b')
+    multiplier = 1
+    if value and value[-1] in SIZE_UNITS:
+        multiplier = SIZE_UNITS[value[-1]]
+        value = value[:-1]
+    return int(float(value) * multiplier)
+
+def format_size(value):
+    return f"{value / 1024 ** 3:.1f}G"
+
+def load_nodes(path=NODES_FILE):
+    """Charge le registre des nœuds.
+    Format (colonnes séparées par des espaces, '-' = valeur lue sur le démon) :
+    nom  DOCKER_HOST  ip_publique  cpus  mémoire  gpus
+    Retourne une liste de dicts dans l'ordre du fichier (vide si le fichier n'existe pas)."""
+    nodes = []
+    if not os.path.exists(path):
+        return nodes
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split()
+            if len(parts) < 2:
+                print(f"Ligne ignorée dans {path}: {line}", file=sys.stderr)
+                continue
+            parts += ['-'] * (6 - len(parts))
+            name, host, ip, cpus, memory, gpus = parts[:6]
+            try:
+                nodes.append({
+                    'name': name,
+                    'host': host,
+                    'ip': ip if ip != '-' else (urlparse(host).hostname if host.startswith(('tcp://', 'ssh://')) else ''),
+                    'cpus': float(cpus) if cpus != '-' else None,
+                    'memory': parse_size(memory) if memory != '-' else None,
+                    'gpus': int(gpus) if gpus != '-' else 0
+                })
+            except ValueError:
+                print(f"Ligne ignorée dans {path}: {line}", file=sys.stderr)
+    return nodes
+
+def is_local_node(node):
+    """Vrai si le nœud est le démon de cette machine (socket unix) : mêmes fichiers, pas de vérification"""
+    return node['host'].startswith('unix://')
+
+def load_node_map(path=NODE_MAP_FILE):
+    """Affectations utilisateur -> nœud (lignes username:nœud, comme port_map.txt)"""
+    node_map = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                if ':' in line:
+                    username, node = line.strip().split(':', 1)
+                    node_map[username] = node
+    return node_map
+
+def save_node_map(node_map, path=NODE_MAP_FILE):
+    """Réécrit les affectations de façon atomique (fichier temporaire puis renommage)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        for username, node in sorted(node_map.items()):
+            f.write(f"{username}:{node}\n")
+    os.replace(tmp_path, path)
+
+def lock_node_map(path=NODE_MAP_LOCK):
+    """Verrou exclusif sur les affectations (fichier séparé : node_map.txt est remplacé à chaque écriture).
+    Retourne le fichier verrouillé; le verrou est libéré à sa fermeture."""
+    lock = open(path, 'a')
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    return lock
+
+def get_storage_id(data_dir=DATA_DIR):
+    """Jeton du stockage des dossiers utilisateurs (créé au premier appel, jamais modifié ensuite)"""
+    path = os.path.join(data_dir, STORAGE_ID_FILE)
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    os.makedirs(data_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=data_dir, prefix=f"{STORAGE_ID_FILE}.")
+    with os.fdopen(fd, 'w') as f:
+        f.write(secrets.token_hex(16) + "\n")
+    try:
+        # Lien sans écrasement : deux premières connexions simultanées gardent le même jeton
+        os.link(tmp_path, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(tmp_path)
+    with open(path, 'r') as f:
+        return f.read().strip()
+
+def check_shared_storage(node, image=None, data_dir=DATA_DIR, timeout=STORAGE_CHECK_TIMEOUT):
+    """Vrai si le nœud voit le dossier data_dir de cette machine au même chemin : un conteneur
+    éphémère (image du bureau, présente sur le nœud de toute façon) y cherche le jeton du stockage"""
+    token = get_storage_id(data_dir)
+    client = docker_api.DockerClient(host=node['host'], pool_size=1)
+    container = client.create({
+        'Image': image or STORAGE_CHECK_IMAGE,
+        'Entrypoint': ['grep'],
+        'Cmd': ['-qxF', token, f"/data/{STORAGE_ID_FILE}"],
+        'Labels': {'rdp.role': 'storage-check'},
+        'HostConfig': {'Binds': [f"{os.path.abspath(data_dir)}:/data:ro"], 'NetworkMode': 'none'},
+    }, timeout=timeout)
+    try:
+        client.start(container, timeout=timeout)
+        return client.wait(container, timeout=timeout) == 0
+    finally:
+        client.remove(container, timeout=timeout)
+
+def load_storage_checks(path=STORAGE_CHECK_FILE):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def storage_is_shared(node, image=None):
+    """check_shared_storage avec mémorisation des succès pendant STORAGE_CHECK_TTL (node_storage.json).
+    Un nœud injoignable ou dont le conteneur de vérification échoue est considéré non partagé."""
+    checks = load_storage_checks()
+    check = checks.get(node['name'])
+    if check and check.get('host') == node['host'] and time.time() - check.get('time', 0) < STORAGE_CHECK_TTL:
+        return True
+    try:
+        shared = check_shared_storage(node, image)
+    except docker_api.DockerAPIError as e:
+        print(f"Vérification du stockage impossible sur {node['name']}: {e}", file=sys.stderr)
+        return False
+    if shared:
+        checks = load_storage_checks()
+        checks[node['name']] = {'host': node['host'], 'time': time.time()}
+        fd, tmp_path = tempfile.mkstemp(dir=".", prefix=f"{STORAGE_CHECK_FILE}.")
+        with os.fdopen(fd, 'w') as f:
+            json.dump(checks, f)
+        os.replace(tmp_path, STORAGE_CHECK_FILE)
+    return shared
+
+def probe_node(node, timeout=PROBE_TIMEOUT):
+    """Interroge un nœud : capacités (celles du registre priment) et ressources réservées
+    par ses conteneurs en cours (limites --cpus / --memory, conteneurs avec GPU)"""
+    client = docker_api.DockerClient(host=node['host'], pool_size=1)
+    info = client.request("GET", "/info", timeout=timeout)
+    usage = dict(node, online=True, error='', containers=0, cpu_used=0.0, memory_used=0, gpu_containers=0)
+    if usage['cpus'] is None:
+        usage['cpus'] = float(info.get('NCPU', 0))
+    if usage['memory'] is None:
+        usage['memory'] = int(info.get('MemTotal', 0))
+    for container in client.containers(all=False, timeout=timeout):
+        host_config = client.inspect(container['Id'], timeout=timeout).get('HostConfig') or {}
+        usage['containers'] += 1
+        if host_config.get('NanoCpus'):
+            usage['cpu_used'] += host_config['NanoCpus'] / 1e9
+        elif host_config.get('CpuQuota', 0) > 0 and host_config.get('CpuPeriod'):
+            usage['cpu_used'] += host_config['CpuQuota'] / host_config['CpuPeriod']
+        usage['memory_used'] += host_config.get('Memory') or 0
+        if any('gpu' in capability for request in host_config.get('DeviceRequests') or []
+               for capabilities in request.get('Capabilities') or [] for capability in capabilities):
+            usage['gpu_containers'] += 1
+    return usage
+
+def probe_nodes(nodes, deadline=PROBE_DEADLINE):
+    """Interroge tous les nœuds en parallèle; un nœud injoignable à temps est marqué hors ligne"""
+    offline = lambda node, error: dict(node, online=False, error=error, containers=0,
+                                       cpu_used=0.0, memory_used=0, gpu_containers=0)
+    if not nodes:
+        return []
+    executor = ThreadPoolExecutor(max_workers=len(nodes))
+    futures = [executor.submit(probe_node, node) for node in nodes]
+    wait(futures, timeout=deadline)
+    executor.shutdown(wait=False)
+    results = []
+    for node, future in zip(nodes, futures):
+        if not future.done():
+            results.append(offline(node, f"pas de réponse en {deadline}s"))
+            continue
+        try:
+            results.append(future.result())
+        except (docker_api.DockerAPIError, ValueError, KeyError, TypeError) as e:
+            results.append(offline(node, str(e)))
+    return results
+
+def node_score(usage, cpu, memory, gpu):
+    """Part libre du nœud après placement (CPU + mémoire, + GPU si demandé).
+    Retourne (tient dans les capacités, score); plus le score est grand, plus le nœud est libre."""
+    free_cpu = usage['cpus'] - usage['cpu_used'] - cpu
+    free_memory = usage['memory'] - usage['memory_used'] - memory
+    fits = free_cpu >= 0 and free_memory >= 0
+    score = free_cpu / max(usage['cpus'], 1) + free_memory / max(usage['memory'], 1)
+    if gpu:
+        # Les conteneurs GPU partagent les cartes : on répartit le nombre de conteneurs par carte
+        score += 1 - (usage['gpu_containers'] + 1) / usage['gpus']
+    return fits, score
+
+def choose_node(usages, cpu, memory, gpu):
+    """Nœud le plus libre parmi ceux en ligne (avec GPU si demandé). Un nœud où la demande
+    tient dans les capacités est toujours préféré; sinon le plus libre est surchargé."""
+    candidates = [u for u in usages if u['online'] and (not gpu or u['gpus'] > 0)]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda u: node_score(u, cpu, memory, gpu))
+
+def place_user(username, cpu, memory, gpu=False, image=None):
+    """Nœud d'un utilisateur : celui où il est déjà affecté, sinon le plus libre (affectation enregistrée).
+    Un nœud distant n'est retenu que s'il partage le dossier user_data de cette machine (storage_is_shared,
+    vérifié avec l'image du bureau). Lève RuntimeError si aucun nœud ne convient ou si le nœud de
+    l'utilisateur est injoignable ou sans stockage partagé."""
+    nodes = load_nodes()
+    if not nodes:
+        raise RuntimeError(f"Aucun nœud déclaré dans {NODES_FILE}")
+    node_map = load_node_map()
+    by_name = {node['name']: node for node in nodes}
+
+    pinned = by_name.get(node_map.get(username))
+    if pinned:
+        usage = probe_nodes([pinned])[0]
+        if not usage['online']:
+            # Ses données sont sur ce nœud : pas de déplacement automatique
+            raise RuntimeError(f"Le nœud {pinned['name']} de {username} est injoignable ({usage['error']})")
+        if gpu and not pinned['gpus']:
+            raise RuntimeError(f"Le nœud {pinned['name']} de {username} n'a pas de GPU")
+        if not is_local_node(pinned) and not storage_is_shared(pinned, image):
+            raise RuntimeError(f"Le nœud {pinned['name']} de {username} ne partage pas le dossier {DATA_DIR} "
+                               f"de cette machine")
+        return usage
+
+    usages = probe_nodes(nodes)
+    while True:
+        usage = choose_node(usages, cpu, memory, gpu)
+        if usage is None:
+            raise RuntimeError("Aucun nœud disponible" + (" avec GPU" if gpu else ""))
+        if is_local_node(usage) or storage_is_shared(usage, image):
+            break
+        # Ses dossiers seraient invisibles depuis cette machine : nœud suivant
+        print(f"Nœud {usage['name']} ignoré : dossier {DATA_DIR} non partagé", file=sys.stderr)
+        usages = [u for u in usages if u is not usage]
+    # Relecture sous verrou : une autre connexion a pu enregistrer une affectation pendant l'interrogation
+    with lock_node_map():
+        node_map = load_node_map()
+        pinned = node_map.get(username)
+        if pinned in by_name:
+            # Connexion simultanée du même utilisateur : il reste sur le nœud déjà enregistré
+            usage = next(u for u in usages if u['name'] == pinned)
+            if not usage['online']:
+                raise RuntimeError(f"Le nœud {pinned} de {username} est injoignable ({usage['error']})")
+            return usage
+        node_map[username] = usage['name']
+        save_node_map(node_map)
+    return usage
+
+def get_user_host(username):
+    """Adresse DOCKER_HOST du nœud d'un utilisateur (None : démon local ou pas encore placé)"""
+    node = load_node_map().get(username)
+    for candidate in load_nodes():
+        if candidate['name'] == node:
+            return candidate['host']
+    return None
+
+def release_user(username):
+    """Supprime l'affectation d'un utilisateur (il sera placé à nouveau à sa prochaine connexion)"""
+    with lock_node_map():
+        node_map = load_node_map()
+        if node_map.pop(username, None) is None:
+            return False
+        save_node_map(node_map)
+    return True
+
+def print_status():
+    node_map = load_node_map()
+    usages = probe_nodes(load_nodes())
+    if not usages:
+        print(f"Aucun nœud déclaré dans {NODES_FILE} : le démon Docker local est utilisé.")
+        return
+    print(f"{'NŒUD':<12} {'DOCKER_HOST':<32} {'IP':<15} {'CPU':>11} {'MÉMOIRE':>15} {'GPU':>7} {'CONT.':>5} {'UTIL.':>5}")
+    for usage in usages:
+        users = sum(1 for node in node_map.values() if node == usage['name'])
+        ip = usage['ip'] or '(locale)'
+        if not usage['online']:
+            print(f"{usage['name']:<12} {usage['host']:<32} {ip:<15} hors ligne: {usage['error']}")
+            continue
+        cpu = f"{usage['cpu_used']:.1f}/{usage['cpus']:g}"
+        memory = f"{format_size(usage['memory_used'])}/{format_size(usage['memory'])}"
+        gpus = f"{usage['gpu_containers']}/{usage['gpus']}" if usage['gpus'] else "-"
+        print(f"{usage['name']:<12} {usage['host']:<32} {ip:<15} {cpu:>11} {memory:>15} {gpus:>7} "
+              f"{usage['containers']:>5} {users:>5}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Placement des bureaux utilisateurs sur les nœuds Docker")
+    subparsers = parser.add_subparsers(dest='command')
+    place = subparsers.add_parser('place', help="Nœud d'un utilisateur (affiche nom|DOCKER_HOST|IP)")
+    place.add_argument('username')
+    place.add_argument('cpu', type=float, help='Limite CPU demandée (cœurs)')
+    place.add_argument('memory', help='Limite mémoire demandée (ex: 2g, 512m)')
+    place.add_argument('--gpu', action='store_true', help='Le conteneur utilise le GPU')
+    place.add_argument('--image', help='Image du bureau (vérification du stockage partagé sur le nœud)')
+    release = subparsers.add_parser('release', help="Supprime l'affectation d'un utilisateur")
+    release.add_argument('username')
+    args = parser.parse_args()
+
+    if args.command == 'place':
+        try:
+            usage = place_user(args.username, args.cpu, parse_size(args.memory), args.gpu, args.image)
+        except (RuntimeError, OSError, ValueError) as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        print(f"{usage['name']}|{usage['host']}|{usage['ip']}")
+    elif args.command == 'release':
+        if release_user(args.username):
+            print(f"Affectation de {args.username} supprimée.")
+        else:
+            print(f"{args.username} n'est affecté à aucun nœud.")
+    else:
+        print_status()
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,17 @@ USER_FILE="users.txt"
 PORT_FILE="port_map.txt"
 IMAGE_FILE="images.txt"
 POWER_USERS_FILE="power_users.txt"  # Nouveau fichier pour les power users
+NODES_FILE="nodes.txt"    # Nœuds Docker (scheduler.py); absent = démon local uniquement
 START_PORT=3390
 MAX_PORT=3490
 DATA_DIR="./user_data"
 INACTIVE_TIMEOUT=3600
 CLEANUP_SCRIPT="./cleanup_inactive.sh"
+ARCHIVE_DIR="./archives"  # Dossiers utilisateurs archivés par idle_reaper.py
+CHECKPOINT_NAME="idle"    # Point de reprise CRIU créé par idle_reaper.py (mode checkpoint)
+PREWARM_MARKER=".prewarmed"  # Conteneur démarré à l'avance par prewarm.py (dans le dossier de l'utilisateur)
+PKG_CACHE_DIR="./package_cache"  # Caches de paquets partagés entre conteneurs d'une même image
+SHARED_CACHE_MOUNT="/var/cache/shared"
 
 # Créer les répertoires et fichiers nécessaires
 mkdir -p "$DATA_DIR"
@@ -22,6 +28,20 @@ if [ ! -f "$POWER_USERS_FILE" ]; then
     echo "# admin" >> "$POWER_USERS_FILE"
 fi
 
+# Mesures du lancement pour launch_log.jsonl : lignes "@launch clé=valeur" sur stderr,
+# lues par app.py et retirées de la sortie affichée
+STAGE_START=$(date +%s%N)
+launch_info() {
+    echo "@launch $1=$2" >&2
+}
+
+# Durée de l'étape qui se termine (ms), puis début de la suivante
+end_stage() {
+    local now=$(date +%s%N)
+    launch_info "stage.$1" "$(( (now - STAGE_START) / 1000000 ))"
+    STAGE_START=$now
+}
+
 # Fonction pour obtenir les informations de l'image depuis le fichier de configuration
 get_image_info() {
     local image_name=$1
@@ -140,7 +160,7 @@ find_free_port() {
     
     port=$start_port
     while [ $port -le $end_port ]; do
-        if ! ss -tuln | grep -q ":$port " && ! docker ps -a --format '{{.Ports}}' | grep -q ":$port->"; then
+        if port_is_available "$port"; then
             echo "$port"
             return 0
         fi
@@ -150,10 +170,39 @@ find_free_port() {
     return 1
 }
 
+# Ports en écoute sur le nœud distant choisi (ss ne voit que cette machine), dans NODE_PORTS :
+# /proc/net du nœud lu par un conteneur éphémère sur son réseau hôte (TCP en écoute 0A, UDP 07)
+load_node_ports() {
+    local entries _ local_address state
+    entries=$(docker run --rm --network host --entrypoint sh "$1" \
+        -c 'cat /proc/net/tcp /proc/net/tcp6 /proc/net/udp /proc/net/udp6 2>/dev/null' 2>/dev/null)
+    [ -z "$entries" ] && return 1
+    NODE_PORTS=" "
+    while read -r _ local_address _ state _; do
+        if [ "$state" = "0A" ] || [ "$state" = "07" ]; then
+            NODE_PORTS="$NODE_PORTS$((16#${local_address##*:})) "
+        fi
+    done <<< "$entries"
+}
+
 # Vérifie si un port est disponible (pour les nouveaux ports uniquement)
+# DOCKER_PORTS_HINT (fourni par app.py) évite un docker ps -a par vérification
 port_is_available() {
     local port=$1
-    ! ss -tuln | grep -q ":$port " && ! docker ps -a --format '{{.Ports}}' | grep -q ":$port->"
+    if [ -n "${NODE_PORTS+x}" ]; then
+        case "$NODE_PORTS" in
+            *" $port "*) return 1 ;;
+        esac
+    else
+        ss -tuln | grep -q ":$port " && return 1
+    fi
+    if [ -n "${DOCKER_PORTS_HINT+x}" ]; then
+        case " $DOCKER_PORTS_HINT " in
+            *" $port "*) return 1 ;;
+        esac
+        return 0
+    fi
+    ! docker ps -a --format '{{.Ports}}' | grep -q ":$port->"
 }
 
 # Vérifie si un utilisateur existe
@@ -221,16 +270,52 @@ is_blocked_user() {
     return 1  # Par défaut, l'utilisateur n'est pas bloqué
 }
 
+# État du conteneur transmis par app.py (container_state.py) : "<nom>:<statut>", "absent" s'il n'existe pas.
+# Invalidé dès que le script modifie lui-même le conteneur.
+hinted_status() {
+    [ -n "$CONTAINER_STATE_HINT" ] && [ "${CONTAINER_STATE_HINT%:*}" = "$1" ] && echo "${CONTAINER_STATE_HINT##*:}"
+}
+
+invalidate_state_hint() {
+    CONTAINER_STATE_HINT=""
+}
+
 # Vérifie si un conteneur existe et est en cours d'exécution
 container_running() {
+    local status
+    if status=$(hinted_status "$1"); then
+        [ "$status" = "running" ]
+        return
+    fi
     docker ps --format '{{.Names}}' | grep -q "^$1$"
 }
 
 # Vérifie si un conteneur existe
 container_exists() {
+    local status
+    if status=$(hinted_status "$1"); then
+        [ "$status" != "absent" ]
+        return
+    fi
     docker ps -a --format '{{.Names}}' | grep -q "^$1$"
 }
 
+# Vérifie si un conteneur est gelé (docker pause)
+container_paused() {
+    [ "$(docker inspect -f '{{.State.Paused}}' "$1" 2>/dev/null)" = "true" ]
+}
+
+# Restaure le dossier d'un utilisateur archivé par idle_reaper.py après une longue inactivité
+restore_user_archive() {
+    local username=$1
+    local archive="$ARCHIVE_DIR/$username.tar.gz"
+    
+    if [ -f "$archive" ] && [ ! -d "$DATA_DIR/$username" ]; then
+        mkdir -p "$DATA_DIR"
+        tar -xzf "$archive" -C "$DATA_DIR" && rm -f "$archive"
+    fi
+}
+
 # Parse les volumes supplémentaires définis dans le fichier images.txt
 parse_volumes() {
     local image_name=$1
@@ -274,77 +359,97 @@ parse_other_extra_params() {
     
     if [ -n "$extra_params" ]; then
         # Filtrer pour enlever les mappages de ports (-p) qui sont traités séparément
-        other_params=$(echo "$extra_params" | sed 's/-p [0-9]*:[0-9]* //g')
+        # ainsi que les options de cache (--pkg-cache) qui ne sont pas des options docker
+        other_params=$(echo "$extra_params" | sed 's/-p [0-9]*:[0-9]* //g; s/--pkg-cache[^ ]*//g')
     fi
     
     echo "$other_params"
 }
 
-# Création du script de nettoyage périodique
-create_cleanup_script() {
-    cat > "$CLEANUP_SCRIPT" << 'EOL'
-#!/bin/bash
-CONTAINER_PREFIX="gui_user_"
-INACTIVE_TIMEOUT=3600  # 1 heure
-LOG_FILE="cleanup.log"
-SUSPENDED_FILE="suspended_containers.txt"
-DATA_DIR="./user_data"
-
-echo "$(date) - Démarrage du nettoyage des conteneurs inactifs" | tee -a "$LOG_FILE"
+# Récupère la liste des caches de paquets partagés demandés pour une image
+# (option --pkg-cache=bun,npm,pip,apt dans extra_params de images.txt)
+get_package_caches() {
+    local image_name=$1
+    [ -f "$IMAGE_FILE" ] || return 0
+    grep "^$image_name:" "$IMAGE_FILE" | grep -o -- '--pkg-cache=[a-z,]*' | head -n 1 | cut -d'=' -f2 | tr ',' ' '
+}
 
-# Parcourir tous les conteneurs actifs
-for container in $(docker ps --filter "name=$CONTAINER_PREFIX" --format "{{.Names}}"); do
-    username=${container#${CONTAINER_PREFIX}}
-    
-    # Vérifier l'activité RDP
-    connections=$(docker exec "$container" netstat -ant 2>/dev/null | grep -E ":(3389|3390)" | grep "ESTABLISHED" | wc -l)
+# Construit les options docker (-v/-e) pour monter les caches de paquets partagés.
+# Un cache par image et par outil, adressé par contenu et publié par versions (pkg_cache.py) :
+# la version courante (package_cache/current/<image>/<outil>) sert de couche inférieure en lecture
+# seule, jamais modifiée une fois publiée; une nouvelle version n'est montée qu'à la création suivante
+# du conteneur. Chaque utilisateur écrit dans sa propre couche (volume overlay, $DATA_DIR/<user>_pkgcache),
+# d'où pkg_cache.py ne promeut dans le cache partagé que des fichiers vérifiables.
+parse_package_caches() {
+    local image_name=$1
+    local username=$2
+    local cache_params=""
+    local volume_image=${image_name//[^a-zA-Z0-9_.-]/_}
+    local cache_root="$PWD/${PKG_CACHE_DIR#./}"
     
-    if [ "$connections" -eq 0 ]; then
-        # Créer un fichier de timestamp pour la dernière activité si nécessaire
-        activity_file="$DATA_DIR/$username/.last_activity"
+    for tool in $(get_package_caches "$image_name"); do
+        local container_dir="$SHARED_CACHE_MOUNT/$tool"
         
-        # Si fichier d'activité n'existe pas, le créer avec le timestamp actuel
-        if ! docker exec "$container" test -f "/home/$username/.last_activity" 2>/dev/null; then
-            docker exec "$container" bash -c "echo $(date +%s) > /home/$username/.last_activity" 2>/dev/null
-            continue  # Passer à l'itération suivante car nous venons de créer le fichier
-        fi
-        
-        # Récupérer le timestamp de dernière activité
-        last_timestamp=$(docker exec "$container" cat "/home/$username/.last_activity" 2>/dev/null)
-        current_timestamp=$(date +%s)
+        case "$tool" in
+            bun) cache_params="$cache_params -e BUN_INSTALL_CACHE_DIR=$container_dir" ;;
+            npm) cache_params="$cache_params -e npm_config_cache=$container_dir" ;;
+            pip) cache_params="$cache_params -e PIP_CACHE_DIR=$container_dir" ;;
+            apt) container_dir="/var/cache/apt/archives" ;;
+            *) continue ;;  # Outil inconnu, ignoré
+        esac
         
-        # Si la récupération a échoué, utiliser la date de démarrage du conteneur
-        if [ -z "$last_timestamp" ] || ! [[ "$last_timestamp" =~ ^[0-9]+$ ]]; then
-            last_activity=$(docker inspect --format='{{.State.StartedAt}}' "$container")
-            last_timestamp=$(date -d "$last_activity" +%s)
+        # Version courante figée au moment de la création du volume (0 : rien de publié)
+        local shared_dir version
+        shared_dir=$(readlink -f "$cache_root/current/$image_name/$tool" 2>/dev/null)
+        if [ -n "$shared_dir" ] && [ -d "$shared_dir" ]; then
+            version=${shared_dir##*/}
+        else
+            shared_dir="$cache_root/empty"
+            version=0
+            mkdir -p "$shared_dir"
         fi
-        
-        inactive_time=$((current_timestamp - last_timestamp))
-        
-        if [ "$inactive_time" -gt "$INACTIVE_TIMEOUT" ]; then
-            echo "Conteneur $container inactif depuis $(($inactive_time / 60)) minutes, arrêt..." | tee -a "$LOG_FILE"
-            
-            # Arrêter le conteneur
-            docker stop "$container" >> "$LOG_FILE" 2>&1
-            
-            # Enregistrer le conteneur comme suspendu
-            grep -q "^$container$" "$SUSPENDED_FILE" || echo "$container" >> "$SUSPENDED_FILE"
+        local private_dir="$PWD/${DATA_DIR#./}/${username}_pkgcache/$image_name/$tool/$version"
+        mkdir -p "$private_dir/upper" "$private_dir/work"
+        local volume="rdp_pkgcache_${username}_${volume_image}_${tool}_v${version}"
+        if ! docker volume create --driver local --opt type=overlay --opt device=overlay \
+            --opt "o=lowerdir=$shared_dir,upperdir=$private_dir/upper,workdir=$private_dir/work" \
+            --label rdp.role=pkgcache --label "rdp.user=$username" \
+            "$volume" >/dev/null 2>&1; then
+            continue  # Volume impossible à créer : pas de cache plutôt qu'un cache partagé en écriture
         fi
-    else
-        # Mettre à jour le timestamp de dernière activité
-        docker exec "$container" bash -c "echo $(date +%s) > /home/$username/.last_activity" 2>/dev/null
-    fi
-done
+        
+        cache_params="$cache_params -v $volume:$container_dir"
+    done
+    
+    echo "$cache_params"
+}
+
+# Création du script de nettoyage périodique
+create_cleanup_script() {
+    cat > "$CLEANUP_SCRIPT" << 'EOL'
+#!/bin/bash
+# Passage unique du démon de mise en veille (idle_reaper.py), lancé par le cron.
+# Si le démon tourne déjà en continu, il n'y a rien à faire.
+# Avant cela, entretien du cache de paquets partagé : promotion des couches utilisateur, versions et
+# volumes inutilisés supprimés (pkg_cache.py).
+cd "$(dirname "$0")" || exit 1
+PID_FILE="idle_reaper.pid"
+
+python3 ./pkg_cache.py maintain --quiet
 
-echo "$(date) - Fin du nettoyage" | tee -a "$LOG_FILE"
+if [ -f "$PID_FILE" ] && kill -0 "$(cat "$PID_FILE")" 2>/dev/null; then
+    exit 0
+fi
+
+exec python3 ./idle_reaper.py --once --quiet
 EOL
 
     chmod +x "$CLEANUP_SCRIPT"
     
-    # Vérifier si la tâche cron existe déjà
-    if ! (crontab -l 2>/dev/null | grep -q "$CLEANUP_SCRIPT"); then
-    # Ajouter la tâche cron pour exécuter le script toutes les heures
-    (crontab -l 2>/dev/null || echo "") | { cat; echo "0 * * * * $PWD/$CLEANUP_SCRIPT >> $PWD/cleanup.log 2>&1"; } | crontab -
+    # Tâche cron toutes les 5 minutes; une ancienne ligne (ex. horaire) est remplacée
+    local cron_line="*/5 * * * * $PWD/$CLEANUP_SCRIPT >> $PWD/cleanup.log 2>&1"
+    if ! (crontab -l 2>/dev/null | grep -qxF "$cron_line"); then
+        (crontab -l 2>/dev/null | grep -vF "$CLEANUP_SCRIPT"; echo "$cron_line") | crontab -
     fi
 }
 
@@ -361,6 +466,11 @@ create_gpu_test_script() {
 #!/bin/bash
 echo \"==== Test GPU avec CuPy ====\"
 echo \"Date: \$(date)\"
+
+# Utiliser le cache pip partagé s'il est monté (sudo ne conserve pas PIP_CACHE_DIR)
+if [ -d $SHARED_CACHE_MOUNT/pip ]; then
+    export PIP_CACHE_DIR=$SHARED_CACHE_MOUNT/pip
+fi
 echo \"Utilisateur: \$(whoami)\"
 echo \"\" 
 
@@ -550,6 +660,64 @@ clean_config_files() {
     rm -f "$user_dir/.config/autostart/xfce4-session-logout.desktop" 2>/dev/null
 }
 
+# Réactive un conteneur mis en veille par idle_reaper.py au lieu de le recréer (pas de démarrage à froid) :
+# dégel d'un conteneur gelé, ou restauration CRIU d'un conteneur suspendu par point de reprise.
+# Uniquement si l'image et l'option GPU correspondent à la demande; renvoie 1 sinon.
+resume_container() {
+    local container_name=$1
+    local username=$2
+    local user_password=$3
+    local image_name=$4
+    local use_gpu=$5
+    local cpu_limit=$6
+    local memory_limit=$7
+    
+    local state=$(docker inspect -f '{{.State.Status}}|{{.Config.Image}}|{{index .Config.Labels "rdp.gpu"}}' "$container_name" 2>/dev/null)
+    local status=${state%%|*}
+    if [ "${state#*|}" != "$image_name|$use_gpu" ]; then
+        return 1
+    fi
+    
+    case "$status" in
+        paused)
+            docker unpause "$container_name" >/dev/null 2>&1 || return 1
+            launch_info mode unpaused
+            echo "♻️ Ton bureau était en veille, il a été réactivé instantanément."
+            ;;
+        exited)
+            # Restauration du point de reprise CRIU (applications ouvertes conservées)
+            docker checkpoint ls "$container_name" 2>/dev/null | grep -qw "^$CHECKPOINT_NAME" || return 1
+            if ! docker start --checkpoint "$CHECKPOINT_NAME" "$container_name" >/dev/null 2>&1; then
+                docker checkpoint rm "$container_name" "$CHECKPOINT_NAME" >/dev/null 2>&1
+                return 1
+            fi
+            # Le point de reprise est consommé: un prochain démarrage ne doit pas revenir en arrière
+            docker checkpoint rm "$container_name" "$CHECKPOINT_NAME" >/dev/null 2>&1
+            launch_info mode restored
+            echo "♻️ Ta session a été restaurée avec tes applications ouvertes."
+            ;;
+        running)
+            # Démarré à l'avance par prewarm.py : réutilisé (sinon un conteneur actif est recréé)
+            [ -f "$DATA_DIR/$username/$PREWARM_MARKER" ] || return 1
+            launch_info mode prewarmed
+            echo "⚡ Ton bureau a été préparé avant ton arrivée, il est déjà prêt."
+            ;;
+        *)
+            return 1
+            ;;
+    esac
+    invalidate_state_hint
+    
+    # Signaler la connexion à idle_reaper.py pour éviter une nouvelle mise en veille immédiate
+    date +%s > "$DATA_DIR/$username/.last_activity" 2>/dev/null
+    
+    # Appliquer le mot de passe et les limites de ressources demandés
+    echo "$username:$user_password" | docker exec -i "$container_name" chpasswd >/dev/null 2>&1
+    docker update --cpus="$cpu_limit" --memory="$memory_limit" "$container_name" >/dev/null 2>&1 || true
+    
+    return 0
+}
+
 # Fonction pour lancer un conteneur avec ou sans GPU
 run_container() {
     local container_name=$1
@@ -567,6 +735,7 @@ run_container() {
     if container_exists "$container_name"; then
         docker stop ${container_name} >/dev/null 2>&1 || true
         docker rm ${container_name} >/dev/null 2>&1 || true
+        invalidate_state_hint
         
         # Petite pause pour s'assurer que le système a libéré le port
         sleep 1
@@ -579,6 +748,7 @@ run_container() {
     local extra_port_params=$(parse_extra_ports "$image_name")
     local extra_volume_params=$(parse_volumes "$image_name")
     local other_params=$(parse_other_extra_params "$image_name")
+    local cache_params=$(parse_package_caches "$image_name" "$username")
     
     
     # Créer le répertoire de données utilisateur s'il n'existe pas
@@ -614,6 +784,7 @@ run_container() {
     # Lancer ou redémarrer le conteneur (toujours avec la même méthode)
     docker run -dit \
         --name "$container_name" \
+        --label "rdp.gpu=$use_gpu" \
         $gpu_params \
         -p "$user_port:$rdp_port" \
         $extra_port_params \
@@ -623,6 +794,7 @@ run_container() {
         -v "$DATA_DIR/$username:/home/$username" \
         -v "$DATA_DIR/${username}_config:/etc/skel" \
         $extra_volume_params \
+        $cache_params \
         -e NVIDIA_VISIBLE_DEVICES=all \
         -e NVIDIA_DRIVER_CAPABILITIES=all \
         --restart unless-stopped \
@@ -633,6 +805,8 @@ run_container() {
     
     # Vérifier si le conteneur a bien démarré
     if [ $? -eq 0 ]; then
+        launch_info mode created
+        [ "$use_gpu" = "true" ] && launch_info gpu_devices all
         # Attente que le service soit prêt
         sleep 3
         
@@ -725,7 +899,8 @@ gpu_memory_limit=""
 
 if [[ "$use_gpu_choice" =~ ^[oOyY]$ ]]; then
     use_gpu="true"
-    if command -v nvidia-smi &> /dev/null; then
+    # Avec plusieurs nœuds, le GPU est sur le nœud choisi (pas forcément sur cette machine)
+    if command -v nvidia-smi &> /dev/null || [ -f "$NODES_FILE" ]; then
         read -p "Limite mémoire GPU en MiB (laissez vide pour aucune limite) : " gpu_memory_limit
         
         # Vérifier si la valeur entrée est un nombre
@@ -761,6 +936,47 @@ if [ "$is_valid" != "true" ]; then
     echo "❌ Mot de passe incorrect."
     exit 1
 fi
+end_stage auth
+
+# Choisir le nœud Docker de l'utilisateur (nodes.txt, scheduler.py) : toutes les commandes docker
+# suivantes visent ce nœud. Sans nodes.txt, le démon local est utilisé.
+node_ip=""
+remote_node="false"
+if [ -f "$NODES_FILE" ]; then
+    gpu_flag=""
+    [ "$use_gpu" = "true" ] && gpu_flag="--gpu"
+    # Un nœud distant n'est retenu que s'il partage user_data : les étapes suivantes (restauration,
+    # dossiers, marqueurs) se font depuis cette machine
+    placement=$(python3 scheduler.py place "$username" "$cpu_limit" "$memory_limit" $gpu_flag --image "$image_name" 2>&1)
+    placement_status=$?
+    placement=$(tail -n 1 <<< "$placement")
+    if [ $placement_status -ne 0 ]; then
+        echo "❌ $placement"
+        exit 1
+    fi
+    IFS='|' read -r node_name node_host node_ip <<< "$placement"
+    if [ "$node_host" != "${DOCKER_HOST:-unix:///var/run/docker.sock}" ]; then
+        # L'état transmis par app.py décrit le démon local, pas ce nœud
+        invalidate_state_hint
+        unset DOCKER_PORTS_HINT
+    fi
+    export DOCKER_HOST="$node_host"
+    [[ "$node_host" != unix://* ]] && remote_node="true"
+    launch_info node "$node_name"
+    end_stage placement
+fi
+
+# Verrou partagé avec idle_reaper.py, tenu jusqu'à la fin du script : le dossier de l'utilisateur
+# ne peut pas être archivé (puis supprimé) entre la restauration et le démarrage du conteneur
+mkdir -p "$ARCHIVE_DIR"
+exec 9>>"$ARCHIVE_DIR/$username.lock"
+if ! flock -w 300 9; then
+    echo "❌ Ton dossier est en cours d'archivage. Réessaie dans quelques minutes."
+    exit 1
+fi
+
+# Restaurer le dossier de l'utilisateur s'il a été archivé
+restore_user_archive "$username"
 
 # Récupérer l'image associée à l'utilisateur
 stored_image=$(get_user_image "$username")
@@ -771,11 +987,14 @@ if [ -n "$stored_image" ] && [ "$stored_image" != "$image_name" ]; then
     if container_exists "${CONTAINER_PREFIX}${username}"; then
         docker stop "${CONTAINER_PREFIX}${username}" >/dev/null 2>&1 || true
         docker rm "${CONTAINER_PREFIX}${username}" >/dev/null 2>&1 || true
+        invalidate_state_hint
     fi
     
     # Supprimer complètement le répertoire de l'utilisateur
     rm -rf "$DATA_DIR/$username" 2>/dev/null
     rm -rf "$DATA_DIR/${username}_config" 2>/dev/null
+    # Volumes et couches de cache de paquets de l'ancienne image (fichiers vérifiables promus avant)
+    python3 ./pkg_cache.py remove "$username" >/dev/null 2>&1 || true
     
     # Recréer les répertoires vides
     mkdir -p "$DATA_DIR/$username"
@@ -789,6 +1008,7 @@ elif [ -z "$stored_image" ]; then
 fi
 
 echo "✅ Connexion réussie.$power_user_status"
+end_stage prepare
 
 # Container associé à l'utilisateur
 container_name="${CONTAINER_PREFIX}${username}"
@@ -796,7 +1016,11 @@ container_name="${CONTAINER_PREFIX}${username}"
 # Récupérer le port associé à l'utilisateur
 user_port=$(get_user_port "$username")
 
-# Pour un NOUVEAU conteneur uniquement, vérifier si le port est disponible
+# Pour un NOUVEAU conteneur uniquement, vérifier si le port est disponible (sur le nœud choisi)
+if [ "$remote_node" = "true" ] && ! container_exists "$container_name" && ! load_node_ports "$image_name"; then
+    echo "❌ Impossible de lire les ports en écoute du nœud $node_name."
+    exit 1
+fi
 if ! container_exists "$container_name" && ! port_is_available "$user_port"; then
     new_port=$(find_free_port)
     if [ $? -eq 0 ]; then
@@ -808,16 +1032,23 @@ if ! container_exists "$container_name" && ! port_is_available "$user_port"; the
     fi
 fi
 
+launch_info port "$user_port"
+launch_info gpu "$use_gpu"
+
 # Récupération du port RDP spécifique à l'image
 rdp_port=$(get_image_info "$image_name" "port")
 [ -z "$rdp_port" ] && rdp_port="3390"  # Valeur par défaut si non spécifiée
 
-# Lancer ou redémarrer le conteneur avec les limites de ressources
-if run_container "$container_name" "$username" "$password" "$image_name" "$user_port" "$rdp_port" "$use_gpu" "$cpu_limit" "$memory_limit" "$gpu_memory_limit"; then
+# Dégeler le conteneur s'il est en veille (ou le reprendre s'il a été préchauffé), sinon le lancer
+# ou le redémarrer avec les limites de ressources
+if resume_container "$container_name" "$username" "$password" "$image_name" "$use_gpu" "$cpu_limit" "$memory_limit" || \
+   run_container "$container_name" "$username" "$password" "$image_name" "$user_port" "$rdp_port" "$use_gpu" "$cpu_limit" "$memory_limit" "$gpu_memory_limit"; then
+    end_stage container
     # Créer le script de nettoyage
     create_cleanup_script >/dev/null 2>&1
 
-    IP=$(hostname -I | awk '{print $1}')
+    # IP publique du nœud choisi, sinon celle de cette machine
+    IP=${node_ip:-$(hostname -I | awk '{print $1}')}
     image_display_name=$(get_image_info "$image_name" "name")
 
     if [[ "$image_name" == "olilanz/pinokio3-unraid-nvidia" ]]; then
@@ -871,5 +1102,13 @@ if run_container "$container_name" "$username" "$password" "$image_name" "$user_
     fi
 
 else
+    end_stage container
     echo "❌ Échec du démarrage du conteneur. Vérifie les paramètres et réessaie."
-fi
\ No newline at end of file
+    launch_failed=1
+fi
+
+# Le préchauffage ne vaut que pour cette connexion
+rm -f "$DATA_DIR/$username/$PREWARM_MARKER"
+
+# Code de sortie lu par app.py (/metrics, journal des lancements)
+[ -z "$launch_failed" ] || exit 1
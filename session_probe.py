@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Détection des sessions RDP actives en lisant directement, depuis l'hôte,
+les tables TCP de l'espace réseau de chaque conteneur (/proc/<pid>/net/tcp et tcp6).
+Aucun `docker exec` n'est nécessaire : un seul `docker inspect` alimente un inventaire
+en cache (PID init et image de chaque conteneur).
+Exécuter avec: python3 session_probe.py   (affiche le nombre de sessions par conteneur)
+"""
+import os
+import re
+import time
+import logging
+import subprocess
+import threading
+
+CONTAINER_PREFIX = "gui_user_"
+IMAGE_FILE = "images.txt"
+DEFAULT_RDP_PORTS = (3389, 3390)
+INVENTORY_TTL = 60  # secondes
+
+log = logging.getLogger(__name__)
+
+# Inventaire en cache: {nom: {'id': str, 'pid': int, 'image': str}}
+_inventory = {}
+_inventory_time = 0
+_inventory_lock = threading.Lock()
+
+# Ports par image (images.txt), relus seulement si le fichier change
+_image_ports = {}
+_image_ports_mtime = None
+
+def get_image_ports():
+    """Récupère, pour chaque image de images.txt, son port RDP et ses ports de services
+    supplémentaires (ports conteneur des options -p HOTE:CONTENEUR)"""
+    global _image_ports, _image_ports_mtime
+    try:
+        mtime = os.path.getmtime(IMAGE_FILE)
+    except OSError:
+        return {}
+    if mtime == _image_ports_mtime:
+        return _image_ports
+
+    image_ports = {}
+    try:
+        with open(IMAGE_FILE, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                parts = line.split(':')
+                rdp_ports = set(DEFAULT_RDP_PORTS)
+                if len(parts) > 2 and parts[2].isdigit():
+                    rdp_ports = {int(parts[2])}
+                extra_ports = set(int(m) for m in re.findall(r'-p \d+:(\d+)', line))
+                image_ports[parts[0]] = {'rdp': rdp_ports, 'extra': extra_ports - rdp_ports}
+    except Exception as e:
+        log.warning(f"Erreur lors de la lecture des ports des images: {e}")
+
+    _image_ports = image_ports
+    _image_ports_mtime = mtime
+    return image_ports
+
+def refresh_inventory(timeout=5):
+    """Recharge l'inventaire des conteneurs en cours d'exécution (un seul docker inspect)"""
+    global _inventory, _inventory_time
+    names = subprocess.run(
+        ["docker", "ps", "--filter", f"name={CONTAINER_PREFIX}", "--format", "{{.Names}}"],
+        capture_output=True, text=True, timeout=timeout
+    ).stdout.split()
+    names = [n for n in names if n.startswith(CONTAINER_PREFIX)]
+
+    inventory = {}
+    if names:
+        output = subprocess.run(
+            ["docker", "inspect", "--format", "{{.Name}}|{{.Id}}|{{.State.Pid}}|{{.Config.Image}}"] + names,
+            capture_output=True, text=True, timeout=timeout
+        ).stdout
+        for line in output.splitlines():
+            parts = line.strip().lstrip('/').split('|')
+            if len(parts) == 4 and parts[2].isdigit() and int(parts[2]) > 0:
+                inventory[parts[0]] = {'id': parts[1], 'pid': int(parts[2]), 'image': parts[3]}
+
+    with _inventory_lock:
+        _inventory = inventory
+        _inventory_time = time.time()
+    return inventory
+
+def get_inventory(max_age=INVENTORY_TTL):
+    """Retourne l'inventaire en cache, rechargé s'il est trop ancien
+    ou si le PID d'un conteneur n'existe plus (conteneur redémarré)"""
+    with _inventory_lock:
+        inventory = _inventory
+        age = time.time() - _inventory_time
+    stale = age > max_age or any(not os.path.exists(f"/proc/{c['pid']}") for c in inventory.values())
+    if stale:
+        inventory = refresh_inventory()
+    return inventory
+
+def count_established(tcp_table, ports):
+    """Compte les connexions ESTABLISHED sur les ports locaux donnés
+    à partir du contenu de /proc/net/tcp ou /proc/net/tcp6"""
+    return count_in_state(tcp_table, ports, '01')
+
+def count_in_state(tcp_table, ports, state):
+    """Compte les sockets dans un état TCP donné ('01' = ESTABLISHED, '0A' = LISTEN)
+    sur les ports locaux donnés"""
+    count = 0
+    for line in tcp_table.splitlines():
+        fields = line.split()
+        # Format: sl local_address rem_address st ...
+        if len(fields) < 4 or ':' not in fields[1]:
+            continue
+        try:
+            local_port = int(fields[1].rsplit(':', 1)[1], 16)
+        except ValueError:
+            continue
+        if fields[3] == state and local_port in ports:
+            count += 1
+    return count
+
+def read_tcp_tables(pid):
+    """Lit les tables TCP (IPv4 et IPv6) de l'espace réseau d'un processus"""
+    tables = []
+    for name in ('tcp', 'tcp6'):
+        try:
+            with open(f"/proc/{pid}/net/{name}", 'r') as f:
+                tables.append(f.read())
+        except FileNotFoundError:
+            continue  # IPv6 désactivé dans le conteneur
+    if not tables:
+        raise OSError(f"Tables TCP introuvables pour le PID {pid}")
+    return "\n".join(tables)
+
+def get_container_sessions(pid, image):
+    """Compte les sessions d'un conteneur: connexions RDP et connexions aux services supplémentaires"""
+    ports = get_image_ports().get(image, {'rdp': set(DEFAULT_RDP_PORTS), 'extra': set()})
+    tables = read_tcp_tables(pid)
+    return {
+        'rdp': count_established(tables, ports['rdp']),
+        'extra': count_established(tables, ports['extra']) if ports['extra'] else 0
+    }
+
+def get_session_counts(container_names=None):
+    """Retourne {nom: {'rdp': n, 'extra': m}} pour les conteneurs en cours d'exécution.
+    Les conteneurs dont les tables ne sont pas lisibles sont absents du résultat."""
+    inventory = get_inventory()
+    if container_names is not None:
+        missing = [n for n in container_names if n not in inventory]
+        if missing and time.time() - _inventory_time > 1:
+            inventory = refresh_inventory()
+        names = [n for n in container_names if n in inventory]
+    else:
+        names = list(inventory)
+
+    sessions = {}
+    for name in names:
+        try:
+            sessions[name] = get_container_sessions(inventory[name]['pid'], inventory[name]['image'])
+        except OSError:
+            continue  # Conteneur arrêté entre-temps ou /proc inaccessible
+    return sessions
+
+if __name__ == "__main__":
+    start = time.time()
+    counts = get_session_counts()
+    for name, count in sorted(counts.items()):
+        print(f"{name}: {count['rdp']} session(s) RDP, {count['extra']} connexion(s) aux services")
+    print(f"{len(counts)} conteneur(s) vérifié(s) en {(time.time() - start) * 1000:.1f} ms")
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Réveil spéculatif du bureau pendant la saisie du mot de passe.
+La page de connexion appelle /check_power_user dès que le nom d'utilisateur est saisi : si ce compte
+a un conteneur gelé ou arrêté sur le démon local, avec l'image et l'option GPU choisies, il est dégelé
+ou démarré en tâche de fond (restauration CRIU si possible). Quand /execute arrive, script.sh le
+réutilise (fichier .prewarmed, comme pour prewarm.py) au lieu d'attendre son démarrage.
+Un réveil non réclamé par une connexion réussie dans CLAIM_TIMEOUT est annulé : conteneur regelé,
+arrêté ou remis en point de reprise CRIU, selon l'état de départ.
+Le nom d'utilisateur n'est pas authentifié à ce stade, d'où les garde-fous : WAKES_PER_IP réveils par
+minute et par IP, MAX_PENDING réveils en attente, budget mémoire, marge de la machine, et délai
+avant de réveiller à nouveau un compte dont le réveil a été annulé.
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import docker_api
+import container_state
+import launch_log
+import prewarm
+import scheduler
+from idle_reaper import CONTAINER_PREFIX, DATA_DIR, checkpoint_container
+
+CLAIM_TIMEOUT = 120        # secondes pour réclamer un réveil (saisie du mot de passe, nouvel essai)
+WAKE_WAIT = 60             # secondes d'attente max dans /execute pour un réveil encore en cours
+MAX_PENDING = 5            # réveils en attente de connexion, au plus
+MEMORY_BUDGET = 16 * 1024 ** 3  # mémoire réservée (--memory) par les réveils en attente, au plus
+MEMORY_RESERVE = 25        # % de la mémoire de la machine gardé libre
+LOAD_LIMIT = 0.8           # charge moyenne par cœur au-delà de laquelle rien n'est réveillé
+WAKES_PER_IP = 3           # réveils par minute et par IP
+RETRY_COOLDOWN = 600       # secondes avant de réveiller à nouveau un compte dont le réveil a été annulé
+MAX_TRACKED_IPS = 10000
+WORKERS = 2
+
+class SpeculativeWaker:
+    """Réveils en attente : {utilisateur: {'time', 'status', 'action', 'memory', 'claiming', 'done'}}"""
+
+    def __init__(self):
+        self.pending = {}
+        self.ip_wakes = {}
+        self.cancelled = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=WORKERS)
+
+    def request_wake(self, username, image, gpu, ip):
+        """Décide d'un réveil sans attendre (appelé par /check_power_user); le réveil se fait en tâche de fond.
+        Retourne True si un réveil est lancé."""
+        name = f"{CONTAINER_PREFIX}{username}"
+        state = container_state.get_cache(wait=0).get(name)
+        # Conteneur en veille avec la bonne image (sinon script.sh le recrée de toute façon)
+        if not state or state['status'] not in ('paused', 'exited') or state['image'] != image:
+            return False
+        # Seulement le démon local : un nœud distant n'est pas suivi par le cache d'état
+        if scheduler.get_user_host(username) is not None:
+            return False
+        now = time.time()
+        with self.lock:
+            if username in self.pending or now - self.cancelled.get(username, 0) < RETRY_COOLDOWN:
+                return False
+            if len(self.pending) >= MAX_PENDING:
+                return False
+            if len(self.ip_wakes) >= MAX_TRACKED_IPS:
+                self.ip_wakes = {key: times for key, times in self.ip_wakes.items() if now - times[-1] < 60}
+            times = [t for t in self.ip_wakes.get(ip, []) if now - t < 60]
+            if len(times) >= WAKES_PER_IP:
+                return False
+            self.ip_wakes[ip] = times + [now]
+            self.pending[username] = {'time': now, 'status': state['status'], 'action': None, 'memory': 0,
+                                      'claiming': False, 'done': threading.Event()}
+        self.executor.submit(self._wake, username, name, state['status'], gpu)
+        return True
+
+    def _wake(self, username, name, status, gpu):
+        with self.lock:
+            entry = self.pending.get(username)
+        if entry is None:
+            return
+        action = None
+        try:
+            client = docker_api.get_client()
+            info = client.inspect(name)
+            memory = (info.get('HostConfig') or {}).get('Memory') or 0
+            labels = (info.get('Config') or {}).get('Labels') or {}
+            with self.lock:
+                reserved = sum(p['memory'] for p in self.pending.values())
+            if labels.get('rdp.gpu') == ('true' if gpu else 'false') and reserved + memory <= MEMORY_BUDGET \
+                    and prewarm.host_has_headroom(memory, MEMORY_RESERVE, LOAD_LIMIT):
+                action = prewarm.warm_container(client, name, status)
+                prewarm.mark_prewarmed(username, time.time())
+        except (docker_api.DockerAPIError, OSError) as e:
+            print(f"Réveil spéculatif impossible pour {username}: {e}")
+        with self.lock:
+            if action is None:
+                self.pending.pop(username, None)
+            else:
+                entry.update(action=action, memory=memory)
+            # Réclamé pendant le réveil (/execute a cessé d'attendre) : rien à annuler
+            claimed = self.pending.get(username) is not entry
+        if action is not None:
+            launch_log.log_event('speculative_wake', user=username, action=action)
+        entry['done'].set()
+        if action is None or claimed:
+            return
+        timer = threading.Timer(CLAIM_TIMEOUT, self._expire, (username,))
+        timer.daemon = True
+        timer.start()
+
+    def settle(self, username, timeout=WAKE_WAIT):
+        """Appelé par /execute avant script.sh : attend la fin d'un réveil en cours (script.sh ne doit pas
+        voir un conteneur en plein démarrage) et empêche son annulation pendant la connexion"""
+        with self.lock:
+            entry = self.pending.get(username)
+            if entry is None:
+                return
+            entry['claiming'] = True
+        entry['done'].wait(timeout)
+
+    def claim(self, username, success):
+        """Appelé par /execute après script.sh : réveil réclamé si la connexion a réussi; sinon il reste
+        disponible pour un nouvel essai jusqu'à CLAIM_TIMEOUT"""
+        with self.lock:
+            entry = self.pending.get(username)
+            if entry is None:
+                return
+            if success:
+                del self.pending[username]
+            else:
+                entry['claiming'] = False
+        if success:
+            launch_log.log_event('speculative_wake_result', user=username, action=entry['action'], result='claimed',
+                                 wait_seconds=int(time.time() - entry['time']))
+        elif time.time() - entry['time'] >= CLAIM_TIMEOUT:
+            self.executor.submit(self._expire, username)
+
+    def _expire(self, username):
+        """Annule un réveil non réclamé : le conteneur retrouve son état de départ"""
+        with self.lock:
+            entry = self.pending.get(username)
+            if entry is None or entry['claiming']:
+                return  # Réclamé, ou connexion en cours (claim() relancera l'annulation si elle échoue)
+            del self.pending[username]
+            self.cancelled[username] = time.time()
+        marker = os.path.join(DATA_DIR, username, prewarm.MARKER_FILE)
+        if not os.path.exists(marker):
+            return  # Consommé par script.sh : le conteneur appartient à une connexion
+        os.unlink(marker)
+        name = f"{CONTAINER_PREFIX}{username}"
+        try:
+            client = docker_api.get_client()
+            if entry['action'] == 'thaw':
+                client.pause(name)
+            elif entry['action'] == 'restore':
+                checkpoint_container(name)
+            else:
+                client.stop(name)
+        except docker_api.DockerAPIError as e:
+            print(f"Annulation du réveil spéculatif impossible pour {username}: {e}")
+        launch_log.log_event('speculative_wake_result', user=username, action=entry['action'], result='cancelled')
+
+_waker = None
+_waker_lock = threading.Lock()
+
+def get_waker():
+    """Réveils spéculatifs partagés du processus"""
+    global _waker
+    with _waker_lock:
+        if _waker is None:
+            _waker = SpeculativeWaker()
+        return _waker
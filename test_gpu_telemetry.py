@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests de la télémétrie GPU avec la source simulée (GPU_TELEMETRY_FAKE) : fichier JSON de GPU
+et de processus, relu quand il change.
+Exécuter avec: python3 test_gpu_telemetry.py   (ou python3 -m pytest test_gpu_telemetry.py)
+"""
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import gpu_telemetry
+
+FAKE_GPUS = {
+    'devices': [
+        {'index': 0, 'name': "Tesla T4", 'uuid': "GPU-0", 'driver': "550.54", 'temperature': 41,
+         'gpu_util': 12, 'mem_util': 5, 'mem_used': 812, 'mem_total': 15360},
+        {'index': 1, 'name': "Tesla T4", 'mem_total': 15360},
+    ],
+    'processes': [
+        {'pid': 1234, 'gpu_index': 0, 'name': "python3", 'used_memory': 512, 'sm_util': 30},
+        {'pid': 5678, 'gpu_index': 1, 'used_memory': 300},
+    ],
+}
+
+class FakeBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "gpus.json")
+        self.write(FAKE_GPUS)
+        self.previous = os.environ.get(gpu_telemetry.FAKE_ENV)
+        os.environ[gpu_telemetry.FAKE_ENV] = self.path
+        gpu_telemetry.reset_backend()
+
+    def tearDown(self):
+        if self.previous is None:
+            os.environ.pop(gpu_telemetry.FAKE_ENV, None)
+        else:
+            os.environ[gpu_telemetry.FAKE_ENV] = self.previous
+        gpu_telemetry.reset_backend()
+        shutil.rmtree(self.tmp)
+
+    def write(self, data, mtime=None):
+        with open(self.path, 'w') as f:
+            json.dump(data, f)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_devices(self):
+        self.assertEqual(gpu_telemetry.get_backend().name, "fake")
+        devices = gpu_telemetry.get_devices()
+        self.assertEqual([device.index for device in devices], [0, 1])
+        self.assertEqual(devices[0], gpu_telemetry.GpuDevice(
+            index=0, name="Tesla T4", uuid="GPU-0", driver="550.54", temperature=41,
+            gpu_util=12, mem_util=5, mem_used=812, mem_total=15360))
+        self.assertEqual((devices[1].mem_used, devices[1].driver), (0, ""))
+
+    def test_processes(self):
+        processes = gpu_telemetry.get_processes(with_utilization=True)
+        self.assertEqual([(p.pid, p.gpu_index, p.used_memory, p.sm_util) for p in processes],
+                         [(1234, 0, 512, 30), (5678, 1, 300, None)])
+        self.assertEqual(processes[0].name, "python3")
+        # Sans utilisation demandée, sm_util n'est pas renseigné
+        self.assertEqual([p.sm_util for p in gpu_telemetry.get_processes()], [None, None])
+
+    def test_file_reloaded_when_modified(self):
+        backend = gpu_telemetry.get_backend()
+        self.assertEqual(len(backend.devices()), 2)
+        self.write({'devices': FAKE_GPUS['devices'][:1]}, mtime=os.path.getmtime(self.path) + 10)
+        self.assertEqual(len(backend.devices()), 1)
+        self.assertEqual(backend.processes(), [])
+
+if __name__ == "__main__":
+    unittest.main()
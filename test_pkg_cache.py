@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests du cache de paquets partagé (pkg_cache.py) : store adressé par contenu, versions publiées jamais
+modifiées, promotion des seuls fichiers vérifiables des couches des utilisateurs, nettoyage.
+Exécuter avec: python3 test_pkg_cache.py   (ou python3 -m pytest test_pkg_cache.py)
+"""
+import os
+import shutil
+import hashlib
+import tempfile
+import unittest
+
+import pkg_cache
+
+IMAGE = "dev_svelte_container"
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def npm_content_path(data):
+    digest = hashlib.sha512(data).hexdigest()
+    return os.path.join("content-v2", "sha512", digest[:2], digest[2:4], digest[4:])
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+class PackageCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp()
+        os.chdir(self.tmp)
+        self.get_daemon_hosts = pkg_cache.get_daemon_hosts
+        pkg_cache.get_daemon_hosts = lambda: []  # Pas de démon Docker : seules les versions sont nettoyées
+
+    def tearDown(self):
+        pkg_cache.get_daemon_hosts = self.get_daemon_hosts
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def user_upper(self, username, tool, version=0):
+        return os.path.join(pkg_cache.DATA_DIR, f"{username}{pkg_cache.USER_SUFFIX}", IMAGE, tool, str(version),
+                            "upper")
+
+    def test_publish_creates_immutable_versions(self):
+        write("staging/a.tgz", b"a")
+        self.assertEqual(pkg_cache.publish_tree(IMAGE, "bun", "staging"), 1)
+        self.assertIsNone(pkg_cache.publish_tree(IMAGE, "bun", "staging"))  # Rien de nouveau
+        write("staging/b.tgz", b"b")
+        self.assertEqual(pkg_cache.publish_tree(IMAGE, "bun", "staging"), 2)
+
+        number, current = pkg_cache.current_version(IMAGE, "bun")
+        self.assertEqual(number, 2)
+        self.assertEqual(sorted(pkg_cache.list_files(current)), ["a.tgz", "b.tgz"])
+        # La version 1, éventuellement montée, n'a pas changé
+        first = os.path.join(pkg_cache.VERSIONS_DIR, IMAGE, "bun", "1")
+        self.assertEqual(sorted(pkg_cache.list_files(first)), ["a.tgz"])
+        # Un seul exemplaire de chaque contenu, nommé par son empreinte
+        self.assertEqual(sorted(os.listdir(pkg_cache.STORE_DIR)),
+                         sorted(hashlib.sha256(data).hexdigest() for data in (b"a", b"b")))
+        self.assertEqual(os.stat(os.path.join(current, "a.tgz")).st_ino, os.stat(os.path.join(first, "a.tgz")).st_ino)
+
+    def test_promote_keeps_only_verifiable_files(self):
+        good = npm_content_path(b"paquet")
+        write(os.path.join(self.user_upper("alice", "npm"), good), b"paquet")
+        # Contenu qui ne correspond pas à son nom, et index modifiable : restent dans la couche d'alice
+        write(os.path.join(self.user_upper("alice", "npm"), npm_content_path(b"autre")), b"falsifie")
+        write(os.path.join(self.user_upper("alice", "npm"), "index-v5", "00", "11", "cle"), b"index")
+        write(os.path.join(self.user_upper("alice", "apt"), "outil_1.0_amd64.deb"), b"deb")
+        write(os.path.join(self.user_upper("alice", "apt"), "partial", "en_cours.deb"), b"de")
+        write(os.path.join(self.user_upper("alice", "pip"), "http", "x"), b"pip")
+
+        self.assertEqual(pkg_cache.promote(), {(IMAGE, "npm"): 1, (IMAGE, "apt"): 1})
+        self.assertEqual(list(pkg_cache.list_files(pkg_cache.current_version(IMAGE, "npm")[1])), [good])
+        self.assertEqual(list(pkg_cache.list_files(pkg_cache.current_version(IMAGE, "apt")[1])),
+                         ["outil_1.0_amd64.deb"])
+        self.assertEqual(pkg_cache.current_version(IMAGE, "pip"), (0, None))
+        self.assertEqual(pkg_cache.promote(), {})
+
+    def test_remove_user_promotes_then_deletes_layers(self):
+        write(os.path.join(self.user_upper("bob", "npm"), npm_content_path(b"x")), b"x")
+        pkg_cache.remove_user("bob", hosts=[])
+        self.assertEqual(pkg_cache.current_version(IMAGE, "npm")[0], 1)
+        self.assertFalse(os.path.exists(os.path.join(pkg_cache.DATA_DIR, f"bob{pkg_cache.USER_SUFFIX}")))
+
+    def test_collect_garbage_keeps_recent_versions(self):
+        for i in range(5):
+            write(f"staging/{i}.tgz", str(i).encode())
+            pkg_cache.publish_tree(IMAGE, "bun", "staging")
+        os.unlink("staging/0.tgz")
+        self.assertEqual(pkg_cache.collect_garbage(keep=1), 3)
+        self.assertEqual(sorted(os.listdir(os.path.join(pkg_cache.VERSIONS_DIR, IMAGE, "bun"))), ["4", "5"])
+        # Tous les contenus sont encore dans la version courante : aucun fichier du store supprimé
+        self.assertEqual(len(os.listdir(pkg_cache.STORE_DIR)), 5)
+        self.assertEqual(read(os.path.join(pkg_cache.current_version(IMAGE, "bun")[1], "0.tgz")), b"0")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Tests du placement multi-nœuds (scheduler.py) avec des démons Docker de substitution :
+chaque nœud est un petit serveur HTTP local qui imite l'API Engine (/info, /containers/json,
+/containers/<id>/json), joint en tcp://127.0.0.1:<port>.
+Exécuter avec: python3 test_scheduler.py   (ou python3 -m pytest test_scheduler.py)
+"""
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import docker_api
+import scheduler
+
+GIB = 1024 ** 3
+
+class FakeDaemon:
+    """Démon de substitution : capacités (NCPU, MemTotal) et conteneurs en cours avec leurs limites.
+    Les conteneurs de vérification du stockage (grep -qxF jeton fichier) lisent le dossier monté
+    sur cette machine si shared, sinon ne trouvent rien (nœud avec son propre disque)."""
+
+    def __init__(self, cpus, memory, containers=(), shared=True):
+        self.info = {'NCPU': cpus, 'MemTotal': memory}
+        self.containers = {f"c{i}": host_config for i, host_config in enumerate(containers)}
+        self.shared = shared
+        self.created = {}
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path == '/info':
+                    self.reply(daemon.info)
+                elif path == '/containers/json':
+                    self.reply([{'Id': cid} for cid in daemon.containers])
+                elif path.startswith('/containers/') and path.endswith('/json'):
+                    self.reply({'HostConfig': daemon.containers[path.split('/')[2]]})
+                else:
+                    self.reply({'message': 'inconnu'}, 404)
+
+            def do_POST(self):
+                path = self.path.split('?')[0]
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if path == '/containers/create':
+                    cid = f"check{len(daemon.created)}"
+                    daemon.created[cid] = json.loads(body)
+                    self.reply({'Id': cid}, 201)
+                elif path.endswith('/start'):
+                    self.reply(None, 204)
+                elif path.endswith('/wait'):
+                    self.reply({'StatusCode': daemon.run_check(daemon.created[path.split('/')[2]])})
+                else:
+                    self.reply({'message': 'inconnu'}, 404)
+
+            def do_DELETE(self):
+                daemon.created.pop(self.path.split('?')[0].split('/')[2], None)
+                self.reply(None, 204)
+
+            def reply(self, body, status=200):
+                data = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.host = f"tcp://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def run_check(self, config):
+        if not self.shared:
+            return 2
+        source = config['HostConfig']['Binds'][0].split(':')[0]
+        _, token, path = config['Cmd']
+        with open(os.path.join(source, os.path.relpath(path, '/data'))) as f:
+            return 0 if token in f.read().splitlines() else 1
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def unused_port():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), BaseHTTPRequestHandler)
+    port = server.server_address[1]
+    server.server_close()
+    return port
+
+class SchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp()
+        os.chdir(self.tmp)
+        self.daemons = {
+            # 8 cœurs dont 6 réservés, 32 Go dont 8 réservés
+            'busy': FakeDaemon(8, 32 * GIB, [{'NanoCpus': int(4e9), 'Memory': 4 * GIB},
+                                             {'CpuQuota': 200000, 'CpuPeriod': 100000, 'Memory': 4 * GIB}]),
+            'idle': FakeDaemon(8, 32 * GIB),
+            'gpu': FakeDaemon(16, 64 * GIB, [{'NanoCpus': int(12e9), 'Memory': 48 * GIB,
+                                              'DeviceRequests': [{'Capabilities': [['gpu']]}]}]),
+            # Le plus libre, mais avec son propre disque
+            'apart': FakeDaemon(64, 256 * GIB, shared=False),
+        }
+        with open(scheduler.NODES_FILE, 'w') as f:
+            f.write(f"busy {self.daemons['busy'].host} 10.0.0.1\n")
+            f.write(f"idle {self.daemons['idle'].host} 10.0.0.2\n")
+            f.write(f"gpu {self.daemons['gpu'].host} 10.0.0.3 - - 2\n")
+            f.write(f"down tcp://127.0.0.1:{unused_port()} 10.0.0.4 8 32g\n")
+            f.write(f"apart {self.daemons['apart'].host} 10.0.0.5\n")
+
+    def tearDown(self):
+        for daemon in self.daemons.values():
+            daemon.close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def test_probe_reads_capacities_and_reservations(self):
+        usages = {usage['name']: usage for usage in scheduler.probe_nodes(scheduler.load_nodes())}
+        self.assertEqual((usages['busy']['cpu_used'], usages['busy']['memory_used']), (6.0, 8 * GIB))
+        self.assertEqual((usages['gpu']['cpus'], usages['gpu']['gpu_containers']), (16.0, 1))
+        self.assertTrue(usages['idle']['online'])
+        self.assertFalse(usages['down']['online'])
+
+    def test_choose_node_prefers_free_node_and_gpu(self):
+        # Le stockage n'est pas regardé ici (place_user s'en charge)
+        usages = [u for u in scheduler.probe_nodes(scheduler.load_nodes()) if u['name'] != 'apart']
+        self.assertEqual(scheduler.choose_node(usages, 2, 4 * GIB, False)['name'], 'idle')
+        self.assertEqual(scheduler.choose_node(usages, 2, 4 * GIB, True)['name'], 'gpu')
+
+    def test_place_user_pins_user(self):
+        self.assertEqual(scheduler.place_user('alice', 2, 4 * GIB)['name'], 'idle')
+        # Le nœud épinglé est gardé même si un autre devient plus libre
+        self.daemons['idle'].containers['big'] = {'NanoCpus': int(8e9), 'Memory': 32 * GIB}
+        self.assertEqual(scheduler.place_user('alice', 2, 4 * GIB)['name'], 'idle')
+        self.assertEqual(scheduler.get_user_host('alice'), self.daemons['idle'].host)
+
+    def test_concurrent_first_logins_keep_every_pin(self):
+        users = [f"user{i}" for i in range(12)]
+        errors = []
+
+        def place(username):
+            try:
+                scheduler.place_user(username, 1, GIB)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=place, args=(username,)) for username in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(scheduler.load_node_map()), sorted(users))
+
+    def test_node_without_shared_storage_is_skipped(self):
+        self.assertEqual(scheduler.place_user('carol', 2, 4 * GIB)['name'], 'idle')
+        self.assertEqual(self.daemons['apart'].created, {})
+        self.assertNotIn('apart', scheduler.load_storage_checks())
+        self.assertIn('idle', scheduler.load_storage_checks())
+
+    def test_pinned_node_without_shared_storage_is_refused(self):
+        scheduler.save_node_map({'dave': 'apart'})
+        with self.assertRaises(RuntimeError):
+            scheduler.place_user('dave', 2, 4 * GIB)
+
+    def test_release_user(self):
+        scheduler.place_user('bob', 1, GIB)
+        self.assertTrue(scheduler.release_user('bob'))
+        self.assertFalse(scheduler.release_user('bob'))
+
+class DockerHostTest(unittest.TestCase):
+
+    def test_plain_tcp_refused_outside_loopback(self):
+        with self.assertRaises(docker_api.DockerAPIError):
+            docker_api.DockerClient(host="tcp://10.0.0.12:2375")
+        docker_api.DockerClient(host="tcp://127.0.0.1:2375")
+
+    def test_ssh_address(self):
+        kind, destination = docker_api.parse_docker_host("ssh://admin@gpu1:2222")
+        self.assertEqual((kind, destination.username, destination.hostname, destination.port),
+                         ('ssh', 'admin', 'gpu1', 2222))
+        with self.assertRaises(docker_api.DockerAPIError):
+            docker_api.parse_docker_host("ssh://")
+
+if __name__ == "__main__":
+    unittest.main()